@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Measure the GL balance snapshot against summing the full ledger on every read.
+
+Seeds the in-memory Frappe stand-in with a synthetic ledger for a group of
+companies and builds the snapshot from it. It then posts further entries,
+into open and new periods, and refreshes incrementally. Finally it reads a
+trial balance from the snapshot and from the raw GL Entries, and checks
+that both agree and that a ``--verify`` sample finds no drift. It then
+reposts some old vouchers (their GL Entries are deleted and created again
+with new amounts), checks that ``--reconcile`` rebuilds the affected months
+and that the balances agree again::
+
+    python3 benchmarks/bench_balance_snapshot.py --entries 200000 --new-entries 2000
+    python3 benchmarks/bench_balance_snapshot.py --entries 50000 --latency-ms 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+
+import balance_snapshot  # noqa: E402
+from utils import instrumentation  # noqa: E402
+
+assert getattr(frappe, "IS_FAKE", False), "benchmarks/fake_frappe must shadow the real frappe package"
+
+ACCOUNTS = ["Cash", "Debtors", "Creditors", "Sales", "Cost of Goods Sold", "Salary", "Rent", "Capital Stock"]
+COST_CENTERS = ["Main", "Operations", "Sales", None]
+GL_FIELDS = ["name", "company", "account", "cost_center", "posting_date", "debit", "credit", "creation", "is_cancelled"]
+
+
+class Ledger:
+    """Synthetic balanced journal pairs, created in ``creation`` order."""
+
+    def __init__(self, companies: Dict[str, str], seed: int) -> None:
+        self.companies = companies
+        self.rng = random.Random(seed)
+        self.counter = 0
+
+    def post(self, count: int, first_day: datetime.date, days: int, created: datetime.datetime) -> None:
+        rows: List[Tuple[Any, ...]] = []
+        step = datetime.timedelta(microseconds=1000)
+        while len(rows) < count:
+            company = self.rng.choice(list(self.companies))
+            abbr = self.companies[company]
+            posting_date = (first_day + datetime.timedelta(days=self.rng.randrange(days))).isoformat()
+            amount = round(self.rng.uniform(1, 5_000), 2)
+            debit_account, credit_account = self.rng.sample(ACCOUNTS, 2)
+            cost_center = self.rng.choice(COST_CENTERS)
+            created += step
+            for account, debit, credit in ((debit_account, amount, 0.0), (credit_account, 0.0, amount)):
+                self.counter += 1
+                rows.append(
+                    (
+                        f"GLE-{self.counter:09d}",
+                        company,
+                        f"{account} - {abbr}",
+                        f"{cost_center} - {abbr}" if cost_center else None,
+                        posting_date,
+                        debit,
+                        credit,
+                        created.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                        0,
+                    )
+                )
+        frappe.db.bulk_insert("GL Entry", GL_FIELDS, rows)
+        frappe.db.commit()
+
+    def repost(self, vouchers: int, created: datetime.datetime) -> None:
+        """Delete the GL pairs of ``vouchers`` old vouchers and post them again with new amounts, as reposting does."""
+
+        rows: List[Tuple[Any, ...]] = []
+        for pair in self.rng.sample(range(self.counter // 2), vouchers):
+            names = [f"GLE-{2 * pair + 1:09d}", f"GLE-{2 * pair + 2:09d}"]
+            old = frappe.get_all("GL Entry", filters={"name": ["in", names]}, fields=GL_FIELDS, order_by="name asc")
+            frappe.db.delete("GL Entry", {"name": ["in", names]})
+            amount = round(self.rng.uniform(1, 5_000), 2)
+            created += datetime.timedelta(microseconds=1000)
+            for row in old:
+                self.counter += 1
+                debit, credit = (amount, 0.0) if row["debit"] else (0.0, amount)
+                rows.append(
+                    (
+                        f"GLE-{self.counter:09d}",
+                        row["company"],
+                        row["account"],
+                        row["cost_center"],
+                        row["posting_date"],
+                        debit,
+                        credit,
+                        created.strftime("%Y-%m-%d %H:%M:%S.%f"),
+                        0,
+                    )
+                )
+        frappe.db.bulk_insert("GL Entry", GL_FIELDS, rows)
+        frappe.db.commit()
+
+
+def raw_balances(companies: List[str], to_date: str) -> List[Dict[str, Any]]:
+    """The dashboard query without a snapshot: every GL Entry up to ``to_date``."""
+
+    balances: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for row in frappe.get_all(
+        "GL Entry",
+        filters={"company": ["in", companies], "posting_date": ["<=", to_date]},
+        fields=["company", "account", "cost_center", "debit", "credit"],
+        limit_page_length=0,
+    ):
+        key = (row["company"], row["account"], row["cost_center"] or "")
+        balance = balances.setdefault(
+            key, {"company": key[0], "account": key[1], "cost_center": key[2], "opening": 0, "debit": 0, "credit": 0}
+        )
+        balance["debit"] += balance_snapshot.cents(row["debit"])
+        balance["credit"] += balance_snapshot.cents(row["credit"])
+    rows = sorted(balances.values(), key=lambda balance: (balance["company"], balance["account"], balance["cost_center"]))
+    for balance in rows:
+        balance["closing"] = balance["debit"] - balance["credit"]
+    return rows
+
+
+def measured(label: str, run: Callable[[], Any]) -> Any:
+    with instrumentation.step(label) as metrics:
+        queries = metrics.queries
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        queries = metrics.queries - queries
+    print(f"  {label:<22} {seconds:8.3f}s  {queries:>7} queries")
+    return result
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the incrementally maintained balance snapshot")
+    parser.add_argument("--entries", type=int, default=100_000, help="GL rows in the seeded history")
+    parser.add_argument("--new-entries", type=int, default=2_000, help="GL rows posted before the incremental refresh")
+    parser.add_argument("--companies", type=int, default=10, help="Companies in the group")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round-trip latency")
+    parser.add_argument("--sample", type=int, default=50, help="Snapshot rows to verify")
+    parser.add_argument("--reposts", type=int, default=20, help="Old vouchers reposted before reconciling")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    frappe.connect(latency=args.latency_ms / 1000)
+
+    companies = {f"Galaxy Company {number:02d}": f"GC{number:02d}" for number in range(1, args.companies + 1)}
+    for company, abbr in companies.items():
+        frappe.get_doc({"doctype": "Company", "company_name": company, "name": company, "abbr": abbr}).insert()
+    names = list(companies)
+
+    ledger = Ledger(companies, args.seed)
+    now = datetime.datetime.now()
+    ledger.post(args.entries, datetime.date(2023, 1, 1), 1000, now - datetime.timedelta(days=30))
+    print(f"⏱️  {ledger.counter} GL rows across {len(names)} companies...", flush=True)
+
+    seed = measured("seed snapshot", lambda: balance_snapshot.refresh_snapshot(names, settle_seconds=0))
+    ledger.post(args.new_entries, datetime.date(2025, 9, 1), 60, now - datetime.timedelta(minutes=5))
+    refresh = measured("incremental refresh", lambda: balance_snapshot.refresh_snapshot(names, settle_seconds=0))
+    noop = measured("idle refresh", lambda: balance_snapshot.refresh_snapshot(names, settle_seconds=0))
+    print(
+        f"  seeded {seed.entries} entries into {seed.created} rows; "
+        f"refresh read {refresh.entries} entries ({refresh.updated} rows updated, {refresh.created} created); "
+        f"idle refresh read {noop.entries}"
+    )
+
+    to_date = "2025-12-31"
+    expected = measured("read from ledger", lambda: raw_balances(names, to_date))
+    actual = measured("read from snapshot", lambda: balance_snapshot.read_balances(names, to_date=to_date))
+    checked, mismatches = measured("verify sample", lambda: balance_snapshot.verify_sample(names, args.sample, seed=1))
+
+    if actual != expected:
+        raise SystemExit("❌ Snapshot balances differ from the ledger")
+    if mismatches:
+        raise SystemExit(f"❌ {len(mismatches)} of {checked} sampled snapshot rows differ from the ledger")
+    print(f"✅ {len(actual)} balances match the ledger; {checked} sampled rows verified")
+
+    ledger.repost(args.reposts, now - datetime.timedelta(minutes=2))
+    measured("refresh after repost", lambda: balance_snapshot.refresh_snapshot(names, settle_seconds=0))
+    expected = raw_balances(names, to_date)
+    if args.reposts and balance_snapshot.read_balances(names, to_date=to_date) == expected:
+        raise SystemExit("❌ The refresh was expected to miss the deleted GL Entries of reposted vouchers")
+    reconciled = measured("reconcile", lambda: balance_snapshot.reconcile_snapshot(names))
+    if balance_snapshot.read_balances(names, to_date=to_date) != expected:
+        raise SystemExit("❌ Snapshot balances still differ from the ledger after --reconcile")
+    if balance_snapshot.reconcile_snapshot(names).rebuilt:
+        raise SystemExit("❌ A second --reconcile still found drifted months")
+    print(
+        f"✅ {args.reposts} reposted vouchers: --reconcile rebuilt {len(reconciled.rebuilt)} of "
+        f"{reconciled.periods} months and the balances match the ledger again"
+    )
+
+
+if __name__ == "__main__":
+    main()
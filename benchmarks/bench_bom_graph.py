@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Compare per-line recursive BOM explosion with the one-pass BOM graph engine.
+
+Seeds the in-memory Frappe stand-in with a layered BOM forest (finished
+goods, sub-assemblies, purchased parts) and open Work Orders, then plans
+them twice: recursively, with one BOM Item query per BOM visited, as a
+per-line implementation would, and with ``bom_graph.plan_requirements``.
+Without stock the purchased quantities of both must agree. A small graph
+with a BOM above a cycle is checked first: it must be blocked, not raise
+``KeyError``::
+
+    python3 benchmarks/bench_bom_graph.py --boms 2000 --work-orders 5000
+    python3 benchmarks/bench_bom_graph.py --boms 500 --work-orders 1000 --latency-ms 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+
+import bom_graph  # noqa: E402
+from utils import instrumentation  # noqa: E402
+
+assert getattr(frappe, "IS_FAKE", False), "benchmarks/fake_frappe must shadow the real frappe package"
+
+COMPANY = "Galaxy Engineering"
+LEVELS = 4
+
+
+def seed(boms: int, work_orders: int, parts: int, seed_value: int) -> None:
+    """BOMs on ``LEVELS`` levels; each line points at the level below or at a purchased part."""
+
+    rng = random.Random(seed_value)
+    per_level = max(boms // LEVELS, 1)
+    levels = [[f"ASM-{level}-{number:05d}" for number in range(per_level)] for level in range(LEVELS)]
+    purchased = [f"PART-{number:05d}" for number in range(parts)]
+
+    headers: List[Tuple[Any, ...]] = []
+    lines: List[Tuple[Any, ...]] = []
+    for level, items in enumerate(levels):
+        below = levels[level + 1] if level + 1 < LEVELS else []
+        for item in items:
+            bom = f"BOM-{item}"
+            headers.append((bom, item, COMPANY, 1.0, 1, 1, 1))
+            for idx in range(1, rng.randint(3, 8) + 1):
+                component = rng.choice(below) if below and rng.random() < 0.4 else rng.choice(purchased)
+                qty = float(rng.randint(1, 4))
+                lines.append((f"{bom}-{idx}", bom, "BOM", "items", idx, component, qty, qty, ""))
+
+    frappe.db.bulk_insert("BOM", ["name", "item", "company", "quantity", "is_default", "is_active", "docstatus"], headers)
+    frappe.db.bulk_insert(
+        "BOM Item",
+        ["name", "parent", "parenttype", "parentfield", "idx", "item_code", "qty", "stock_qty", "bom_no"],
+        lines,
+    )
+    frappe.db.bulk_insert(
+        "Work Order",
+        ["name", "company", "production_item", "bom_no", "qty", "produced_qty", "docstatus", "status"],
+        [
+            (f"WO-{number:06d}", COMPANY, item, f"BOM-{item}", float(rng.randint(1, 20)), 0.0, 1, "Not Started")
+            for number, item in ((number, rng.choice(levels[0])) for number in range(work_orders))
+        ],
+    )
+    frappe.db.commit()
+
+
+def recursive_plan(companies: List[str]) -> Dict[str, float]:
+    """Explode every Work Order recursively, reading each BOM's items when it is visited."""
+
+    purchase: Dict[str, float] = defaultdict(float)
+
+    def explode(bom: str, qty: float) -> None:
+        rows = frappe.get_all("BOM Item", filters={"parent": bom}, fields=["item_code", "stock_qty"])
+        for row in rows:
+            child = frappe.db.get_value("BOM", {"item": row["item_code"], "is_default": 1, "is_active": 1})
+            if child:
+                explode(child, qty * row["stock_qty"])
+            else:
+                purchase[row["item_code"]] += qty * row["stock_qty"]
+
+    for order in frappe.get_all(
+        "Work Order",
+        filters={"docstatus": 1, "company": ["in", companies]},
+        fields=["bom_no", "qty", "produced_qty"],
+    ):
+        explode(order["bom_no"], order["qty"] - order["produced_qty"])
+    return purchase
+
+
+def check_cycle_shapes() -> None:
+    """A -> B, B -> C, C -> B: A is above the cycle and must be blocked along with it."""
+
+    graph = bom_graph.BomGraph(
+        [
+            bom_graph.Bom("BOM-A", "A", is_default=1, lines=[bom_graph.BomLine("B", 1.0), bom_graph.BomLine("P", 2.0)]),
+            bom_graph.Bom("BOM-B", "B", is_default=1, lines=[bom_graph.BomLine("C", 1.0)]),
+            bom_graph.Bom("BOM-C", "C", is_default=1, lines=[bom_graph.BomLine("B", 1.0)]),
+            bom_graph.Bom("BOM-D", "D", is_default=1, lines=[bom_graph.BomLine("P", 3.0)]),
+        ]
+    )
+    if graph.order != ["BOM-D"] or graph.blocked != {"BOM-A", "BOM-B", "BOM-C"}:
+        raise SystemExit(f"❌ Expected only BOM-D to be ordered, got {graph.order} with {sorted(graph.blocked)} blocked")
+    try:
+        graph.explode("BOM-A")
+    except ValueError:
+        pass
+    else:
+        raise SystemExit("❌ Exploding a BOM above a cycle did not raise ValueError")
+    plan = graph.plan([("WO-A", "BOM-A", 2.0), ("WO-D", "BOM-D", 1.0)], {})
+    if dict(plan.blocked) != {"BOM-A": 2.0} or dict(plan.purchase) != {"P": 3.0}:
+        raise SystemExit(f"❌ Unexpected plan around a cycle: {dict(plan.blocked)} blocked, {dict(plan.purchase)} bought")
+
+
+def measured(label: str, run: Callable[[], Any]) -> Tuple[Any, float]:
+    with instrumentation.step(label) as metrics:
+        queries = metrics.queries
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        queries = metrics.queries - queries
+    print(f"  {label:<12} {seconds:8.3f}s  {queries:>8} queries")
+    return result, seconds
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the BOM graph engine")
+    parser.add_argument("--boms", type=int, default=1000, help="BOMs across all levels")
+    parser.add_argument("--parts", type=int, default=500, help="Purchased parts")
+    parser.add_argument("--work-orders", type=int, default=2000, help="Open Work Orders to plan")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round-trip latency")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    check_cycle_shapes()
+    frappe.connect(latency=args.latency_ms / 1000)
+    seed(args.boms, args.work_orders, args.parts, args.seed)
+    print(f"⏱️  {args.boms} BOMs on {LEVELS} levels, {args.work_orders} work orders...", flush=True)
+
+    expected, recursive = measured("recursive", lambda: recursive_plan([COMPANY]))
+    (graph, plan), engine = measured("bom graph", lambda: bom_graph.plan_requirements([COMPANY]))
+    print(f"  {'speed-up':<12} {recursive / engine:8.1f}x  ({len(graph.order)} BOMs in topological order)")
+
+    differences = [
+        item
+        for item in set(expected) | set(plan.purchase)
+        if not math.isclose(expected.get(item, 0.0), plan.purchase.get(item, 0.0), rel_tol=1e-9)
+    ]
+    if differences or graph.cycles:
+        raise SystemExit(f"❌ Purchase quantities differ for {len(differences)} items")
+    print(f"✅ {len(plan.purchase)} purchased items match the recursive explosion")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare per-document ensure_doc inserts with the bulk insert engine.
+
+Runs against a live site and rolls everything back at the end, so it is
+safe to point at a staging copy::
+
+    python3 benchmarks/bench_bulk_insert.py --site galaxy.local --records 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import frappe  # noqa: E402
+
+from bulk_insert import bulk_ensure_docs  # noqa: E402
+from utils import ProvisioningStats, ensure_doc, frappe_site_connection  # noqa: E402
+
+
+def synthetic_suppliers(prefix: str, count: int, supplier_group: str) -> List[Dict[str, object]]:
+    return [
+        {
+            "supplier_name": f"{prefix} Supplier {number:06d}",
+            "supplier_group": supplier_group,
+            "supplier_type": "Company",
+            "country": "Spain",
+        }
+        for number in range(count)
+    ]
+
+
+def per_document_path(records: List[Dict[str, object]]) -> None:
+    stats = ProvisioningStats()
+    for record in records:
+        ensure_doc("Supplier", {"supplier_name": record["supplier_name"]}, record, stats=stats)
+
+
+def bulk_path(records: List[Dict[str, object]]) -> None:
+    bulk_ensure_docs("Supplier", "supplier_name", records, stats=ProvisioningStats())
+
+
+def timed(label: str, records: List[Dict[str, object]], run: Callable[[List[Dict[str, object]]], None]) -> float:
+    started = time.perf_counter()
+    run(records)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<14} {len(records):>7} records  {elapsed:8.2f}s  {len(records) / elapsed:10.1f} rec/s")
+    return elapsed
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the bulk insert engine")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--records", type=int, default=1000, help="Synthetic suppliers per path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+
+    with frappe_site_connection(args.site):
+        supplier_group = frappe.db.get_value("Supplier Group", {"is_group": 0}, "name")
+        prefix = f"Bench {int(time.time())}"
+
+        print(f"⏱️  Inserting {args.records} suppliers per path (rolled back afterwards)")
+        try:
+            baseline = timed(
+                "ensure_doc",
+                synthetic_suppliers(f"{prefix} A", args.records, supplier_group),
+                per_document_path,
+            )
+            bulk = timed(
+                "bulk_insert",
+                synthetic_suppliers(f"{prefix} B", args.records, supplier_group),
+                bulk_path,
+            )
+            print(f"  speed-up: {baseline / bulk:.1f}x")
+        finally:
+            frappe.db.rollback()
+
+
+if __name__ == "__main__":
+    main()
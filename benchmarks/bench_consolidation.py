@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Compare a row-by-row consolidated trial balance with the NumPy engine.
+
+Seeds the in-memory Frappe stand-in with a synthetic, balanced group
+ledger (journal pairs inside each company plus matching intercompany
+receivable/payable pairs between the holding and its subsidiaries), then
+builds the consolidated trial balance twice from the same fetched pages:
+with a plain ``dict`` accumulation per GL row, and with ``consolidation``.
+Fetching is timed separately, since against the fake it is mostly the
+stand-in's own filtering. Both must agree to the cent::
+
+    python3 benchmarks/bench_consolidation.py --entries 200000 --subsidiaries 9
+    python3 benchmarks/bench_consolidation.py --entries 50000 --mismatch 125.50
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+import numpy  # noqa: E402  - imported up front so the timings exclude it
+
+import consolidation  # noqa: E402
+from consolidation import (  # noqa: E402
+    ELIMINATION_DIFFERENCE,
+    ConsolidatedTrialBalance,
+    CubeBuilder,
+    account_label,
+    internal_parties,
+    iter_gl_pages,
+)
+from setup_companies import INTERCOMPANY_ACCOUNTS  # noqa: E402
+
+assert getattr(frappe, "IS_FAKE", False), "benchmarks/fake_frappe must shadow the real frappe package"
+
+ROOT_COMPANY = "Galaxy Holding"
+ACCOUNTS = ["Cash", "Debtors", "Creditors", "Sales", "Cost of Goods Sold", "Salary", "Rent", "Capital Stock"]
+GL_FIELDS = ["name", "company", "account", "posting_date", "debit", "credit", "party_type", "party", "is_cancelled"]
+
+
+def seed(entries: int, subsidiaries: int, mismatch: float, seed_value: int) -> Dict[str, str]:
+    """Write ``entries`` GL rows across the group; returns ``company -> abbr``."""
+
+    rng = random.Random(seed_value)
+    companies = {ROOT_COMPANY: "GH"}
+    companies.update({f"Galaxy Subsidiary {number:02d}": f"S{number:02d}" for number in range(1, subsidiaries + 1)})
+    for company, abbr in companies.items():
+        frappe.get_doc({"doctype": "Company", "company_name": company, "name": company, "abbr": abbr}).insert()
+
+    names = list(companies)
+    start = datetime.date(2024, 1, 1)
+    rows: List[Tuple] = []
+    counter = 0
+
+    def post(company: str, account: str, date: str, debit: float, credit: float, party: str = "") -> None:
+        nonlocal counter
+        counter += 1
+        rows.append(
+            (f"GLE-{counter:09d}", company, f"{account} - {companies[company]}", date, debit, credit,
+             "Customer" if party else "", party, 0)
+        )
+
+    while len(rows) < entries:
+        date = (start + datetime.timedelta(days=rng.randrange(730))).isoformat()
+        amount = round(rng.uniform(1, 10_000), 2)
+        if rng.random() < 0.1:
+            # holding lends to a subsidiary: receivable on one side, payable on the other
+            subsidiary = rng.choice(names[1:])
+            post(ROOT_COMPANY, INTERCOMPANY_ACCOUNTS[0], date, amount, 0, subsidiary)
+            post(ROOT_COMPANY, "Cash", date, 0, amount)
+            post(subsidiary, INTERCOMPANY_ACCOUNTS[1], date, 0, amount, ROOT_COMPANY)
+            post(subsidiary, "Cash", date, amount, 0)
+            continue
+        company = rng.choice(names)
+        debit_account, credit_account = rng.sample(ACCOUNTS, 2)
+        post(company, debit_account, date, amount, 0)
+        post(company, credit_account, date, 0, amount)
+
+    if mismatch and len(names) > 1:
+        post(ROOT_COMPANY, INTERCOMPANY_ACCOUNTS[0], "2025-06-30", mismatch, 0, names[1])
+        post(ROOT_COMPANY, "Cash", "2025-06-30", 0, mismatch)
+
+    frappe.db.bulk_insert("GL Entry", GL_FIELDS, rows)
+    frappe.db.commit()
+    return companies
+
+
+Pages = Dict[str, List[List[Sequence[Any]]]]
+
+
+def row_by_row(companies: Dict[str, str], pages: Pages, from_date: str) -> Dict[str, List[int]]:
+    """The straightforward version: one dict update per GL row, amounts in cents."""
+
+    balances: Dict[str, List[int]] = {}
+    eliminated: Dict[str, int] = {}
+    for company, abbr in companies.items():
+        for page in pages[company]:
+            for _, account, posting_date, debit, credit, party_type, party in page:
+                label = account_label(account, abbr)
+                debit_cents, credit_cents = round(debit * 100), round(credit * 100)
+                totals = balances.setdefault(label, [0, 0, 0])
+                if str(posting_date) < from_date:
+                    totals[0] += debit_cents - credit_cents
+                else:
+                    totals[1] += debit_cents
+                    totals[2] += credit_cents
+                if label in INTERCOMPANY_ACCOUNTS and party in companies:
+                    eliminated[label] = eliminated.get(label, 0) - (debit_cents - credit_cents)
+
+    result = {
+        account: [opening, debit, credit, opening + debit - credit, eliminated.get(account, 0)]
+        for account, (opening, debit, credit) in balances.items()
+    }
+    difference = -sum(eliminated.values())
+    if difference:
+        result[ELIMINATION_DIFFERENCE] = [0, 0, 0, 0, difference]
+    return result
+
+
+def engine_rows(balance: ConsolidatedTrialBalance) -> Dict[str, List[int]]:
+    return {
+        row.account: [row.opening, row.debit, row.credit, row.closing, row.eliminated]
+        for row in balance.rows
+    }
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the vectorised consolidated trial balance")
+    parser.add_argument("--entries", type=int, default=100_000, help="Synthetic GL rows to seed")
+    parser.add_argument("--subsidiaries", type=int, default=9, help="Subsidiaries below Galaxy Holding")
+    parser.add_argument("--page-size", type=int, default=50_000, help="GL Entries fetched per query")
+    parser.add_argument("--from-date", default="2025-01-01")
+    parser.add_argument("--to-date", default="2025-12-31")
+    parser.add_argument("--mismatch", type=float, default=0.0, help="Unmatched intercompany amount to post")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    frappe.connect()
+    companies = seed(args.entries, args.subsidiaries, args.mismatch, args.seed)
+    members = list(companies)
+    print(f"⏱️  {args.entries} GL rows across {len(members)} companies (numpy {numpy.__version__})...", flush=True)
+
+    started = time.perf_counter()
+    pages = {company: list(iter_gl_pages(company, args.to_date, args.page_size)) for company in companies}
+    fetched = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected = row_by_row(companies, pages, args.from_date)
+    baseline = time.perf_counter() - started
+
+    started = time.perf_counter()
+    builder = CubeBuilder(companies, internal_parties(members))
+    for company, company_pages in pages.items():
+        for page in company_pages:
+            builder.add_page(company, page)
+    cube = builder.build()
+    balance = consolidation.consolidate(cube, members, from_date=args.from_date, to_date=args.to_date)
+    vectorised = time.perf_counter() - started
+
+    print(f"  {'fetch':<12} {fetched:8.3f}s  {cube.rows / fetched:12.0f} rows/s")
+    print(f"  {'row by row':<12} {baseline:8.3f}s  {cube.rows / baseline:12.0f} rows/s")
+    print(f"  {'numpy':<12} {vectorised:8.3f}s  {cube.rows / vectorised:12.0f} rows/s  ({baseline / vectorised:.1f}x)")
+    for company, counterparty, cents in balance.differences:
+        print(f"  ⚠️ {company} ↔ {counterparty}: intercompany balances differ by {cents / 100:.2f}")
+
+    try:
+        consolidation.consolidate(cube, members, from_date=args.from_date[:8] + "15", to_date=args.to_date)
+    except ValueError:
+        pass
+    else:
+        raise SystemExit("❌ A mid-month --from-date was rounded down to its month instead of rejected")
+
+    actual = engine_rows(balance)
+    if actual != expected:
+        diff = sorted(key for key in set(actual) | set(expected) if actual.get(key) != expected.get(key))
+        raise SystemExit(f"❌ Trial balances differ on: {', '.join(diff)}")
+    print(f"✅ {len(actual)} accounts match to the cent")
+
+
+if __name__ == "__main__":
+    main()
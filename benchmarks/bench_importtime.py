@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Measure what the setup scripts import before they can answer ``--help``.
+
+Each script runs in a fresh interpreter under ``python -X importtime`` twice:
+as shipped (Frappe bound lazily, so ``--help`` should never import it) and
+with ``frappe`` imported up front, which is what every invocation paid
+before. The report shows wall time, the summed import time, whether Frappe
+was loaded and the costliest top-level imports::
+
+    python3 benchmarks/bench_importtime.py
+    python3 benchmarks/bench_importtime.py --frappe-path /home/frappe/frappe-bench/apps/frappe --top 10
+
+Without ``--frappe-path`` the in-memory stand-in in ``benchmarks/fake_frappe``
+is used, which imports far faster than the real framework; run it inside the
+container to see real numbers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS = ["setup_companies", "setup_roles_permissions", "setup_erp_crm", "provision_galaxy"]
+
+# Runs the script as __main__ after an explicit ``import frappe``.
+EAGER_RUNNER = "import frappe, runpy, sys; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+
+
+@dataclass
+class ImportProfile:
+    wall_seconds: float
+    # top-level imports only (nesting level 0), so the sum is the total
+    top_level: Dict[str, int] = field(default_factory=dict)
+    modules: List[str] = field(default_factory=list)
+
+    @property
+    def import_ms(self) -> float:
+        return sum(self.top_level.values()) / 1000
+
+    def loaded(self, package: str) -> bool:
+        return any(module == package or module.startswith(package + ".") for module in self.modules)
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, int], List[str]]:
+    """Parse ``import time: self [us] | cumulative | imported package`` lines."""
+
+    top_level: Dict[str, int] = {}
+    modules: List[str] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        modules.append(module)
+        if not name[1:].startswith(" "):  # nested imports are indented by two spaces per level
+            top_level[module] = top_level.get(module, 0) + int(cumulative)
+    return top_level, modules
+
+
+def profile(script: str, *, eager: bool, python_path: str) -> ImportProfile:
+    path = str(ROOT / "scripts" / f"{script}.py")
+    command = [sys.executable, "-X", "importtime"]
+    command += ["-c", EAGER_RUNNER, path, "--help"] if eager else [path, "--help"]
+
+    started = time.perf_counter()
+    completed = subprocess.run(
+        command,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": python_path},
+        check=False,
+    )
+    wall_seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise SystemExit(f"❌ {script} --help failed:\n{completed.stderr[-2000:]}")
+
+    top_level, modules = parse_importtime(completed.stderr)
+    return ImportProfile(wall_seconds, top_level, modules)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time benchmark of the setup scripts")
+    parser.add_argument("--frappe-path", help="Directory containing the real frappe package (default: fake_frappe)")
+    parser.add_argument("--top", type=int, default=5, help="Costliest top-level imports to list per script")
+    args = parser.parse_args()
+
+    frappe_path = args.frappe_path or str(ROOT / "benchmarks" / "fake_frappe")
+    python_path = os.pathsep.join([frappe_path, str(ROOT / "scripts")])
+
+    print(f"\n  {'script':<25} {'mode':<6} {'wall s':>7} {'import ms':>10} {'frappe':>7}")
+    lazy_profiles: Dict[str, ImportProfile] = {}
+    for script in SCRIPTS:
+        for eager in (True, False):
+            result = profile(script, eager=eager, python_path=python_path)
+            if not eager:
+                lazy_profiles[script] = result
+            print(
+                f"  {script:<25} {'eager' if eager else 'lazy':<6} {result.wall_seconds:>7.3f} "
+                f"{result.import_ms:>10.1f} {'yes' if result.loaded('frappe') else 'no':>7}"
+            )
+
+    for script, result in lazy_profiles.items():
+        costliest = sorted(result.top_level.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        listing = ", ".join(f"{module} {micros / 1000:.1f}ms" for module, micros in costliest)
+        print(f"\n  {script} (lazy) top imports: {listing}")
+
+    if any(result.loaded("frappe") for result in lazy_profiles.values()):
+        raise SystemExit("❌ frappe was imported just to print --help")
+
+
+if __name__ == "__main__":
+    main()
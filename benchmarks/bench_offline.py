@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""Benchmark the provisioning scripts offline, against an in-memory Frappe stand-in.
+
+``benchmarks/fake_frappe`` replaces ``frappe`` so no ERPNext container is
+needed. Each scenario provisions a synthetic dataset twice: once into an
+empty site (``initial``) and once more to measure an idempotent re-run
+(``rerun``). The report shows round-trips per record, wall time and peak
+Python memory::
+
+    python3 benchmarks/bench_offline.py --sizes 1000,10000 --latency-ms 0.2
+    python3 benchmarks/bench_offline.py --scenario roles --max-queries-per-record 3
+
+``--max-queries-per-record`` exits non-zero when any pass exceeds the
+budget, so CI catches N+1 regressions.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+
+import setup_companies  # noqa: E402
+import setup_erp_crm  # noqa: E402
+import setup_roles_permissions  # noqa: E402
+from org_structure import load_org_structure  # noqa: E402
+from provisioning_state import ProvisioningState  # noqa: E402
+from utils import CompanyConfig, instrumentation  # noqa: E402
+
+assert getattr(frappe, "IS_FAKE", False), "benchmarks/fake_frappe must shadow the real frappe package"
+
+
+@dataclass
+class PassResult:
+    scenario: str
+    size: int
+    phase: str
+    records: int
+    seconds: float
+    round_trips: int
+    peak_mib: float
+    errors: int = 0
+
+    @property
+    def queries_per_record(self) -> float:
+        return self.round_trips / self.records if self.records else 0.0
+
+
+def seed_masters() -> None:
+    """Create the link targets the synthetic records point at."""
+
+    for doctype, fieldname, names in (
+        ("Customer Group", "customer_group_name", ["Commercial"]),
+        ("Territory", "territory_name", ["Spain"]),
+        ("Supplier Group", "supplier_group_name", ["Local"]),
+    ):
+        for name in names:
+            frappe.get_doc({"doctype": doctype, fieldname: name}).insert()
+    frappe.db.commit()
+
+
+def companies_scenario(size: int, args: argparse.Namespace) -> Callable[[], int]:
+    configs = [CompanyConfig("Galaxy Holding", "GH", "Services", is_group=1)]
+    configs.extend(
+        CompanyConfig(f"Bench Company {number:06d}", f"B{number:06d}", "Services", parent_company="Galaxy Holding")
+        for number in range(1, size)
+    )
+
+    def run() -> int:
+        setup_companies.setup_galaxy_companies(configs, [], commit_every=args.commit_every)
+        return len(configs)
+
+    return run
+
+
+def roles_scenario(size: int, args: argparse.Namespace) -> Callable[[], int]:
+    roles = load_org_structure().role_configs(setup_roles_permissions.ROLE_PERMISSIONS)
+    role_names = list(roles)
+    setup_roles_permissions.USER_ROLE_MATRIX = {
+        f"user{number:06d}@bench.local": [role_names[number % len(role_names)], role_names[0]]
+        for number in range(size)
+    }
+
+    def run() -> int:
+        setup_roles_permissions.setup_galaxy_roles(roles, commit_every=args.commit_every, bulk_users=args.bulk)
+        return len(setup_roles_permissions.USER_ROLE_MATRIX)
+
+    return run
+
+
+def erp_scenario(size: int, args: argparse.Namespace) -> Callable[[], int]:
+    share = max(1, size // 5)
+    minor = max(1, size // 20)
+    module = setup_erp_crm
+    module.CUSTOMERS = [
+        {
+            "customer_name": f"Bench Customer {number:06d}",
+            "customer_group": "Commercial",
+            "territory": "Spain",
+            "customer_type": "Company",
+            "primary_contact": {
+                "first_name": "Bench",
+                "last_name": f"{number:06d}",
+                "email_id": f"contact{number:06d}@bench.local",
+                "phone": "+34 600 000 000",
+            },
+        }
+        for number in range(share)
+    ]
+    module.SUPPLIERS = [
+        {
+            "supplier_name": f"Bench Supplier {number:06d}",
+            "supplier_group": "Local",
+            "supplier_type": "Company",
+            "country": "Spain",
+        }
+        for number in range(share)
+    ]
+    module.ITEMS = [
+        {
+            "item_code": f"BENCH-{number:06d}",
+            "item_name": f"Bench Item {number:06d}",
+            "item_group": "Products",
+            "stock_uom": "Nos",
+            "is_stock_item": 1,
+        }
+        for number in range(share)
+    ]
+    module.LEADS = [
+        {"company_name": f"Bench Lead {number:06d}", "lead_name": f"Bench Lead {number:06d}", "status": "Open"}
+        for number in range(share)
+    ]
+    module.PROJECTS = [
+        {
+            "project_name": f"Bench Project {number:06d}",
+            "company": "Galaxy Holding",
+            "is_active": 1,
+            "expected_start_date": "2024-01-01",
+            "expected_end_date": "2024-12-31",
+            "tasks": [{"subject": "Kick-off", "start_date": "2024-01-02", "end_date": "2024-01-31"}],
+        }
+        for number in range(minor)
+    ]
+    module.OPPORTUNITIES = [
+        {
+            "opportunity_name": f"Bench Opportunity {number:06d}",
+            "opportunity_from": "Lead",
+            "lead": f"Bench Lead {number:06d}",
+            "items": [{"item_code": f"BENCH-{number:06d}", "qty": 1, "rate": 100}],
+        }
+        for number in range(minor)
+    ]
+    records = sum(
+        len(dataset)
+        for dataset in (
+            module.CUSTOMERS,
+            module.CUSTOMERS,  # one contact per customer
+            module.SUPPLIERS,
+            module.ITEMS,
+            module.LEADS,
+            module.PROJECTS,
+            module.OPPORTUNITIES,
+        )
+    )
+
+    state_path = Path(tempfile.mkdtemp()) / "setup_erp_crm.json" if args.incremental else None
+
+    def run() -> int:
+        module.provision_all(
+            verifactu_api_key=None,
+            bulk=args.bulk,
+            commit_every=args.commit_every,
+            state=ProvisioningState(state_path, "setup_erp_crm"),
+        )
+        return records
+
+    return run
+
+
+SCENARIOS: Dict[str, Callable[[int, argparse.Namespace], Callable[[], int]]] = {
+    "companies": companies_scenario,
+    "roles": roles_scenario,
+    "erp": erp_scenario,
+}
+
+
+def measure(scenario: str, size: int, phase: str, run: Callable[[], int], args: argparse.Namespace) -> PassResult:
+    instrumentation.reset()
+    if args.memory:
+        tracemalloc.start()
+    frappe.db.round_trips = 0
+
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        records = run()
+    seconds = time.perf_counter() - started
+    errors = sum(1 for line in output.getvalue().splitlines() if "❌" in line)
+
+    peak = 0
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    if args.steps:
+        instrumentation.print_summary()
+    return PassResult(scenario, size, phase, records, seconds, frappe.db.round_trips, peak / 2**20, errors)
+
+
+def print_results(results: List[PassResult]) -> None:
+    print(
+        f"\n  {'scenario':<10} {'size':>8} {'phase':<8} {'records':>8} {'seconds':>9} "
+        f"{'rec/s':>9} {'queries':>9} {'q/rec':>7} {'peak MiB':>9} {'errors':>7}"
+    )
+    for result in results:
+        rate = result.records / result.seconds if result.seconds else 0.0
+        print(
+            f"  {result.scenario:<10} {result.size:>8} {result.phase:<8} {result.records:>8} "
+            f"{result.seconds:>9.2f} {rate:>9.0f} {result.round_trips:>9} "
+            f"{result.queries_per_record:>7.2f} {result.peak_mib:>9.1f} {result.errors:>7}"
+        )
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline provisioning benchmark")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma separated dataset sizes, e.g. 1000,10000,100000")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenario to run (repeatable, default: all)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per round-trip")
+    parser.add_argument("--commit-every", type=int, default=200, help="Records per transaction")
+    parser.add_argument("--bulk", action="store_true", help="Use the bulk insert/bulk user paths")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep an input hash state file between the ERP passes, like nightly re-runs do",
+    )
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip tracemalloc (faster)")
+    parser.add_argument("--steps", action="store_true", help="Print the per-step instrumentation table")
+    parser.add_argument("--json", type=Path, metavar="PATH", help="Also write the results as JSON")
+    parser.add_argument(
+        "--max-queries-per-record",
+        type=float,
+        metavar="N",
+        help="Exit with status 1 when any pass issues more round-trips per record",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results: List[PassResult] = []
+
+    for scenario in args.scenario or list(SCENARIOS):
+        for size in sizes:
+            frappe.connect(latency=args.latency_ms / 1000)
+            seed_masters()
+            run = SCENARIOS[scenario](size, args)
+            print(f"⏱️  {scenario} × {size}...", flush=True)
+            for phase in ("initial", "rerun"):
+                results.append(measure(scenario, size, phase, run, args))
+
+    print_results(results)
+
+    if args.json:
+        args.json.write_text(
+            json.dumps([{**asdict(result), "queries_per_record": result.queries_per_record} for result in results], indent=2)
+            + "\n"
+        )
+
+    if any(result.errors for result in results):
+        print("⚠️  Some records failed; rerun the scenario with --steps or inspect the fake for missing APIs")
+
+    if args.max_queries_per_record is not None:
+        over = [result for result in results if result.queries_per_record > args.max_queries_per_record]
+        for result in over:
+            print(
+                f"❌ {result.scenario} × {result.size} ({result.phase}): "
+                f"{result.queries_per_record:.2f} queries/record > {args.max_queries_per_record}"
+            )
+        if over:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Compare a per-document pipeline report with the cached NumPy forecast.
+
+Seeds the in-memory Frappe stand-in with synthetic Opportunities and their
+items across the CRM companies. The forecast is then computed three ways:
+as a report would, loading every Opportunity and its items again; with a
+full ``pipeline_forecast`` load; and, after some opportunities were
+edited, closed or deleted, with an incremental refresh of the cache. The
+per-document result and the cached forecast must agree to the cent.
+Without ``--latency-ms`` a full load mostly measures the stand-in's own
+filtering of the ``parent in (...)`` item queries::
+
+    python3 benchmarks/bench_pipeline_forecast.py --opportunities 20000 --changes 500
+    python3 benchmarks/bench_pipeline_forecast.py --opportunities 5000 --latency-ms 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import math
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+
+import pipeline_forecast  # noqa: E402
+from pipeline_forecast import OPEN_STATUSES, STAGE_WEIGHTS, ForecastCache  # noqa: E402
+from utils import instrumentation  # noqa: E402
+
+assert getattr(frappe, "IS_FAKE", False), "benchmarks/fake_frappe must shadow the real frappe package"
+
+COMPANIES = ["Galaxy Software", "Galaxy Bio", "Galaxy Engineering"]
+STATUSES = ["Open", "Open", "Open", "Replied", "Quotation", "Converted", "Lost", "Closed"]
+STAGES = list(STAGE_WEIGHTS) + [""]
+OPPORTUNITY_FIELDS = [
+    "name",
+    "modified",
+    "company",
+    "status",
+    "sales_stage",
+    "probability",
+    "expected_closing",
+    "with_items",
+    "opportunity_amount",
+    "conversion_rate",
+]
+ITEM_FIELDS = ["name", "parent", "parenttype", "parentfield", "idx", "item_code", "qty", "rate"]
+
+
+class Pipeline:
+    """Synthetic opportunities, each saved a minute after the previous one."""
+
+    def __init__(self, seed: int) -> None:
+        self.rng = random.Random(seed)
+        self.modified = datetime.datetime.now() - datetime.timedelta(days=365)
+        self.items = 0
+
+    def stamp(self) -> str:
+        self.modified += datetime.timedelta(minutes=1)
+        return self.modified.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def opportunity(self, name: str) -> Tuple[Tuple[Any, ...], List[Tuple[Any, ...]]]:
+        rng = self.rng
+        with_items = int(rng.random() < 0.8)
+        closing = None
+        if rng.random() < 0.95:
+            closing = (datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(730))).isoformat()
+        header = (
+            name,
+            self.stamp(),
+            rng.choice(COMPANIES),
+            rng.choice(STATUSES),
+            rng.choice(STAGES),
+            float(rng.choice([10, 25, 50, 75, 100])),
+            closing,
+            with_items,
+            0.0 if with_items else round(rng.uniform(500, 50_000), 2),
+            rng.choice([1.0, 1.0, 1.0, 1.08]),
+        )
+        items = []
+        for idx in range(1, (rng.randint(1, 6) if with_items else 0) + 1):
+            self.items += 1
+            qty = float(rng.randint(1, 20))
+            rate = round(rng.uniform(10, 2_000), 2)
+            items.append((f"OPI-{self.items:09d}", name, "Opportunity", "items", idx, f"ITEM-{idx:03d}", qty, rate))
+        return header, items
+
+    def seed(self, count: int) -> None:
+        headers, items = [], []
+        for number in range(count):
+            header, rows = self.opportunity(f"CRM-OPP-{number:07d}")
+            headers.append(header)
+            items.extend(rows)
+        frappe.db.bulk_insert("Opportunity", OPPORTUNITY_FIELDS, headers)
+        frappe.db.bulk_insert("Opportunity Item", ITEM_FIELDS, items)
+        frappe.db.commit()
+
+    def change(self, count: int, total: int) -> Tuple[int, int]:
+        """Re-generate ``count`` opportunities (saved again) and delete a tenth as many."""
+
+        names = [f"CRM-OPP-{number:07d}" for number in self.rng.sample(range(total), count + count // 10)]
+        edited, deleted = names[:count], names[count:]
+        for name in edited:
+            header, items = self.opportunity(name)
+            frappe.db.set_value("Opportunity", name, dict(zip(OPPORTUNITY_FIELDS[1:], header[1:])))
+            frappe.db.delete("Opportunity Item", {"parent": name})
+            if items:
+                frappe.db.bulk_insert("Opportunity Item", ITEM_FIELDS, items)
+        for name in deleted:
+            frappe.db.delete("Opportunity Item", {"parent": name})
+            frappe.db.delete("Opportunity", {"name": name})
+        frappe.db.commit()
+        return len(edited), len(deleted)
+
+
+def report_forecast() -> Dict[Tuple[str, str], Tuple[int, float, float]]:
+    """What a report query does: every Opportunity and its items loaded again, one document at a time."""
+
+    totals: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    for name in frappe.get_all("Opportunity", pluck="name", limit_page_length=0):
+        opportunity = frappe.db.get_value("Opportunity", name, OPPORTUNITY_FIELDS, as_dict=True)
+        if opportunity.status not in OPEN_STATUSES:
+            continue
+        amount = opportunity.opportunity_amount or 0.0
+        if opportunity.with_items:
+            items = frappe.get_all("Opportunity Item", filters={"parent": name}, fields=["qty", "rate"])
+            amount = sum(item.qty * item.rate for item in items)
+        amount *= opportunity.conversion_rate or 1
+        weight = STAGE_WEIGHTS.get(opportunity.sales_stage or "")
+        if weight is None:
+            weight = opportunity.probability / 100
+        month = opportunity.expected_closing[:7] if opportunity.expected_closing else ""
+        total = totals[(opportunity.company, month)]
+        total[0] += 1
+        total[1] += amount
+        total[2] += amount * weight
+    return {key: (int(count), pipeline, weighted) for key, (count, pipeline, weighted) in totals.items()}
+
+
+def matches(expected: Dict[Tuple[str, str], Tuple[int, float, float]], cache: ForecastCache) -> bool:
+    rows = pipeline_forecast.compute_forecast(cache).rows
+    actual = {(row.company, row.month): (row.opportunities, row.pipeline, row.weighted) for row in rows}
+    if set(actual) != set(expected):
+        return False
+    return all(
+        actual[key][0] == expected[key][0]
+        and math.isclose(actual[key][1], expected[key][1], abs_tol=0.01)
+        and math.isclose(actual[key][2], expected[key][2], abs_tol=0.01)
+        for key in expected
+    )
+
+
+def measured(label: str, run: Callable[[], Any]) -> Any:
+    with instrumentation.step(label) as metrics:
+        queries = metrics.queries
+        started = time.perf_counter()
+        result = run()
+        seconds = time.perf_counter() - started
+        queries = metrics.queries - queries
+    print(f"  {label:<22} {seconds:8.3f}s  {queries:>7} queries")
+    return result
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the cached pipeline forecast")
+    parser.add_argument("--opportunities", type=int, default=10_000, help="Opportunities in the seeded pipeline")
+    parser.add_argument("--changes", type=int, default=200, help="Opportunities edited before the incremental refresh")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round-trip latency")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    frappe.connect(latency=args.latency_ms / 1000)
+    pipeline = Pipeline(args.seed)
+    pipeline.seed(args.opportunities)
+    print(f"⏱️  {args.opportunities} opportunities with {pipeline.items} items...", flush=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "pipeline_forecast.npz"
+        measured("per-document report", report_forecast)
+        cache = ForecastCache.load(path)
+        full = measured("full load", lambda: pipeline_forecast.refresh_cache(cache))
+        cache.save()
+
+        edited, deleted = pipeline.change(args.changes, args.opportunities)
+        expected = measured("per-document report", report_forecast)
+        cache = measured("load cache file", lambda: ForecastCache.load(path))
+        refresh = measured("incremental refresh", lambda: pipeline_forecast.refresh_cache(cache))
+        forecast = measured("forecast", lambda: pipeline_forecast.compute_forecast(cache))
+        print(
+            f"  full load read {full.read}; after {edited} edits and {deleted} deletions the refresh read "
+            f"{refresh.read} and dropped {refresh.removed}; {len(forecast.rows)} company/month rows"
+        )
+
+    reloaded = ForecastCache(None, cache.columns)
+    pipeline_forecast.refresh_cache(reloaded, full=True)
+    if not matches(expected, cache):
+        raise SystemExit("❌ The incrementally refreshed forecast differs from the per-document report")
+    if not matches(expected, reloaded):
+        raise SystemExit("❌ A full reload differs from the per-document report")
+    print("✅ The incrementally refreshed forecast matches the per-document report and a full reload")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark the Verifactu submitter against the local mock endpoint.
+
+Runs ``submit_payloads`` on synthetic invoices at several concurrency levels,
+with and without keep-alive, against ``mock_verifactu.MockVerifactu`` in the
+same event loop. The report shows invoices/s, connections opened and what the
+mock saw (retries after injected 503s, duplicates, peak requests in flight)::
+
+    python3 benchmarks/bench_verifactu.py --invoices 2000 --latency-ms 40 --fail-rate 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+from mock_verifactu import MockVerifactu  # noqa: E402
+from verifactu_payloads import render_payload  # noqa: E402
+from verifactu_submitter import SubmitterConfig, submit_payloads  # noqa: E402
+
+
+def synthetic_payloads(count: int) -> List[Tuple[str, str]]:
+    payloads = []
+    for number in range(count):
+        invoice = {
+            "name": f"ACC-SINV-2025-{number:06d}",
+            "customer_name": f"Bench Customer {number % 97:03d}",
+            "grand_total": 121.0,
+            "posting_date": "2025-09-30",
+            "tax_id": "B00000000",
+        }
+        items = [{"item_code": "SRV-CONSULT", "description": "Consulting", "base_net_amount": 100.0, "qty": 1}]
+        payloads.append((invoice["name"], render_payload(invoice, items).body))
+    return payloads
+
+
+async def run(args: argparse.Namespace) -> None:
+    payloads = synthetic_payloads(args.invoices)
+    print(
+        f"\n  {'concurrency':>11} {'keep-alive':>10} {'seconds':>8} {'inv/s':>8} {'accepted':>8} "
+        f"{'conns':>6} {'requests':>8} {'503s':>6} {'dupes':>6} {'peak':>5}"
+    )
+    for concurrency in [int(value) for value in args.concurrency.split(",")]:
+        for keep_alive in (False, True):
+            mock = MockVerifactu(args.latency_ms / 1000, args.fail_rate)
+            server = await mock.start()
+            port = server.sockets[0].getsockname()[1]
+            config = SubmitterConfig(
+                url=f"http://127.0.0.1:{port}/v1/invoices",
+                api_key="bench",
+                concurrency=concurrency,
+                backoff_base=0.01,
+                keep_alive=keep_alive,
+            )
+            stats = await submit_payloads(payloads, config)
+            server.close()
+            await server.wait_closed()
+
+            accepted = stats.counts()["Accepted"]
+            rate = len(payloads) / stats.seconds if stats.seconds else 0.0
+            print(
+                f"  {concurrency:>11} {'yes' if keep_alive else 'no':>10} {stats.seconds:>8.2f} {rate:>8.0f} "
+                f"{accepted:>8} {stats.connections:>6} {mock.stats.requests:>8} {mock.stats.failed:>6} "
+                f"{mock.stats.duplicates:>6} {mock.stats.peak_in_flight:>5}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verifactu submitter benchmark")
+    parser.add_argument("--invoices", type=int, default=1000, help="Synthetic invoices per run")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated concurrency levels")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mock response latency")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Compare Verifactu payload rendering: webhook path vs. the bulk builder.
+
+The webhook path is what Frappe does per submitted invoice: load the whole
+document (``get_doc``, one query per child table), compile the template
+string and render it. The bulk path is ``verifactu_payloads.iter_payloads``.
+Both run against the in-memory Frappe stand-in, and their payloads are
+checked to be identical. A few invoices carry quotes, backslashes,
+newlines and HTML in the customer name and item description, and must
+still render to JSON that decodes back to the stored values::
+
+    python3 benchmarks/bench_verifactu_payloads.py --invoices 5000 --items 5 --latency-ms 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks" / "fake_frappe"), str(ROOT / "scripts")]
+
+import frappe  # noqa: E402
+
+from verifactu_payloads import VERIFACTU_PAYLOAD_TEMPLATE, iter_payloads  # noqa: E402
+
+
+def seed_invoices(count: int, items: int) -> None:
+    for number in range(count):
+        frappe.get_doc(
+            {
+                "doctype": "Sales Invoice",
+                "name": f"ACC-SINV-2025-{number:06d}",
+                "customer_name": f"Bench Customer {number % 97:03d}",
+                "grand_total": 121.0 * items,
+                "rounded_total": 121.0 * items,
+                "posting_date": "2025-09-30",
+                "tax_id": "B00000000",
+                "docstatus": 1,
+                "items": [
+                    {"item_code": f"SRV-{line:03d}", "description": "Consulting", "base_net_amount": 100.0, "qty": 1}
+                    for line in range(items)
+                ],
+            }
+        ).insert()
+    frappe.db.commit()
+
+
+# Customer names and item descriptions that break naively quoted JSON.
+AWKWARD_TEXT = [
+    ('Bar "El Rincón"', '<div class="ql-editor"><p>Caf\u00e9 "solo"</p>\n<p>2 x 50cl</p></div>'),
+    ("Line\nBreak & Sons, S.L.", "Path C:\\temp\\ and a tab\t<br>"),
+]
+
+
+def seed_awkward_invoices() -> List[str]:
+    names = []
+    for number, (customer, description) in enumerate(AWKWARD_TEXT):
+        name = f"ACC-SINV-2025-AWK{number:03d}"
+        frappe.get_doc(
+            {
+                "doctype": "Sales Invoice",
+                "name": name,
+                "customer_name": customer,
+                "grand_total": 121.0,
+                "rounded_total": 121.0,
+                "posting_date": "2025-09-30",
+                "tax_id": None,
+                "docstatus": 1,
+                "items": [{"item_code": "SRV-001", "description": description, "base_net_amount": 100.0, "qty": 1}],
+            }
+        ).insert()
+        names.append(name)
+    frappe.db.commit()
+    return names
+
+
+def check_escaping(payloads: Dict[str, str], names: List[str]) -> None:
+    for name, (customer, description) in zip(names, AWKWARD_TEXT):
+        if payloads.get(name) is None:
+            raise SystemExit(f"❌ {name} did not render to valid JSON")
+        body = json.loads(payloads[name])
+        if body["customer"] != customer or body["items"][0]["description"] != description:
+            raise SystemExit(f"❌ {name} did not round-trip its customer name and description")
+    print(f"✅ {len(names)} invoices with quotes, backslashes, newlines and HTML rendered to valid JSON")
+
+
+def webhook_path() -> Dict[str, str]:
+    payloads = {}
+    for name in frappe.get_all("Sales Invoice", filters={"docstatus": 1}, pluck="name"):
+        doc = frappe.get_doc("Sales Invoice", name)
+        # Document exposes fields as attributes, which the fake's dict-based docs do not.
+        rendered = frappe.render_template(VERIFACTU_PAYLOAD_TEMPLATE, {"doc": SimpleNamespace(**doc)})
+        payloads[name] = json.dumps(json.loads(rendered), separators=(",", ":"), ensure_ascii=False)
+    return payloads
+
+
+def bulk_path() -> Dict[str, str]:
+    return {payload.invoice: payload.body for payload in iter_payloads()}
+
+
+def measure(label: str, run: Callable[[], Dict[str, str]]) -> Dict[str, str]:
+    frappe.db.round_trips = 0
+    started = time.perf_counter()
+    payloads = run()
+    seconds = time.perf_counter() - started
+    count = len(payloads)
+    print(
+        f"  {label:<8} {count:>8} {seconds:>9.2f} {count / seconds if seconds else 0:>10.0f} "
+        f"{frappe.db.round_trips:>9} {frappe.db.round_trips / count if count else 0:>7.3f}"
+    )
+    return payloads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verifactu payload rendering benchmark")
+    parser.add_argument("--invoices", type=int, default=2000, help="Submitted invoices to render")
+    parser.add_argument("--items", type=int, default=5, help="Item rows per invoice")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per round-trip")
+    args = parser.parse_args()
+
+    frappe.connect()
+    seed_invoices(args.invoices, args.items)
+    awkward = seed_awkward_invoices()
+    frappe.db.latency = args.latency_ms / 1000
+
+    print(f"\n  {'path':<8} {'invoices':>8} {'seconds':>9} {'inv/s':>10} {'queries':>9} {'q/inv':>7}")
+    results: List[Dict[str, str]] = [measure("webhook", webhook_path), measure("bulk", bulk_path)]
+    if results[0] != results[1]:
+        raise SystemExit("❌ The bulk builder rendered different payloads than the webhook path")
+    check_escaping(results[1], awkward)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,637 @@
+"""In-memory stand-in for the parts of ``frappe`` the provisioning scripts use.
+
+Only meant for ``benchmarks/bench_offline.py``: every database call counts
+as one round-trip (and optionally sleeps to simulate network latency) and
+goes through ``db.sql`` so the instrumentation in ``scripts/utils.py``
+sees the same query stream it would on a real site. Documents are plain
+dicts; child tables live in their own doctype tables like in MariaDB.
+"""
+
+from __future__ import annotations
+
+import copy
+import itertools
+import os
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+IS_FAKE = True
+
+
+class ValidationError(Exception):
+    pass
+
+
+class DuplicateEntryError(ValidationError):
+    pass
+
+
+class DoesNotExistError(ValidationError):
+    pass
+
+
+class _dict(dict):
+    """``frappe._dict``: a dict with attribute access."""
+
+    def __getattr__(self, key: str) -> Any:
+        return self.get(key)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        self[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+
+# (doctype, table fieldname) -> child doctype
+TABLE_FIELDS: Dict[Tuple[str, str], str] = {
+    ("BOM", "items"): "BOM Item",
+    ("Contact", "email_ids"): "Contact Email",
+    ("Contact", "links"): "Dynamic Link",
+    ("Contact", "phone_nos"): "Contact Phone",
+    ("Opportunity", "items"): "Opportunity Item",
+    ("Project", "tasks"): "Project Task",
+    ("Sales Invoice", "items"): "Sales Invoice Item",
+    ("Sales Invoice", "taxes"): "Sales Taxes and Charges",
+    ("User", "roles"): "Has Role",
+}
+
+UPSERT_STATEMENT = re.compile(
+    r"\s*insert into `tab(?P<doctype>[^`]+)` \((?P<fields>[^)]*)\)\s*values .*"
+    r"on duplicate key update (?P<updates>.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# ``count(field) as alias`` / ``sum(field) as alias`` in grouped get_all fields
+AGGREGATE_FIELD = re.compile(r"(?P<function>count|sum)\((?P<field>\w+)\) as (?P<alias>\w+)", re.IGNORECASE)
+
+# doctype -> field whose value becomes the document name
+AUTONAME_FIELDS: Dict[str, str] = {
+    "Company": "company_name",
+    "Customer": "customer_name",
+    "Customer Group": "customer_group_name",
+    "Item": "item_code",
+    "Role": "role_name",
+    "Supplier": "supplier_name",
+    "Supplier Group": "supplier_group_name",
+    "Territory": "territory_name",
+    "User": "email",
+    "Webhook": "webhook_name",
+}
+
+# doctypes named "<field> - <company abbr>"
+ABBR_NAMED_FIELDS: Dict[str, str] = {
+    "Account": "account_name",
+    "Cost Center": "cost_center_name",
+    "Warehouse": "warehouse_name",
+}
+
+DOCTYPE_FIELDS: Dict[str, List[Dict[str, Any]]] = {
+    "Customer": [
+        {"fieldname": "customer_name", "fieldtype": "Data", "reqd": 1},
+        {"fieldname": "customer_group", "fieldtype": "Link", "options": "Customer Group"},
+        {"fieldname": "territory", "fieldtype": "Link", "options": "Territory"},
+        {"fieldname": "customer_type", "fieldtype": "Select", "options": "Company\nIndividual"},
+    ],
+    "Supplier": [
+        {"fieldname": "supplier_name", "fieldtype": "Data", "reqd": 1},
+        {"fieldname": "supplier_group", "fieldtype": "Link", "options": "Supplier Group"},
+        {"fieldname": "supplier_type", "fieldtype": "Select", "options": "Company\nIndividual"},
+    ],
+    "Lead": [
+        {"fieldname": "company_name", "fieldtype": "Data"},
+        {"fieldname": "status", "fieldtype": "Select", "options": "Lead\nOpen\nReplied\nInterested\nConverted"},
+    ],
+}
+
+
+class Meta:
+    def __init__(self, doctype: str) -> None:
+        self.name = doctype
+        self.autoname = ""
+        self.fields = [
+            _dict({"default": None, "reqd": 0, "options": "", **df}) for df in DOCTYPE_FIELDS.get(doctype, [])
+        ]
+        for (parent, fieldname), child in TABLE_FIELDS.items():
+            if parent == doctype:
+                self.fields.append(_dict(fieldname=fieldname, fieldtype="Table", options=child, reqd=0, default=None))
+
+    def get_field(self, fieldname: str) -> Optional[_dict]:
+        return next((df for df in self.fields if df.fieldname == fieldname), None)
+
+    def get_table_fields(self) -> List[_dict]:
+        return [df for df in self.fields if df.fieldtype == "Table"]
+
+
+def get_meta(doctype: str, cached: bool = True) -> Meta:
+    return Meta(doctype)
+
+
+def _child_doctype(doctype: str, fieldname: str) -> str:
+    return TABLE_FIELDS.get((doctype, fieldname), f"{doctype} {fieldname}")
+
+
+class Document(_dict):
+    """Dict-backed document; child table rows are ``_dict`` instances."""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__()
+        self.update(data or {})
+
+    def update(self, values: Dict[str, Any] = None, **kwargs: Any) -> "Document":  # type: ignore[override]
+        for key, value in {**(values or {}), **kwargs}.items():
+            if isinstance(value, list):
+                value = [_dict(row.as_dict() if hasattr(row, "as_dict") else row) for row in value]
+            dict.__setitem__(self, key, value)
+        return self
+
+    def append(self, fieldname: str, row: Optional[Dict[str, Any]] = None) -> _dict:
+        child = _dict(row or {})
+        rows = self.get(fieldname)
+        if not isinstance(rows, list):
+            rows = []
+            dict.__setitem__(self, fieldname, rows)
+        rows.append(child)
+        return child
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def insert(self, ignore_permissions: bool = False, **kwargs: Any) -> "Document":
+        db.insert_doc(self)
+        return self
+
+    def db_insert(self, *args: Any, **kwargs: Any) -> None:
+        db.insert_doc(self)
+
+    def save(self, ignore_permissions: bool = False, **kwargs: Any) -> "Document":
+        db.save_doc(self)
+        return self
+
+    def db_set(self, fieldname: str, value: Any, **kwargs: Any) -> None:
+        self[fieldname] = value
+        db.set_value(self.doctype, self.name, fieldname, value)
+
+    def run_method(self, method: str, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def get_valid_dict(self, convert_dates_to_str: bool = False, **kwargs: Any) -> Dict[str, Any]:
+        return {key: value for key, value in self.items() if not isinstance(value, list)}
+
+
+def _matches(row: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for field, condition in filters.items():
+        value = row.get(field)
+        if isinstance(condition, (list, tuple)):
+            operator, operand = condition[0].lower(), condition[1]
+            if operator == "in" and value not in operand:
+                return False
+            if operator == "not in" and value in operand:
+                return False
+            if operator == "!=" and value == operand:
+                return False
+            if operator == "=" and value != operand:
+                return False
+            if operator == "like" and str(operand).strip("%") not in str(value or ""):
+                return False
+            if operator in (">", "<", ">=", "<="):
+                if value is None:
+                    return False
+                if not {
+                    ">": value > operand,
+                    "<": value < operand,
+                    ">=": value >= operand,
+                    "<=": value <= operand,
+                }[operator]:
+                    return False
+            if operator == "between" and not (value is not None and operand[0] <= value <= operand[1]):
+                return False
+            if operator == "is":
+                is_set = value not in (None, "")
+                if (operand == "set") != is_set:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class Database:
+    """Tables of ``name -> row`` dicts with lazily built equality indexes."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.round_trips = 0
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._indexes: Dict[Tuple[str, str], Dict[Any, set]] = {}
+        self._journal: List[Tuple[str, str, Optional[Dict[str, Any]]]] = []
+        self._savepoints: Dict[str, int] = {}
+        self._cursor = SimpleNamespace(rowcount=0)
+        self._counter = itertools.count(1)
+
+    # -- round-trips -------------------------------------------------------
+
+    def sql(self, query: Any, values: Any = None, as_dict: bool = False, **kwargs: Any) -> List[Any]:
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+        upsert = UPSERT_STATEMENT.match(str(query))
+        if upsert:
+            self._upsert(upsert, values)
+        return []
+
+    def _upsert(self, statement: "re.Match[str]", values: Any) -> None:
+        """``INSERT ... ON DUPLICATE KEY UPDATE `f` = `f` + values(`f`)``, keyed on the DocType's unique fields."""
+
+        doctype = statement["doctype"]
+        fields = [field.strip(" `") for field in statement["fields"].split(",")]
+        summed = re.findall(r"`(\w+)` = `\w+` \+ values\(`\w+`\)", statement["updates"])
+        unique = [
+            row["fieldname"]
+            for row in self._select(_child_doctype("DocType", "fields"), {"parent": doctype})
+            if row.get("unique")
+        ]
+        values = list(values)
+        affected = 0
+        for start in range(0, len(values), len(fields)):
+            row = dict(zip(fields, values[start : start + len(fields)]))
+            existing = next(
+                (match for field in unique for match in self._select(doctype, {field: row[field]})),
+                self._table(doctype).get(row["name"]),
+            )
+            if existing is None:
+                self._write(doctype, row["name"], {"doctype": doctype, **row})
+                affected += 1
+            else:
+                updates = {field: (existing.get(field) or 0) + (row[field] or 0) for field in summed}
+                self._write(doctype, existing["name"], {**existing, **updates})
+                affected += 2
+        self._cursor.rowcount = affected
+
+    def _query(self, statement: str, rowcount: int = 0) -> None:
+        self._cursor.rowcount = rowcount
+        self.sql(statement)
+
+    def commit(self) -> None:
+        self._query("COMMIT")
+        self._journal.clear()
+        self._savepoints.clear()
+
+    def rollback(self, save_point: Optional[str] = None) -> None:
+        self._query(f"ROLLBACK TO SAVEPOINT {save_point}" if save_point else "ROLLBACK")
+        position = self._savepoints.get(save_point, 0) if save_point else 0
+        while len(self._journal) > position:
+            doctype, name, previous = self._journal.pop()
+            self._indexes = {key: index for key, index in self._indexes.items() if key[0] != doctype}
+            if previous is None:
+                self.tables.get(doctype, {}).pop(name, None)
+            else:
+                self.tables.setdefault(doctype, {})[name] = previous
+        if not save_point:
+            self._savepoints.clear()
+
+    def savepoint(self, name: str) -> None:
+        self._query(f"SAVEPOINT {name}")
+        self._savepoints[name] = len(self._journal)
+
+    def release_savepoint(self, name: str) -> None:
+        self._query(f"RELEASE SAVEPOINT {name}")
+        self._savepoints.pop(name, None)
+
+    # -- storage -----------------------------------------------------------
+
+    def _table(self, doctype: str) -> Dict[str, Dict[str, Any]]:
+        return self.tables.setdefault(doctype, {})
+
+    def _index(self, doctype: str, field: str) -> Dict[Any, set]:
+        key = (doctype, field)
+        if key not in self._indexes:
+            index: Dict[Any, set] = {}
+            for name, row in self._table(doctype).items():
+                index.setdefault(row.get(field), set()).add(name)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _write(self, doctype: str, name: str, row: Optional[Dict[str, Any]]) -> None:
+        table = self._table(doctype)
+        previous = table.get(name)
+        self._journal.append((doctype, name, copy.copy(previous) if previous is not None else None))
+        for (indexed_doctype, field), index in self._indexes.items():
+            if indexed_doctype != doctype:
+                continue
+            if previous is not None:
+                index.get(previous.get(field), set()).discard(name)
+            if row is not None:
+                index.setdefault(row.get(field), set()).add(name)
+        if row is None:
+            table.pop(name, None)
+        else:
+            table[name] = row
+
+    def _candidates(self, doctype: str, filters: Dict[str, Any]) -> Iterable[str]:
+        """Pick the most selective indexed condition, like a query planner would."""
+
+        table = self._table(doctype)
+        best: Iterable[str] = table
+        for field, condition in filters.items():
+            if isinstance(condition, (list, tuple)):
+                if condition[0].lower() != "in":
+                    continue
+                if field == "name":
+                    names: Iterable[str] = {value for value in condition[1] if value in table}
+                else:
+                    index = self._index(doctype, field)
+                    names = set().union(*(index.get(value, set()) for value in condition[1]))
+            elif field == "name":
+                names = [condition] if condition in table else []
+            else:
+                names = self._index(doctype, field).get(condition, set())
+            if len(names) < len(best):  # type: ignore[arg-type]
+                best = names
+        return list(best)
+
+    def _select(self, doctype: str, filters: Any) -> List[Dict[str, Any]]:
+        if filters is None:
+            filters = {}
+        elif isinstance(filters, str):
+            filters = {"name": filters}
+        elif isinstance(filters, list):
+            filters = {condition[-3]: [condition[-2], condition[-1]] for condition in filters}
+        table = self._table(doctype)
+        return [table[name] for name in self._candidates(doctype, filters) if _matches(table[name], filters)]
+
+    def autoname(self, doc: Dict[str, Any]) -> str:
+        doctype = doc["doctype"]
+        if doctype in AUTONAME_FIELDS and doc.get(AUTONAME_FIELDS[doctype]):
+            return doc[AUTONAME_FIELDS[doctype]]
+        if doctype in ABBR_NAMED_FIELDS and doc.get("company"):
+            company = self._table("Company").get(doc["company"], {})
+            return f"{doc.get(ABBR_NAMED_FIELDS[doctype])} - {company.get('abbr', doc['company'])}"
+        return f"{doctype.upper().replace(' ', '-')}-{next(self._counter):07d}"
+
+    # -- document API ------------------------------------------------------
+
+    def insert_doc(self, doc: Document) -> None:
+        if not doc.get("name"):
+            dict.__setitem__(doc, "name", self.autoname(doc))
+        if doc["name"] in self._table(doc["doctype"]):
+            raise DuplicateEntryError(f"{doc['doctype']} {doc['name']} already exists")
+
+        self._query(f"INSERT INTO `tab{doc['doctype']}`", 1)
+        self._write(doc["doctype"], doc["name"], dict(doc.get_valid_dict()))
+        for fieldname, rows in doc.items():
+            if isinstance(rows, list):
+                self._write_children(doc, fieldname, rows)
+
+    def save_doc(self, doc: Document) -> None:
+        if doc.get("name") not in self._table(doc["doctype"]):
+            raise DoesNotExistError(f"{doc['doctype']} {doc.get('name')} not found")
+
+        self._query(f"UPDATE `tab{doc['doctype']}`", 1)
+        self._write(doc["doctype"], doc["name"], dict(doc.get_valid_dict()))
+        for fieldname, rows in doc.items():
+            if isinstance(rows, list):
+                child_doctype = _child_doctype(doc["doctype"], fieldname)
+                stale = [
+                    row["name"]
+                    for row in self._select(child_doctype, {"parent": doc["name"], "parentfield": fieldname})
+                ]
+                self._query(f"DELETE FROM `tab{child_doctype}`", len(stale))
+                for name in stale:
+                    self._write(child_doctype, name, None)
+                self._write_children(doc, fieldname, rows)
+
+    def _write_children(self, doc: Document, fieldname: str, rows: List[Dict[str, Any]]) -> None:
+        child_doctype = _child_doctype(doc["doctype"], fieldname)
+        for idx, row in enumerate(rows, start=1):
+            row.update(
+                {
+                    "parent": doc["name"],
+                    "parenttype": doc["doctype"],
+                    "parentfield": fieldname,
+                    "idx": idx,
+                    "doctype": child_doctype,
+                }
+            )
+            if not row.get("name"):
+                row["name"] = f"{next(self._counter):010x}"
+            self._query(f"INSERT INTO `tab{child_doctype}`", 1)
+            self._write(child_doctype, row["name"], dict(row))
+
+    def load_doc(self, doctype: str, name: str) -> Document:
+        self._query(f"SELECT * FROM `tab{doctype}`")
+        row = self._table(doctype).get(name)
+        if row is None:
+            raise DoesNotExistError(f"{doctype} {name} not found")
+
+        doc = Document(row)
+        for df in get_meta(doctype).get_table_fields():
+            self._query(f"SELECT * FROM `tab{df.options}`")
+            children = sorted(
+                self._select(df.options, {"parent": name, "parentfield": df.fieldname}),
+                key=lambda child: child.get("idx") or 0,
+            )
+            doc.update({df.fieldname: [_dict(child) for child in children]})
+        return doc
+
+    # -- frappe.db API -----------------------------------------------------
+
+    def exists(self, doctype: str, filters: Any = None, **kwargs: Any) -> Optional[str]:
+        self._query(f"SELECT name FROM `tab{doctype}`")
+        rows = self._select(doctype, filters)
+        return rows[0]["name"] if rows else None
+
+    def get_value(
+        self,
+        doctype: str,
+        filters: Any = None,
+        fieldname: Any = "name",
+        as_dict: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        self._query(f"SELECT {fieldname} FROM `tab{doctype}`")
+        rows = self._select(doctype, filters if filters is not None else {})
+        if not rows:
+            return None
+        row = rows[0]
+        if isinstance(fieldname, (list, tuple)):
+            values = {field: row.get(field) for field in fieldname}
+            return _dict(values) if as_dict else tuple(values.values())
+        return _dict({fieldname: row.get(fieldname)}) if as_dict else row.get(fieldname)
+
+    def get_all(
+        self,
+        doctype: str,
+        filters: Any = None,
+        fields: Any = None,
+        order_by: Optional[str] = None,
+        limit_page_length: int = 0,
+        pluck: Optional[str] = None,
+        as_list: bool = False,
+        group_by: Optional[str] = None,
+        **kwargs: Any,
+    ) -> List[Any]:
+        self._query(f"SELECT FROM `tab{doctype}`")
+        rows = self._select(doctype, filters)
+        if group_by:
+            rows = self._group(rows, [fields] if isinstance(fields, str) else fields, group_by)
+            fields = [AGGREGATE_FIELD.sub(r"\g<alias>", field) for field in fields]
+        if order_by:
+            field, _, direction = order_by.partition(" ")
+            rows.sort(key=lambda row: (row.get(field) is None, row.get(field) or 0), reverse=direction == "desc")
+        if limit_page_length:
+            rows = rows[:limit_page_length]
+        if pluck:
+            return [row.get(pluck) for row in rows]
+        if isinstance(fields, str):
+            fields = [fields]
+        if not fields or fields == ["*"]:
+            return [_dict(row) for row in rows]
+        if as_list:
+            return [tuple(row.get(field) for field in fields) for row in rows]
+        return [_dict({field: row.get(field) for field in fields}) for row in rows]
+
+    get_list = get_all
+
+    @staticmethod
+    def _group(rows: List[Dict[str, Any]], fields: List[str], group_by: str) -> List[Dict[str, Any]]:
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for row in rows:
+            group = groups.setdefault(row.get(group_by), {})
+            for field in fields:
+                aggregate = AGGREGATE_FIELD.fullmatch(field)
+                if aggregate is None:
+                    group[field] = row.get(field)
+                elif aggregate["function"].lower() == "count":
+                    group[aggregate["alias"]] = group.get(aggregate["alias"], 0) + 1
+                else:
+                    group[aggregate["alias"]] = group.get(aggregate["alias"], 0) + (row.get(aggregate["field"]) or 0)
+        return list(groups.values())
+
+    def set_value(self, doctype: str, name: str, fieldname: Any, value: Any = None, **kwargs: Any) -> None:
+        values = fieldname if isinstance(fieldname, dict) else {fieldname: value}
+        row = self._table(doctype).get(name)
+        self._query(f"UPDATE `tab{doctype}`", 1 if row is not None else 0)
+        if row is not None:
+            self._write(doctype, name, {**row, **values})
+
+    def delete(self, doctype: str, filters: Any = None) -> None:
+        names = [row["name"] for row in self._select(doctype, filters)]
+        self._query(f"DELETE FROM `tab{doctype}`", len(names))
+        for name in names:
+            self._write(doctype, name, None)
+
+    def get_global(self, key: str, user: str = "__global") -> Any:
+        return self.get_value("DefaultValue", f"{user}:{key}", "defvalue")
+
+    def set_global(self, key: str, value: Any, user: str = "__global") -> None:
+        name = f"{user}:{key}"
+        self._query("REPLACE INTO `tabDefaultValue`", 1)
+        self._write("DefaultValue", name, {"doctype": "DefaultValue", "name": name, "defkey": key, "defvalue": value})
+
+    def bulk_insert(
+        self,
+        doctype: str,
+        fields: List[str],
+        values: Iterable[Tuple[Any, ...]],
+        ignore_duplicates: bool = False,
+        *,
+        chunk_size: int = 10_000,
+    ) -> None:
+        rows = [dict(zip(fields, row)) for row in values]
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start : start + chunk_size]
+            self._query(f"INSERT INTO `tab{doctype}`", len(chunk))
+            for row in chunk:
+                if row["name"] in self._table(doctype):
+                    if ignore_duplicates:
+                        continue
+                    raise DuplicateEntryError(f"{doctype} {row['name']} already exists")
+                self._write(doctype, row["name"], {"doctype": doctype, **row})
+
+
+local = SimpleNamespace(site=None)
+session = _dict(user="Administrator")
+flags = _dict()
+db: Database = Database()
+
+
+def init(site: Optional[str] = None, **kwargs: Any) -> None:
+    local.site = site
+
+
+def connect(site: Optional[str] = None, latency: float = 0.0, **kwargs: Any) -> Database:
+    """Open a fresh, empty in-memory site."""
+
+    global db
+    db = Database(latency)
+    return db
+
+
+def destroy() -> None:
+    local.site = None
+
+
+def get_doc(doctype: Any, name: Optional[str] = None, **kwargs: Any) -> Document:
+    if isinstance(doctype, dict):
+        return Document(doctype)
+    return db.load_doc(doctype, name)
+
+
+def new_doc(doctype: str, **kwargs: Any) -> Document:
+    return Document({"doctype": doctype})
+
+
+def get_all(doctype: str, *args: Any, **kwargs: Any) -> List[Any]:
+    return db.get_all(doctype, *args, **kwargs)
+
+
+get_list = get_all
+
+
+def get_value(doctype: str, filters: Any = None, fieldname: Any = "name", **kwargs: Any) -> Any:
+    return db.get_value(doctype, filters, fieldname, **kwargs)
+
+
+def get_cached_value(doctype: str, name: str, fieldname: Any = "name", **kwargs: Any) -> Any:
+    return db.get_value(doctype, name, fieldname, **kwargs)
+
+
+def get_site_path(*path: str) -> str:
+    return os.path.join(tempfile.gettempdir(), "fake_frappe_sites", local.site or "site", *path)
+
+
+def clear_cache(**kwargs: Any) -> None:
+    return None
+
+
+_jenv = None
+
+
+def get_jenv() -> Any:
+    """Plain Jinja environment (the real one adds Frappe's filters and globals)."""
+
+    global _jenv
+    if _jenv is None:
+        import jinja2
+
+        _jenv = jinja2.Environment()
+    return _jenv
+
+
+def render_template(template: str, context: Dict[str, Any], **kwargs: Any) -> str:
+    return get_jenv().from_string(template).render(context)
+
+
+def throw(message: str, exc: type = ValidationError, **kwargs: Any) -> None:
+    raise exc(message)
+
+
+def msgprint(*args: Any, **kwargs: Any) -> None:
+    return None
+
+
+def log_error(title: Optional[str] = None, message: Optional[str] = None, **kwargs: Any) -> Document:
+    return get_doc({"doctype": "Error Log", "method": title, "error": message}).insert(ignore_permissions=True)
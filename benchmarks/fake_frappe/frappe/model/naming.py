@@ -0,0 +1,12 @@
+"""``frappe.model.naming.set_new_name`` backed by the in-memory site."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import frappe
+
+
+def set_new_name(doc: Any) -> None:
+    if not doc.get("name"):
+        doc["name"] = frappe.db.autoname(doc)
@@ -0,0 +1,63 @@
+"""Date helpers of ``frappe.utils`` used by the provisioning scripts."""
+
+from __future__ import annotations
+
+import datetime
+from typing import Any
+
+
+def now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def nowdate() -> str:
+    return datetime.date.today().isoformat()
+
+
+def getdate(value: Any = None) -> datetime.date:
+    if value is None:
+        return datetime.date.today()
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def flt(value: Any, precision: int | None = None) -> float:
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        number = 0.0
+    return round(number, precision) if precision is not None else number
+
+
+def cint(value: Any) -> int:
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def now_datetime() -> datetime.datetime:
+    return datetime.datetime.now()
+
+
+def add_to_date(value: Any = None, as_string: bool = False, **kwargs: Any) -> Any:
+    if value is None:
+        value = now_datetime()
+    elif isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    units = {key: kwargs[key] for key in ("days", "hours", "minutes", "seconds") if key in kwargs}
+    result = value + datetime.timedelta(**units)
+    return result.strftime("%Y-%m-%d %H:%M:%S.%f") if as_string else result
+
+
+def get_datetime(value: Any = None) -> datetime.datetime:
+    if value is None:
+        return now_datetime()
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
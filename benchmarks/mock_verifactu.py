@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Verifactu invoice endpoint.
+
+Speaks just enough HTTP/1.1 (keep-alive, Content-Length bodies) for
+``scripts/verifactu_submitter.py``. Each request waits ``--latency-ms``.
+A ``--fail-rate`` share of requests answers ``503`` with ``Retry-After: 0``,
+and payloads without an ``invoice_number`` get ``422``. Accepted invoices
+return a CSV and a QR code. A repeated ``Idempotency-Key`` gets the original
+answer back and is counted as a duplicate::
+
+    python3 benchmarks/mock_verifactu.py --port 8085 --latency-ms 40 --fail-rate 0.05
+    python3 scripts/verifactu_submitter.py --site galaxy.local --url http://127.0.0.1:8085/v1/invoices --api-key test
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+
+@dataclass
+class MockStats:
+    connections: int = 0
+    requests: int = 0
+    accepted: int = 0
+    failed: int = 0
+    rejected: int = 0
+    duplicates: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+
+@dataclass
+class MockVerifactu:
+    latency: float = 0.0
+    fail_rate: float = 0.0
+    api_key: Optional[str] = None
+    stats: MockStats = field(default_factory=MockStats)
+    _answers: Dict[str, Tuple[int, Dict[str, str]]] = field(default_factory=dict)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._serve, host, port)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, data = await self._answer(headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                payload = json.dumps(data).encode()
+                extra = "Retry-After: 0\r\n" if status == 503 else ""
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n{extra}"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode()
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, str]]:
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        finally:
+            stats.in_flight -= 1
+
+        if self.api_key is not None and headers.get("x-api-key") != self.api_key:
+            stats.rejected += 1
+            return 401, {"error": "invalid API key"}
+
+        key = headers.get("idempotency-key", "")
+        if key in self._answers:
+            stats.duplicates += 1
+            return self._answers[key]
+
+        if random.random() < self.fail_rate:
+            stats.failed += 1
+            return 503, {"error": "service busy"}
+
+        try:
+            invoice = json.loads(body)["invoice_number"]
+        except (ValueError, KeyError, TypeError):
+            stats.rejected += 1
+            return 422, {"error": "invoice_number is required"}
+
+        digest = hashlib.sha256(body).hexdigest()
+        answer = (
+            200,
+            {
+                "status": "accepted",
+                "csv": digest[:16].upper(),
+                "qr_code": f"https://verifactu.mock/qr?invoice={invoice}&csv={digest[:16].upper()}",
+            },
+        )
+        self._answers[key or invoice] = answer
+        stats.accepted += 1
+        return answer
+
+
+async def serve(args: argparse.Namespace) -> None:
+    mock = MockVerifactu(args.latency_ms / 1000, args.fail_rate, args.api_key)
+    server = await mock.start(args.host, args.port)
+    print(f"🧪 Mock Verifactu listening on http://{args.host}:{args.port}/v1/invoices")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        print(f"  ↳ {mock.stats}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock Verifactu HTTP endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--api-key", help="Reject requests without this X-API-KEY")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""Materialised GL balances per company, account, cost centre and month.
+
+Month-end dashboards otherwise sum the whole GL history on every load.
+``Galaxy Balance Snapshot`` (a custom DocType created on first run) keeps
+the debit/credit totals per ``(company, account, cost centre, period)``.
+It is seeded from the full ledger once, and afterwards only GL Entries
+created since each company's high-water mark are read and added. The mark
+is stored with ``frappe.db.set_global`` and committed together with the
+snapshot rows, so a crashed refresh simply resumes from the last
+checkpoint.
+
+Cancelling a voucher flags its entries and posts reversing ones, so the
+snapshot sums every entry (cancelled or not) and the pairs net to zero.
+Entries younger than ``--settle-seconds`` are left for the next run, so a
+transaction that commits late cannot be skipped by a mark that has already
+moved past it. Reposting (Repost Item Valuation, Repost Accounting Ledger)
+deletes GL Entries and creates them again, which the refresh cannot see:
+the replacements are added on top of the deleted rows. ``--reconcile``
+compares per-month totals of the ledger (grouped in the database) with the
+snapshot and rebuilds the months that drifted; run it nightly.
+
+The companies are those of the organisation structure that
+``setup_companies.py`` provisions::
+
+    python3 /scripts/balance_snapshot.py --site galaxy.local                 # seed, then refresh incrementally
+    python3 /scripts/balance_snapshot.py --site galaxy.local --report --to-date 2025-12-31 > tb.csv
+    python3 /scripts/balance_snapshot.py --site galaxy.local --verify 200   # compare a sample with the raw ledger
+    python3 /scripts/balance_snapshot.py --site galaxy.local --reconcile    # rebuild months changed by reposting
+
+``scripts/`` is not an installed Frappe app, so workers and the scheduler
+cannot import this module. Refresh it from the host's cron instead (e.g.
+every 5 minutes); overlapping runs exit at once thanks to the lock file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import calendar
+import contextlib
+import csv
+import hashlib
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from bulk_insert import build_doc, upsert_rows
+from cli import load_configuration, positive_int
+from lazy_imports import lazy_import
+from org_structure import OrgStructure, add_org_structure_arguments, load_from_arguments
+from setup_companies import company_abbreviations
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    ensure_doc,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+    single_instance,
+)
+
+
+frappe = lazy_import("frappe")
+frappe_utils = lazy_import("frappe.utils")
+
+
+SNAPSHOT_DOCTYPE = "Galaxy Balance Snapshot"
+MARK_KEY = "galaxy_balance_snapshot_mark"
+START_MARK = "1900-01-01 00:00:00"
+GL_FIELDS = ["name", "creation", "account", "cost_center", "posting_date", "debit", "credit"]
+DEFAULT_PAGE_SIZE = 20_000
+DEFAULT_SETTLE_SECONDS = 60
+# GL rows accumulated before the snapshot rows and the mark are written and committed
+DEFAULT_CHECKPOINT_ROWS = 200_000
+
+# (company, account, cost centre or "", first day of the month)
+BalanceKey = Tuple[str, str, str, str]
+
+
+@dataclass
+class RefreshResult:
+    companies: int = 0
+    entries: int = 0
+    created: int = 0
+    updated: int = 0
+    seeded: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+@dataclass
+class ReconcileResult:
+    periods: int = 0
+    rebuilt: List[Tuple[str, str]] = field(default_factory=list)
+    entries: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class Mismatch:
+    key: BalanceKey
+    snapshot: Tuple[int, int, int]
+    ledger: Tuple[int, int, int]
+
+
+def snapshot_doctype() -> Dict[str, Any]:
+    """The custom DocType holding the snapshot rows; read-only in the desk."""
+
+    def column(fieldname: str, label: str, fieldtype: str, **extra: Any) -> Dict[str, Any]:
+        return {"fieldname": fieldname, "label": label, "fieldtype": fieldtype, "read_only": 1, **extra}
+
+    return {
+        "name": SNAPSHOT_DOCTYPE,
+        "module": "Accounts",
+        "custom": 1,
+        "autoname": "hash",
+        "in_create": 1,
+        "track_changes": 0,
+        "fields": [
+            column("snapshot_key", "Snapshot Key", "Data", unique=1, hidden=1),
+            column("company", "Company", "Link", options="Company", in_list_view=1, in_standard_filter=1),
+            column("account", "Account", "Link", options="Account", in_list_view=1, in_standard_filter=1),
+            column("cost_center", "Cost Center", "Link", options="Cost Center", in_standard_filter=1),
+            column("period_start", "Period", "Date", in_list_view=1, search_index=1),
+            column("debit", "Debit", "Currency"),
+            column("credit", "Credit", "Currency"),
+            column("entries", "GL Entries", "Int"),
+        ],
+        "permissions": [
+            {"role": "System Manager", "read": 1, "report": 1, "export": 1},
+            {"role": "Accounts Manager", "read": 1, "report": 1, "export": 1},
+        ],
+    }
+
+
+def ensure_snapshot_doctype() -> None:
+    ensure_doc(
+        "DocType",
+        {"name": SNAPSHOT_DOCTYPE},
+        snapshot_doctype(),
+        child_keys={"fields": "fieldname", "permissions": "role"},
+    )
+
+
+def snapshot_key(key: BalanceKey) -> str:
+    # account and cost centre names can be long; the Data column holds 140 characters
+    return hashlib.sha1("\x1f".join(key).encode()).hexdigest()
+
+
+def period_start(posting_date: Any) -> str:
+    return f"{str(posting_date)[:7]}-01"
+
+
+def period_end(start: str) -> str:
+    year, month = int(start[:4]), int(start[5:7])
+    return f"{start[:7]}-{calendar.monthrange(year, month)[1]:02d}"
+
+
+def cents(value: Any) -> int:
+    return round(float(value or 0) * 100)
+
+
+def load_mark(company: str) -> Optional[str]:
+    return frappe.db.get_global(f"{MARK_KEY}:{company}")
+
+
+def save_mark(company: str, mark: str) -> None:
+    frappe.db.set_global(f"{MARK_KEY}:{company}", mark)
+
+
+def provisioned_companies(model: OrgStructure) -> List[str]:
+    """Companies of the organisation structure that exist on the site."""
+
+    names = [config.company_name for config in [*model.companies(), *model.future_companies()]]
+    existing = company_abbreviations(names)
+    return [name for name in names if name in existing]
+
+
+def iter_new_entries(
+    company: str, after: str, upto: Any, page_size: int
+) -> Iterator[Tuple[List[Sequence[Any]], str]]:
+    """Yield pages of GL rows created after ``after`` and by ``upto``, each with the mark that covers it.
+
+    Pages are cut on ``creation`` (keyset pagination); rows sharing the
+    timestamp at the end of a full page are held back for the next page so
+    that a mark never splits them.
+    """
+
+    while True:
+        page = frappe.get_all(
+            "GL Entry",
+            filters={"company": company, "creation": [">", after]},
+            fields=GL_FIELDS,
+            order_by="creation asc",
+            limit_page_length=page_size,
+            as_list=True,
+        )
+        settled = [row for row in page if frappe_utils.get_datetime(row[1]) <= upto]
+        if len(settled) < len(page) or len(page) < page_size:
+            if settled:
+                yield settled, str(settled[-1][1])
+            return
+
+        last = page[-1][1]
+        head = [row for row in page if row[1] != last]
+        if not head:
+            # a whole page posted in the same instant: take every row of it at once
+            head = frappe.get_all(
+                "GL Entry",
+                filters={"company": company, "creation": last},
+                fields=GL_FIELDS,
+                limit_page_length=0,
+                as_list=True,
+            )
+        after = str(head[-1][1])
+        yield head, after
+
+
+def accumulate(company: str, rows: Sequence[Sequence[Any]], deltas: Dict[BalanceKey, List[int]]) -> None:
+    for _, _, account, cost_center, posting_date, debit, credit in rows:
+        totals = deltas.setdefault((company, account, cost_center or "", period_start(posting_date)), [0, 0, 0])
+        totals[0] += cents(debit)
+        totals[1] += cents(credit)
+        totals[2] += 1
+
+
+def apply_deltas(deltas: Dict[BalanceKey, List[int]], result: RefreshResult) -> None:
+    """Add ``deltas`` to the snapshot: one upsert per chunk, keyed on the unique ``snapshot_key``."""
+
+    docs = []
+    for key, (debit, credit, entries) in deltas.items():
+        company, account, cost_center, start = key
+        values = {
+            "snapshot_key": snapshot_key(key),
+            "company": company,
+            "account": account,
+            "cost_center": cost_center or None,
+            "period_start": start,
+            "debit": debit / 100,
+            "credit": credit / 100,
+            "entries": entries,
+        }
+        docs.append(build_doc(SNAPSHOT_DOCTYPE, values))
+
+    for chunk in chunked(docs, EXISTS_CHUNK_SIZE):
+        existing = upsert_rows(SNAPSHOT_DOCTYPE, chunk, summed=("debit", "credit", "entries"))
+        result.updated += existing
+        result.created += len(chunk) - existing
+
+
+@instrumented()
+def refresh_snapshot(
+    companies: Sequence[str],
+    *,
+    settle_seconds: int = DEFAULT_SETTLE_SECONDS,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    checkpoint_rows: int = DEFAULT_CHECKPOINT_ROWS,
+) -> RefreshResult:
+    """Seed companies without a mark, and add the GL Entries created since the mark of the others."""
+
+    started = time.perf_counter()
+    upto = frappe_utils.add_to_date(frappe_utils.now_datetime(), seconds=-settle_seconds)
+    result = RefreshResult(companies=len(companies))
+    marks = {company: load_mark(company) for company in companies}
+    result.seeded = [company for company, mark in marks.items() if mark is None]
+    if result.seeded:
+        ensure_snapshot_doctype()
+
+    for company, mark in marks.items():
+
+        deltas: Dict[BalanceKey, List[int]] = {}
+        pending, new_mark = 0, mark
+        for rows, page_mark in iter_new_entries(company, mark or START_MARK, upto, page_size):
+            accumulate(company, rows, deltas)
+            pending += len(rows)
+            result.entries += len(rows)
+            new_mark = page_mark
+            if pending >= checkpoint_rows:
+                apply_deltas(deltas, result)
+                save_mark(company, new_mark)
+                frappe.db.commit()
+                deltas, pending = {}, 0
+
+        apply_deltas(deltas, result)
+        if new_mark != mark or mark is None:
+            save_mark(company, new_mark or START_MARK)
+        frappe.db.commit()
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def ledger_periods(company: str, mark: str) -> Dict[str, Tuple[int, int, int]]:
+    """Debit, credit (in cents) and entry count per month of the GL Entries created by ``mark``.
+
+    The database groups by posting date, so only one row per day is read.
+    """
+
+    periods: Dict[str, Tuple[int, int, int]] = {}
+    for row in frappe.get_all(
+        "GL Entry",
+        filters={"company": company, "creation": ["<=", mark]},
+        fields=["posting_date", "sum(debit) as debit", "sum(credit) as credit", "count(name) as entries"],
+        group_by="posting_date",
+        limit_page_length=0,
+    ):
+        debit, credit, entries = periods.get(period_start(row["posting_date"]), (0, 0, 0))
+        periods[period_start(row["posting_date"])] = (
+            debit + cents(row["debit"]),
+            credit + cents(row["credit"]),
+            entries + int(row["entries"]),
+        )
+    return periods
+
+
+def snapshot_periods(company: str) -> Dict[str, Tuple[int, int, int]]:
+    periods: Dict[str, Tuple[int, int, int]] = {}
+    for row in frappe.get_all(
+        SNAPSHOT_DOCTYPE,
+        filters={"company": company},
+        fields=["period_start", "debit", "credit", "entries"],
+        limit_page_length=0,
+    ):
+        start = str(row["period_start"])
+        debit, credit, entries = periods.get(start, (0, 0, 0))
+        periods[start] = (debit + cents(row["debit"]), credit + cents(row["credit"]), entries + int(row["entries"] or 0))
+    return periods
+
+
+def rebuild_period(company: str, start: str, mark: str, result: ReconcileResult) -> None:
+    """Replace the snapshot rows of one month with a fresh sum of its GL Entries up to ``mark``."""
+
+    frappe.db.delete(SNAPSHOT_DOCTYPE, {"company": company, "period_start": start})
+    rows = frappe.get_all(
+        "GL Entry",
+        filters={
+            "company": company,
+            "posting_date": ["between", [start, period_end(start)]],
+            "creation": ["<=", mark],
+        },
+        fields=GL_FIELDS,
+        limit_page_length=0,
+        as_list=True,
+    )
+    deltas: Dict[BalanceKey, List[int]] = {}
+    accumulate(company, rows, deltas)
+    apply_deltas(deltas, RefreshResult())
+    result.entries += len(rows)
+
+
+@instrumented()
+def reconcile_snapshot(companies: Sequence[str]) -> ReconcileResult:
+    """Rebuild the months whose snapshot totals no longer match the ledger, e.g. after reposting."""
+
+    started = time.perf_counter()
+    result = ReconcileResult()
+    for company in companies:
+        mark = load_mark(company)
+        if mark is None:
+            continue
+        ledger, snapshot = ledger_periods(company, mark), snapshot_periods(company)
+        result.periods += len(ledger.keys() | snapshot.keys())
+        for start in sorted(ledger.keys() | snapshot.keys()):
+            if ledger.get(start, (0, 0, 0)) != snapshot.get(start, (0, 0, 0)):
+                rebuild_period(company, start, mark, result)
+                result.rebuilt.append((company, start))
+        frappe.db.commit()
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def reset_snapshot(companies: Sequence[str]) -> None:
+    """Drop the snapshot rows and marks of ``companies`` so the next refresh seeds them again."""
+
+    frappe.db.delete(SNAPSHOT_DOCTYPE, {"company": ["in", list(companies)]})
+    for company in companies:
+        frappe.db.set_global(f"{MARK_KEY}:{company}", None)
+
+
+def read_balances(
+    companies: Sequence[str], *, from_date: Optional[str] = None, to_date: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Per ``(company, account, cost centre)``: opening before ``from_date``, movements and closing, in cents."""
+
+    filters: Dict[str, Any] = {"company": ["in", list(companies)]}
+    if to_date:
+        filters["period_start"] = ["<=", period_start(to_date)]
+    opening_before = period_start(from_date) if from_date else ""
+
+    balances: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for row in frappe.get_all(
+        SNAPSHOT_DOCTYPE,
+        filters=filters,
+        fields=["company", "account", "cost_center", "period_start", "debit", "credit"],
+        limit_page_length=0,
+    ):
+        key = (row["company"], row["account"], row["cost_center"] or "")
+        balance = balances.setdefault(
+            key, {"company": key[0], "account": key[1], "cost_center": key[2], "opening": 0, "debit": 0, "credit": 0}
+        )
+        debit, credit = cents(row["debit"]), cents(row["credit"])
+        if str(row["period_start"]) < opening_before:
+            balance["opening"] += debit - credit
+        else:
+            balance["debit"] += debit
+            balance["credit"] += credit
+
+    rows = sorted(balances.values(), key=lambda balance: (balance["company"], balance["account"], balance["cost_center"]))
+    for balance in rows:
+        balance["closing"] = balance["opening"] + balance["debit"] - balance["credit"]
+    return rows
+
+
+@instrumented()
+def verify_sample(companies: Sequence[str], size: int, *, seed: Optional[int] = None) -> Tuple[int, List[Mismatch]]:
+    """Recompute ``size`` random snapshot rows from the raw ledger (up to each company's mark) and compare."""
+
+    marks = {company: load_mark(company) for company in companies}
+    rows = frappe.get_all(
+        SNAPSHOT_DOCTYPE,
+        filters={"company": ["in", [company for company, mark in marks.items() if mark]]},
+        fields=["company", "account", "cost_center", "period_start", "debit", "credit", "entries"],
+        limit_page_length=0,
+    )
+    sample = random.Random(seed).sample(rows, min(size, len(rows)))
+
+    mismatches: List[Mismatch] = []
+    for row in sample:
+        start = str(row["period_start"])
+        entries = frappe.get_all(
+            "GL Entry",
+            filters={
+                "company": row["company"],
+                "account": row["account"],
+                "cost_center": row["cost_center"] or ["is", "not set"],
+                "posting_date": ["between", [start, period_end(start)]],
+                "creation": ["<=", marks[row["company"]]],
+            },
+            fields=["debit", "credit"],
+            limit_page_length=0,
+        )
+        ledger = (sum(cents(entry["debit"]) for entry in entries), sum(cents(entry["credit"]) for entry in entries), len(entries))
+        snapshot = (cents(row["debit"]), cents(row["credit"]), int(row["entries"] or 0))
+        if ledger != snapshot:
+            key = (row["company"], row["account"], row["cost_center"] or "", start)
+            mismatches.append(Mismatch(key, snapshot, ledger))
+    return len(sample), mismatches
+
+
+def write_balances(rows: List[Dict[str, Any]], stream: TextIO) -> None:
+    writer = csv.writer(stream)
+    writer.writerow(["company", "account", "cost_center", "opening", "debit", "credit", "closing"])
+    for row in rows:
+        amounts = (row["opening"], row["debit"], row["credit"], row["closing"])
+        writer.writerow([row["company"], row["account"], row["cost_center"], *(f"{amount / 100:.2f}" for amount in amounts)])
+
+
+def print_refresh_result(result: RefreshResult) -> None:
+    rate = result.entries / result.seconds if result.seconds else 0.0
+    print(
+        f"📒 Balance snapshot: {result.entries} GL entries from {result.companies} companies in {result.seconds:.2f}s "
+        f"({rate:.0f}/s), {result.created} rows created, {result.updated} updated"
+    )
+    if result.seeded:
+        print(f"  🌱 Seeded from the full ledger: {', '.join(result.seeded)}")
+
+
+def print_reconcile_result(result: ReconcileResult) -> None:
+    if not result.rebuilt:
+        print(f"✅ {result.periods} snapshot months match the ledger ({result.seconds:.2f}s)")
+        return
+    print(
+        f"🔁 Rebuilt {len(result.rebuilt)} of {result.periods} snapshot months from {result.entries} GL entries "
+        f"in {result.seconds:.2f}s:"
+    )
+    for company, start in result.rebuilt:
+        print(f"  {company} / {start[:7]}")
+
+
+def print_verification(checked: int, mismatches: List[Mismatch]) -> None:
+    if not mismatches:
+        print(f"✅ {checked} sampled snapshot rows match the ledger")
+        return
+    print(f"❌ {len(mismatches)} of {checked} sampled snapshot rows differ from the ledger:")
+    for mismatch in mismatches:
+        company, account, cost_center, start = mismatch.key
+        (debit, credit, entries), (ledger_debit, ledger_credit, ledger_entries) = mismatch.snapshot, mismatch.ledger
+        print(
+            f"  {company} / {account} / {cost_center or '-'} / {start[:7]}: snapshot {debit / 100:.2f} Dr "
+            f"{credit / 100:.2f} Cr ({entries}), ledger {ledger_debit / 100:.2f} Dr {ledger_credit / 100:.2f} Cr "
+            f"({ledger_entries})"
+        )
+
+
+def parse_arguments() -> Tuple[argparse.Namespace, OrgStructure]:
+    parser = argparse.ArgumentParser(description="Maintain the GL balance snapshot of the Galaxy Holding companies")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--reseed", action="store_true", help="Drop the snapshot and rebuild it from the full ledger")
+    mode.add_argument("--report", action="store_true", help="Print balances from the snapshot as CSV instead")
+    mode.add_argument("--verify", type=positive_int, metavar="N", help="Compare N random snapshot rows with the ledger")
+    mode.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Compare monthly totals with the ledger and rebuild the months that drifted (e.g. after reposting)",
+    )
+    parser.add_argument("--from-date", help="--report: earlier periods form the opening balance")
+    parser.add_argument("--to-date", help="--report: last period included")
+    parser.add_argument("--seed", type=int, help="--verify: random seed, to repeat a sample")
+    parser.add_argument(
+        "--settle-seconds",
+        type=int,
+        default=DEFAULT_SETTLE_SECONDS,
+        help="Leave GL Entries younger than this for the next run",
+    )
+    parser.add_argument("--page-size", type=positive_int, default=DEFAULT_PAGE_SIZE, help="GL Entries fetched per query")
+    parser.add_argument(
+        "--checkpoint-rows",
+        type=positive_int,
+        default=DEFAULT_CHECKPOINT_ROWS,
+        help="GL Entries applied per commit",
+    )
+    add_org_structure_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    return args, load_configuration(parser, lambda: load_from_arguments(args))
+
+
+def main() -> None:
+    args, model = parse_arguments()
+    summary = sys.stderr if args.report else sys.stdout
+
+    # reports only read the snapshot, so they do not wait for the refresh lock
+    lock = contextlib.nullcontext(True) if args.report else single_instance("balance_snapshot")
+    with frappe_site_connection(args.site), lock as acquired:
+        if not acquired:
+            print("⚠️  Another balance snapshot refresh is running for this site, exiting")
+            return
+
+        exc: Exception | None = None
+        mismatches: List[Mismatch] = []
+        try:
+            companies = provisioned_companies(model)
+            if args.report:
+                write_balances(read_balances(companies, from_date=args.from_date, to_date=args.to_date), sys.stdout)
+            elif args.verify:
+                checked, mismatches = verify_sample(companies, args.verify, seed=args.seed)
+                print_verification(checked, mismatches)
+            elif args.reconcile:
+                print_reconcile_result(reconcile_snapshot(companies))
+            else:
+                if args.reseed:
+                    reset_snapshot(companies)
+                result = refresh_snapshot(
+                    companies,
+                    settle_seconds=args.settle_seconds,
+                    page_size=args.page_size,
+                    checkpoint_rows=args.checkpoint_rows,
+                )
+                print_refresh_result(result)
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error maintaining the balance snapshot: {err}", file=summary)
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "balance_snapshot", stream=summary)
+
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""Multi-level BOM explosion and material requirements for the manufacturing companies.
+
+Exploding BOMs the naive way costs one BOM fetch per line per level and
+never terminates on a recursive BOM; ``setup_erp_crm.BOM_TEMPLATES``
+ships one (``BIO-INS-001`` made of itself). ``BomGraph`` loads every
+active BOM and its BOM Items with a few bulk queries, links each line to
+its sub-assembly BOM (the line's ``bom_no``, else the item's default BOM)
+and detects cycles before anything is exploded. BOMs are then processed
+in topological order, parents first.
+
+``plan_requirements`` plans all open Work Orders in one pass. Their
+components are summed per sub-assembly and netted against Bin stock, and
+only the net is exploded further down. Explosions per unit are memoised
+per BOM::
+
+    python3 /scripts/bom_graph.py --site galaxy.local
+    python3 /scripts/bom_graph.py --site galaxy.local --company "Galaxy Bio" --output requirements.csv
+    python3 /scripts/bom_graph.py --site galaxy.local --check --include-drafts   # cycles only
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, TextIO, Tuple
+
+from lazy_imports import lazy_import
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+)
+
+
+frappe = lazy_import("frappe")
+
+
+MANUFACTURING_COMPANIES = ["Galaxy Bio", "Galaxy Engineering"]
+CLOSED_WORK_ORDER_STATUSES = ["Completed", "Stopped", "Closed", "Cancelled"]
+
+
+@dataclass
+class BomLine:
+    item_code: str
+    # stock quantity per unit of the BOM's item
+    qty: float
+    bom_no: str = ""
+
+
+@dataclass
+class Bom:
+    name: str
+    item: str
+    quantity: float = 1.0
+    is_default: int = 0
+    company: str = ""
+    lines: List[BomLine] = field(default_factory=list)
+
+    @classmethod
+    def from_values(cls, name: str, values: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> "Bom":
+        """Build from a BOM row (or a BOM template) and its item rows."""
+
+        quantity = float(values.get("quantity") or 1)
+        lines = [
+            BomLine(
+                row["item_code"],
+                float(row.get("stock_qty") or row.get("qty") or 0) / quantity,
+                row.get("bom_no") or "",
+            )
+            for row in rows
+        ]
+        return cls(name, values["item"], quantity, int(values.get("is_default") or 0), values.get("company") or "", lines)
+
+
+@dataclass
+class MaterialPlan:
+    work_orders: int = 0
+    # item -> quantity required by the level above, before stock
+    gross: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    from_stock: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    # sub-assembly item -> net quantity to manufacture
+    make: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    # item without a BOM -> net quantity to buy
+    purchase: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    # BOM on, above or below a cycle -> demand that could not be exploded
+    blocked: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    # work orders without an active BOM
+    unplanned: List[str] = field(default_factory=list)
+
+
+class BomGraph:
+    """Active BOMs as a graph of sub-assemblies, with cycles and a topological order."""
+
+    def __init__(self, boms: Iterable[Bom]) -> None:
+        self.boms: Dict[str, Bom] = {bom.name: bom for bom in boms}
+        self.default_bom: Dict[str, str] = {}
+        for bom in sorted(self.boms.values(), key=lambda bom: (not bom.is_default, bom.name)):
+            self.default_bom.setdefault(bom.item, bom.name)
+
+        self.children: Dict[str, List[Tuple[BomLine, Optional[str]]]] = {
+            name: [(line, self.child_bom(line)) for line in bom.lines] for name, bom in self.boms.items()
+        }
+        self.cycles = self._find_cycles()
+        order = self._topological_order()
+        ordered = set(order)
+        self.blocked = self._with_ancestors({name for name in self.boms if name not in ordered})
+        self.order = [name for name in order if name not in self.blocked]
+        self._exploded: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def load(cls, companies: Optional[Sequence[str]] = None, *, include_drafts: bool = False) -> "BomGraph":
+        return cls(load_boms(companies, include_drafts=include_drafts))
+
+    def child_bom(self, line: BomLine) -> Optional[str]:
+        if line.bom_no and line.bom_no in self.boms:
+            return line.bom_no
+        return self.default_bom.get(line.item_code)
+
+    def _find_cycles(self) -> List[List[str]]:
+        """Every cycle closed by a back edge of an iterative depth-first search, as BOM names."""
+
+        cycles: List[List[str]] = []
+        state: Dict[str, int] = {}  # 1 on the stack, 2 done
+        for root in self.boms:
+            if root in state:
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [iter(self.children[root])]
+            while stack:
+                for _, child in stack[-1]:
+                    if child is None:
+                        continue
+                    if state.get(child) == 1:
+                        cycles.append(path[path.index(child):] + [child])
+                    elif child not in state:
+                        state[child] = 1
+                        path.append(child)
+                        stack.append(iter(self.children[child]))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    stack.pop()
+        return cycles
+
+    def _topological_order(self) -> List[str]:
+        """Kahn's algorithm over BOM -> sub-assembly edges; BOMs on or below a cycle are left out.
+
+        BOMs above a cycle are ordered here and removed by ``__init__``.
+        """
+
+        indegree = {name: 0 for name in self.boms}
+        edges = {name: {child for _, child in children if child} for name, children in self.children.items()}
+        for targets in edges.values():
+            for child in targets:
+                indegree[child] += 1
+
+        ready = [name for name, degree in indegree.items() if degree == 0]
+        order: List[str] = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for child in edges[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        return order
+
+    def _with_ancestors(self, names: Iterable[str]) -> Set[str]:
+        """``names`` plus every BOM that uses one of them, directly or further up."""
+
+        parents: Dict[str, List[str]] = defaultdict(list)
+        for name, children in self.children.items():
+            for _, child in children:
+                if child:
+                    parents[child].append(name)
+        blocked = set(names)
+        stack = list(blocked)
+        while stack:
+            for parent in parents[stack.pop()]:
+                if parent not in blocked:
+                    blocked.add(parent)
+                    stack.append(parent)
+        return blocked
+
+    def describe_cycle(self, cycle: Sequence[str]) -> str:
+        return " → ".join(f"{self.boms[name].item} ({name})" for name in cycle)
+
+    def explode(self, bom: str) -> Dict[str, float]:
+        """Purchased items per unit of ``bom``'s item, through every level; memoised per BOM."""
+
+        if bom in self.blocked:
+            raise ValueError(f"BOM {bom} is on, above or below a cycle and cannot be exploded")
+        if bom not in self._exploded:
+            # components before parents, so every sub-assembly is already memoised
+            for name in reversed(self.order):
+                if name in self._exploded:
+                    continue
+                totals: Dict[str, float] = defaultdict(float)
+                for line, child in self.children[name]:
+                    if child is None:
+                        totals[line.item_code] += line.qty
+                        continue
+                    for item, qty in self._exploded[child].items():
+                        totals[item] += line.qty * qty
+                self._exploded[name] = dict(totals)
+                if name == bom:
+                    break
+        return self._exploded[bom]
+
+    def plan(self, demand: Iterable[Tuple[str, str, float]], stock: Dict[str, float]) -> MaterialPlan:
+        """Net requirements for ``(work order, BOM, quantity)`` demand against ``stock`` (item -> qty).
+
+        The work orders' own quantities are produced as ordered; each
+        sub-assembly's gross requirement is complete before it is netted
+        and exploded, because BOMs are visited in topological order.
+        """
+
+        plan = MaterialPlan()
+        available = dict(stock)
+        bom_demand: Dict[str, float] = defaultdict(float)
+        leaf_demand: Dict[str, float] = defaultdict(float)
+
+        def push(bom: str, qty: float) -> None:
+            for line, child in self.children[bom]:
+                required = line.qty * qty
+                if child is None:
+                    leaf_demand[line.item_code] += required
+                else:
+                    bom_demand[child] += required
+
+        def net(item: str, gross: float) -> float:
+            plan.gross[item] += gross
+            taken = min(gross, max(available.get(item, 0.0), 0.0))
+            if taken:
+                available[item] -= taken
+                plan.from_stock[item] += taken
+            return gross - taken
+
+        for work_order, bom, qty in demand:
+            plan.work_orders += 1
+            if bom not in self.boms:
+                plan.unplanned.append(work_order)
+            elif bom in self.blocked:
+                plan.blocked[bom] += qty
+            else:
+                push(bom, qty)
+
+        for bom in self.order:
+            gross = bom_demand.pop(bom, 0.0)
+            if not gross:
+                continue
+            required = net(self.boms[bom].item, gross)
+            if required:
+                plan.make[self.boms[bom].item] += required
+                push(bom, required)
+        for bom, qty in bom_demand.items():  # empty: blocked BOMs are never pushed from
+            plan.blocked[bom] += qty
+
+        for item, gross in leaf_demand.items():
+            required = net(item, gross)
+            if required:
+                plan.purchase[item] += required
+        return plan
+
+
+@instrumented()
+def load_boms(
+    companies: Optional[Sequence[str]] = None,
+    *,
+    include_drafts: bool = False,
+    chunk_size: int = EXISTS_CHUNK_SIZE,
+) -> List[Bom]:
+    """Read the active BOMs (submitted, or also drafts) and their items with one query per chunk."""
+
+    filters: Dict[str, Any] = {"is_active": 1, "docstatus": ["<", 2] if include_drafts else 1}
+    if companies:
+        filters["company"] = ["in", list(companies)]
+    headers = frappe.get_all(
+        "BOM",
+        filters=filters,
+        fields=["name", "item", "quantity", "is_default", "company"],
+        order_by="name asc",
+        limit_page_length=0,
+    )
+
+    rows: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for chunk in chunked([header["name"] for header in headers], chunk_size):
+        for row in frappe.get_all(
+            "BOM Item",
+            filters={"parenttype": "BOM", "parent": ["in", chunk]},
+            fields=["parent", "idx", "item_code", "qty", "stock_qty", "bom_no"],
+            order_by="idx asc",
+            limit_page_length=0,
+        ):
+            rows[row["parent"]].append(row)
+
+    return [Bom.from_values(header["name"], header, rows[header["name"]]) for header in headers]
+
+
+def load_work_orders(companies: Sequence[str], graph: BomGraph) -> List[Tuple[str, str, float]]:
+    """``(work order, BOM, remaining quantity)`` of every open Work Order of ``companies``."""
+
+    demand = []
+    for row in frappe.get_all(
+        "Work Order",
+        filters={"docstatus": 1, "status": ["not in", CLOSED_WORK_ORDER_STATUSES], "company": ["in", list(companies)]},
+        fields=["name", "production_item", "bom_no", "qty", "produced_qty"],
+        limit_page_length=0,
+    ):
+        remaining = float(row["qty"] or 0) - float(row["produced_qty"] or 0)
+        if remaining > 0:
+            bom = row["bom_no"] or graph.default_bom.get(row["production_item"], "")
+            demand.append((row["name"], bom, remaining))
+    return demand
+
+
+def load_stock(items: Iterable[str], companies: Sequence[str], chunk_size: int = EXISTS_CHUNK_SIZE) -> Dict[str, float]:
+    """Actual quantity per item across the leaf warehouses of ``companies``."""
+
+    warehouses = frappe.get_all(
+        "Warehouse",
+        filters={"company": ["in", list(companies)], "is_group": 0},
+        pluck="name",
+        limit_page_length=0,
+    )
+    stock: Dict[str, float] = defaultdict(float)
+    if not warehouses:
+        return stock
+
+    for chunk in chunked(dict.fromkeys(items), chunk_size):
+        for row in frappe.get_all(
+            "Bin",
+            filters={"item_code": ["in", chunk], "warehouse": ["in", warehouses]},
+            fields=["item_code", "actual_qty"],
+            limit_page_length=0,
+        ):
+            stock[row["item_code"]] += float(row["actual_qty"] or 0)
+    return stock
+
+
+@instrumented()
+def plan_requirements(companies: Sequence[str], *, include_drafts: bool = False) -> Tuple[BomGraph, MaterialPlan]:
+    graph = BomGraph.load(companies, include_drafts=include_drafts)
+    demand = load_work_orders(companies, graph)
+    items = {line.item_code for bom in graph.boms.values() for line in bom.lines}
+    plan = graph.plan(demand, load_stock(items, companies))
+    return graph, plan
+
+
+def print_cycles(graph: BomGraph) -> None:
+    for cycle in graph.cycles:
+        print(f"  ⚠️ BOM cycle: {graph.describe_cycle(cycle)}")
+    if graph.blocked:
+        print(f"  ⚠️ {len(graph.blocked)} BOMs linked to a cycle are not exploded: {', '.join(sorted(graph.blocked))}")
+
+
+def print_plan(graph: BomGraph, plan: MaterialPlan, seconds: float) -> None:
+    lines = sum(len(bom.lines) for bom in graph.boms.values())
+    print(
+        f"🏭 {len(graph.boms)} BOMs ({lines} lines), {plan.work_orders} work orders planned in {seconds:.2f}s: "
+        f"{len(plan.make)} sub-assemblies to make, {len(plan.purchase)} items to buy"
+    )
+    print_cycles(graph)
+    for bom, qty in sorted(plan.blocked.items()):
+        print(f"  ⚠️ {qty:g} × {graph.boms[bom].item} not planned: BOM {bom} is linked to a cycle")
+    if plan.unplanned:
+        print(f"  ⚠️ Work orders without an active BOM: {', '.join(plan.unplanned)}")
+
+
+def print_requirements(plan: MaterialPlan) -> None:
+    for label, quantities in (("🔧 make", plan.make), ("🛒 buy", plan.purchase)):
+        for item, qty in sorted(quantities.items()):
+            print(f"  {label} {qty:g} × {item} (gross {plan.gross[item]:g}, {plan.from_stock[item]:g} from stock)")
+
+
+def write_plan(plan: MaterialPlan, stream: TextIO) -> None:
+    writer = csv.writer(stream)
+    writer.writerow(["item_code", "action", "gross", "from_stock", "net"])
+    for action, quantities in (("make", plan.make), ("purchase", plan.purchase)):
+        for item, qty in sorted(quantities.items()):
+            writer.writerow([item, action, f"{plan.gross[item]:g}", f"{plan.from_stock[item]:g}", f"{qty:g}"])
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Multi-level BOM explosion and material requirements")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument(
+        "--company",
+        action="append",
+        help=f"Company to plan (repeatable, default: {', '.join(MANUFACTURING_COMPANIES)})",
+    )
+    parser.add_argument("--include-drafts", action="store_true", help="Also load draft BOMs")
+    parser.add_argument("--check", action="store_true", help="Only report BOM cycles; exit 1 if there are any")
+    parser.add_argument("--output", type=Path, help="Write the requirements as CSV here")
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    companies = args.company or MANUFACTURING_COMPANIES
+
+    cyclic = False
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            if args.check:
+                graph = BomGraph.load(companies, include_drafts=args.include_drafts)
+                print(f"🔎 {len(graph.boms)} BOMs checked, {len(graph.cycles)} cycles")
+                print_cycles(graph)
+            else:
+                started = time.perf_counter()
+                graph, plan = plan_requirements(companies, include_drafts=args.include_drafts)
+                print_plan(graph, plan, time.perf_counter() - started)
+                if args.output:
+                    with open(args.output, "w", newline="") as stream:
+                        write_plan(plan, stream)
+                else:
+                    print_requirements(plan)
+            cyclic = bool(graph.cycles)
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error planning materials: {err}")
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "bom_graph")
+
+    if args.check and cyclic:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
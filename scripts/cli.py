@@ -0,0 +1,94 @@
+"""Shared command line of the setup scripts: everything before the first DB call.
+
+Arguments are parsed and validated, and configuration (the organisation
+document) is loaded, before anything touches Frappe. The modules bind
+``frappe`` with ``lazy_imports.lazy_import``, so ``--help``, a bad value or
+a broken document is reported in milliseconds instead of after the
+framework import; ``run_provisioning`` is where the site (and Frappe) is
+opened.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Any, Callable, List, Optional, TypeVar
+
+from planner import ProvisioningPlan, add_plan_arguments, run_plan_mode
+from utils import (
+    DEFAULT_COMMIT_EVERY,
+    add_metrics_arguments,
+    commit_or_rollback,
+    frappe_site_connection,
+    report_metrics,
+)
+
+
+T = TypeVar("T")
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def base_parser(description: str, *, commit_help: str = "Number of records written per transaction") -> Any:
+    """Parser with the options every setup script shares; plan/metrics options go last via ``finish_parser``."""
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--commit-every", type=positive_int, default=DEFAULT_COMMIT_EVERY, help=commit_help)
+    return parser
+
+
+def finish_parser(parser: Any, *, plan: bool = True) -> Any:
+    if plan:
+        add_plan_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser
+
+
+def parse_arguments(parser: Any, argv: Optional[List[str]] = None) -> argparse.Namespace:
+    args = parser.parse_args(argv)
+    apply_plan = getattr(args, "apply_plan", None)
+    if apply_plan and not Path(apply_plan).is_file():
+        parser.error(f"--apply-plan: no such file {apply_plan}")
+    return args
+
+
+def load_configuration(parser: Any, load: Callable[[], T]) -> T:
+    """Run ``load`` and turn invalid configuration into a usage error (exit code 2)."""
+
+    try:
+        return load()
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+        raise  # pragma: no cover - parser.error exits
+
+
+def run_provisioning(
+    args: argparse.Namespace,
+    script: str,
+    provision: Callable[[], None],
+    *,
+    build_plan: Optional[Callable[[], ProvisioningPlan]] = None,
+    failure: str = "provisioning",
+) -> None:
+    """Handle ``--plan``/``--apply-plan``, or open the site and run ``provision`` in one transaction scope."""
+
+    if build_plan is not None and run_plan_mode(args, script, build_plan):
+        return
+
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            provision()
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error {failure}: {err}")
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, script)
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""Consolidated trial balance of the Galaxy Holding group, aggregated with NumPy.
+
+ERPNext's consolidated reports walk GL Entries row by row. Here the GL
+Entries of every group company are streamed a page at a time (keyset
+pagination, ``as_list`` rows) into NumPy arrays and reduced per page to
+``(account, month)`` totals with a vectorised group-by (``np.unique`` +
+``np.bincount``), so memory stays bounded by accounts x months, not by
+ledger size. Accounts are consolidated by name (the `` - ABBR`` suffix is
+dropped) and amounts are summed in integer cents.
+
+Balances on the intercompany accounts created by ``setup_companies.py``
+whose party represents another member of the consolidated subtree
+(internal customers/suppliers, or a party named after the company) are
+eliminated. When the two sides of a pair do not net to zero, the residual
+is kept on an ``Intercompany Elimination Difference`` line and reported::
+
+    python3 /scripts/consolidation.py --site galaxy.local --to-date 2025-12-31 --output tb-2025.csv
+    python3 /scripts/consolidation.py --site galaxy.local --company "Galaxy Holding" --from-date 2025-01-01
+
+NumPy is imported lazily and is only needed by this script.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime
+import importlib.util
+import sys
+import time
+from dataclasses import dataclass, field
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from cli import load_configuration
+from lazy_imports import lazy_import
+from org_structure import add_org_structure_arguments, load_from_arguments
+from setup_companies import INTERCOMPANY_ACCOUNTS, company_abbreviations
+from utils import (
+    CompanyConfig,
+    add_metrics_arguments,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+)
+
+
+frappe = lazy_import("frappe")
+np = lazy_import("numpy")
+
+
+GL_FIELDS = ["name", "account", "posting_date", "debit", "credit", "party_type", "party"]
+DEFAULT_PAGE_SIZE = 50_000
+ELIMINATION_DIFFERENCE = "Intercompany Elimination Difference"
+
+# (account id, month) pairs are packed into one int64 group-by key;
+# months count from 1970-01, so 12 bits last until the year 2311.
+MONTH_BITS = 12
+
+
+@dataclass
+class LedgerCube:
+    """GL totals in cents per company, account and month.
+
+    ``intercompany`` holds the net debit of the intercompany accounts per
+    ``[company, intercompany account, counterparty company, month]``.
+    """
+
+    companies: List[str]
+    accounts: List[str]
+    intercompany_accounts: List[int]
+    first_month: int
+    debit: Any
+    credit: Any
+    intercompany: Any
+    unmatched: Dict[str, int] = field(default_factory=dict)
+    rows: int = 0
+
+    def month_index(self, date: str | datetime.date) -> int:
+        month = int(np.datetime64(str(date), "M").astype(np.int64))
+        return min(max(month - self.first_month, 0), self.debit.shape[2])
+
+
+@dataclass
+class TrialBalanceRow:
+    account: str
+    opening: int = 0
+    debit: int = 0
+    credit: int = 0
+    closing: int = 0
+    eliminated: int = 0
+
+    @property
+    def consolidated(self) -> int:
+        return self.closing + self.eliminated
+
+
+@dataclass
+class ConsolidatedTrialBalance:
+    root: str
+    companies: List[str]
+    rows: List[TrialBalanceRow]
+    # (company, counterparty, cents by which their intercompany balances fail to net to zero)
+    differences: List[Tuple[str, str, int]]
+
+
+def account_label(account: str, abbr: str) -> str:
+    suffix = f" - {abbr}"
+    return account[: -len(suffix)] if account.endswith(suffix) else account
+
+
+def group_members(configs: Iterable[CompanyConfig], root: str) -> List[str]:
+    """``root`` and every company below it in the ``parent_company`` hierarchy, parents first."""
+
+    children: Dict[str, List[str]] = {}
+    for config in configs:
+        children.setdefault(config.parent_company, []).append(config.company_name)
+
+    members, queue = [], [root]
+    while queue:
+        company = queue.pop(0)
+        members.append(company)
+        queue.extend(children.get(company, []))
+    return members
+
+
+def internal_parties(companies: Sequence[str]) -> Dict[Tuple[str, str], str]:
+    """``(party_type, party) -> company`` for parties that stand for a group company."""
+
+    parties = {(party_type, company): company for company in companies for party_type in ("Customer", "Supplier")}
+    for doctype, flag in (("Customer", "is_internal_customer"), ("Supplier", "is_internal_supplier")):
+        for row in frappe.get_all(
+            doctype,
+            filters={flag: 1, "represents_company": ["in", list(companies)]},
+            fields=["name", "represents_company"],
+            limit_page_length=0,
+        ):
+            parties[(doctype, row["name"])] = row["represents_company"]
+    return parties
+
+
+def iter_gl_pages(company: str, to_date: Optional[str], page_size: int) -> Iterator[List[Sequence[Any]]]:
+    """Yield pages of ``GL_FIELDS`` tuples of one company, by name (keyset pagination)."""
+
+    filters: Dict[str, Any] = {"company": company, "is_cancelled": 0}
+    if to_date:
+        filters["posting_date"] = ["<=", to_date]
+
+    last_name = ""
+    while True:
+        page = frappe.get_all(
+            "GL Entry",
+            filters={**filters, "name": [">", last_name]},
+            fields=GL_FIELDS,
+            order_by="name asc",
+            limit_page_length=page_size,
+            as_list=True,
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_name = page[-1][0]
+
+
+def to_cents(values: Sequence[Any]) -> Any:
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+
+def group_sum(keys: Any, *weights: Any) -> Tuple[Any, ...]:
+    """Vectorised group-by: the distinct ``keys`` and the sum of each weight array per key."""
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = (np.rint(np.bincount(inverse, weights=values, minlength=len(unique))).astype(np.int64) for values in weights)
+    return (unique, *sums)
+
+
+class CubeBuilder:
+    """Reduces GL pages into per-company ``(account, month)`` and intercompany totals."""
+
+    def __init__(self, companies: Dict[str, str], parties: Dict[Tuple[str, str], str]) -> None:
+        self.companies = companies
+        self.company_ids = {company: index for index, company in enumerate(companies)}
+        self.parties = parties
+        self.account_ids: Dict[str, int] = {label: index for index, label in enumerate(INTERCOMPANY_ACCOUNTS)}
+        self.ledger: Dict[int, List[Tuple[Any, Any, Any]]] = {}
+        self.intercompany: Dict[int, List[Tuple[Any, Any]]] = {}
+        self.unmatched: Dict[str, int] = {}
+        self.rows = 0
+
+    def add_page(self, company: str, page: List[Sequence[Any]]) -> None:
+        # one list per column; cheaper than zip(*page), whose tuples all go through the GC
+        accounts, dates, debits, credits, party_types, party_names = (
+            list(map(itemgetter(index), page)) for index in range(1, len(GL_FIELDS))
+        )
+        company_id = self.company_ids[company]
+        abbr = self.companies[company]
+        self.rows += len(page)
+
+        # label the few distinct accounts of the page once, then map every row through a dict
+        codes = {
+            account: self.account_ids.setdefault(account_label(account, abbr), len(self.account_ids))
+            for account in set(accounts)
+        }
+        account_ids = np.fromiter(map(codes.__getitem__, accounts), dtype=np.int64, count=len(accounts))
+        months = np.asarray(dates, dtype="datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        debit, credit = to_cents(debits), to_cents(credits)
+
+        keys = (account_ids << MONTH_BITS) | months
+        self.ledger.setdefault(company_id, []).append(group_sum(keys, debit, credit))
+
+        # intercompany account ids are 0..len(INTERCOMPANY_ACCOUNTS)-1
+        on_intercompany = np.flatnonzero(account_ids < len(INTERCOMPANY_ACCOUNTS))
+        if not len(on_intercompany):
+            return
+
+        counterparties = np.fromiter(
+            (
+                self.company_ids.get(self.parties.get((party_types[row], party_names[row])), -1)
+                for row in on_intercompany
+            ),
+            dtype=np.int64,
+            count=len(on_intercompany),
+        )
+        matched = counterparties >= 0
+        if not matched.all():
+            unmatched = int((debit[on_intercompany] - credit[on_intercompany])[~matched].sum())
+            self.unmatched[company] = self.unmatched.get(company, 0) + unmatched
+
+        rows = on_intercompany[matched]
+        keys = (((account_ids[rows] << 8) | counterparties[matched]) << MONTH_BITS) | months[rows]
+        unique, net = group_sum(keys, debit[rows] - credit[rows])
+        self.intercompany.setdefault(company_id, []).append((unique, net))
+
+    def build(self) -> LedgerCube:
+        ledger = {
+            company_id: group_sum(
+                np.concatenate([keys for keys, _, _ in parts]),
+                np.concatenate([debit for _, debit, _ in parts]),
+                np.concatenate([credit for _, _, credit in parts]),
+            )
+            for company_id, parts in self.ledger.items()
+        }
+        months = [keys & ((1 << MONTH_BITS) - 1) for keys, _, _ in ledger.values()]
+        first_month = int(min(values.min() for values in months)) if months else 0
+        last_month = int(max(values.max() for values in months)) if months else -1
+        shape = (len(self.companies), len(self.account_ids), last_month - first_month + 1)
+
+        debit = np.zeros(shape, dtype=np.int64)
+        credit = np.zeros(shape, dtype=np.int64)
+        for company_id, (keys, debits, credits) in ledger.items():
+            index = (company_id, keys >> MONTH_BITS, (keys & ((1 << MONTH_BITS) - 1)) - first_month)
+            debit[index] = debits
+            credit[index] = credits
+
+        intercompany = np.zeros(
+            (len(self.companies), len(INTERCOMPANY_ACCOUNTS), len(self.companies), shape[2]), dtype=np.int64
+        )
+        for company_id, parts in self.intercompany.items():
+            keys, net = group_sum(
+                np.concatenate([keys for keys, _ in parts]), np.concatenate([net for _, net in parts])
+            )
+            month = (keys & ((1 << MONTH_BITS) - 1)) - first_month
+            pair = keys >> MONTH_BITS
+            intercompany[company_id, pair >> 8, pair & 0xFF, month] = net
+
+        accounts = [label for label, _ in sorted(self.account_ids.items(), key=lambda item: item[1])]
+        return LedgerCube(
+            companies=list(self.companies),
+            accounts=accounts,
+            intercompany_accounts=list(range(len(INTERCOMPANY_ACCOUNTS))),
+            first_month=first_month,
+            debit=debit,
+            credit=credit,
+            intercompany=intercompany,
+            unmatched=self.unmatched,
+            rows=self.rows,
+        )
+
+
+@instrumented()
+def load_cube(companies: Dict[str, str], *, to_date: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> LedgerCube:
+    """Stream the GL Entries of ``companies`` (``name -> abbr``) into a ``LedgerCube``."""
+
+    if len(companies) > 0xFF:
+        raise ValueError("consolidation supports at most 255 companies")
+
+    builder = CubeBuilder(companies, internal_parties(list(companies)))
+    for company in companies:
+        for page in iter_gl_pages(company, to_date, page_size):
+            builder.add_page(company, page)
+    return builder.build()
+
+
+@instrumented()
+def consolidate(
+    cube: LedgerCube,
+    members: Sequence[str],
+    *,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+) -> ConsolidatedTrialBalance:
+    """Trial balance of ``members`` (the first one is the root) with intercompany balances eliminated.
+
+    The cube is monthly, so ``from_date`` must be the first day of a month.
+    """
+
+    if from_date and datetime.date.fromisoformat(str(from_date)).day != 1:
+        raise ValueError(f"from_date {from_date} is not the first day of a month")
+    index = np.asarray([cube.companies.index(company) for company in members], dtype=np.int64)
+    start = cube.month_index(from_date) if from_date else 0
+    end = cube.month_index(to_date) + 1 if to_date else cube.debit.shape[2]
+
+    debit = cube.debit[index].sum(axis=0)
+    credit = cube.credit[index].sum(axis=0)
+    opening = (debit[:, :start] - credit[:, :start]).sum(axis=1)
+    period_debit = debit[:, start:end].sum(axis=1)
+    period_credit = credit[:, start:end].sum(axis=1)
+    closing = opening + period_debit - period_credit
+
+    # [member, intercompany account, member counterparty] closing balances
+    pairs = cube.intercompany[np.ix_(index, cube.intercompany_accounts, index)][..., :end].sum(axis=3)
+    eliminated = np.zeros(len(cube.accounts), dtype=np.int64)
+    eliminated[cube.intercompany_accounts] = -pairs.sum(axis=(0, 2))
+
+    rows = [
+        TrialBalanceRow(account, int(opening[i]), int(period_debit[i]), int(period_credit[i]), int(closing[i]), int(eliminated[i]))
+        for i, account in enumerate(cube.accounts)
+        if opening[i] or period_debit[i] or period_credit[i] or eliminated[i]
+    ]
+    difference = -int(eliminated.sum())
+    if difference:
+        rows.append(TrialBalanceRow(ELIMINATION_DIFFERENCE, eliminated=difference))
+
+    net_pairs = pairs.sum(axis=1)
+    mismatched = net_pairs + net_pairs.T
+    differences = [
+        (members[i], members[j], int(mismatched[i, j]))
+        for i, j in zip(*np.nonzero(np.triu(mismatched, k=1)))
+    ]
+    return ConsolidatedTrialBalance(members[0], list(members), rows, differences)
+
+
+def write_trial_balance(balance: ConsolidatedTrialBalance, stream: TextIO) -> None:
+    writer = csv.writer(stream)
+    writer.writerow(["account", "opening", "debit", "credit", "closing", "eliminated", "consolidated"])
+    for row in balance.rows:
+        amounts = (row.opening, row.debit, row.credit, row.closing, row.eliminated, row.consolidated)
+        writer.writerow([row.account, *(f"{amount / 100:.2f}" for amount in amounts)])
+
+
+def print_summary(cube: LedgerCube, balance: ConsolidatedTrialBalance, seconds: float, stream: TextIO) -> None:
+    rate = cube.rows / seconds if seconds else 0.0
+    print(
+        f"📊 {balance.root}: {len(balance.companies)} companies, {cube.rows} GL rows, "
+        f"{len(balance.rows)} accounts in {seconds:.2f}s ({rate:.0f} rows/s)",
+        file=stream,
+    )
+    total = sum(row.consolidated for row in balance.rows)
+    if total:
+        print(f"  ⚠️ Consolidated balances do not net to zero: {total / 100:.2f}", file=stream)
+    for company, counterparty, cents in balance.differences:
+        print(f"  ⚠️ {company} ↔ {counterparty}: intercompany balances differ by {cents / 100:.2f}", file=stream)
+    for company, cents in cube.unmatched.items():
+        print(f"  ⚠️ {company}: {cents / 100:.2f} on intercompany accounts without a group counterparty", file=stream)
+
+
+def parse_arguments() -> Tuple[argparse.Namespace, List[CompanyConfig]]:
+    parser = argparse.ArgumentParser(description="Consolidated trial balance of the Galaxy Holding group")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--company", default="Galaxy Holding", help="Group company whose subtree is consolidated")
+    parser.add_argument("--from-date", help="First day of the period, the 1st of a month (earlier entries form the opening balance)")
+    parser.add_argument("--to-date", help="Last posting date included")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="GL Entries fetched per query")
+    parser.add_argument("--output", type=Path, help="Write the trial balance as CSV here (default: stdout)")
+    add_org_structure_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    if args.from_date:
+        try:
+            if datetime.date.fromisoformat(args.from_date).day != 1:
+                parser.error("--from-date must be the first day of a month")
+        except ValueError:
+            parser.error(f"--from-date: {args.from_date!r} is not a YYYY-MM-DD date")
+    if importlib.util.find_spec("numpy") is None:
+        parser.error("numpy is required for consolidation (pip install numpy)")
+    model = load_configuration(parser, lambda: load_from_arguments(args))
+    configs = [*model.companies(), *model.future_companies()]
+    if args.company not in {config.company_name for config in configs}:
+        parser.error(f"--company: {args.company!r} is not in the organisation structure")
+    return args, configs
+
+
+def main() -> None:
+    args, configs = parse_arguments()
+    summary = sys.stderr if args.output is None else sys.stdout
+
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            started = time.perf_counter()
+            members = group_members(configs, args.company)
+            companies = company_abbreviations(members)
+            members = [company for company in members if company in companies]
+            cube = load_cube(companies, to_date=args.to_date, page_size=args.page_size)
+            balance = consolidate(cube, members, from_date=args.from_date, to_date=args.to_date)
+            if args.output:
+                with open(args.output, "w", newline="") as stream:
+                    write_trial_balance(balance, stream)
+            else:
+                write_trial_balance(balance, sys.stdout)
+            print_summary(cube, balance, time.perf_counter() - started, summary)
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error consolidating the trial balance: {err}", file=summary)
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "consolidation", stream=summary)
+
+
+if __name__ == "__main__":
+    main()
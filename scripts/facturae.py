@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+"""Build and sign FacturaE 3.2.2 invoices (XAdES-EPES enveloped signature).
+
+Invoice data is read in bulk (a page of invoices plus their items, taxes,
+companies and addresses in one query each) and every invoice is serialised
+with ``lxml``. RSA signing is CPU bound, so bulk runs sign in a
+``ProcessPoolExecutor``: each worker loads the PKCS#12 certificate once in
+its initializer and keeps it for every document it signs. ``--attach``
+skips invoices that already carry a ``.xsig`` file, so the same command can
+run from cron to sign new invoices as they are submitted; failures then go
+to the Error Log::
+
+    python3 /scripts/facturae.py --site galaxy.local --certificate /certs/galaxy.p12 \\
+        --from-date 2025-09-01 --workers 8 --output-dir /data/facturae
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import datetime
+import functools
+import hashlib
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from lxml import etree
+
+from lazy_imports import lazy_import
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    TransactionBatch,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumentation,
+    instrumented,
+    report_metrics,
+)
+from verifactu_payloads import iter_invoices
+
+
+frappe = lazy_import("frappe")
+
+
+FACTURAE_NS = "http://www.facturae.gob.es/formato/Versiones/Facturaev3_2_2.xml"
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+XADES_NS = "http://uri.etsi.org/01903/v1.3.2#"
+
+C14N_ALGORITHM = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+RSA_SHA256 = "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"
+SHA256 = "http://www.w3.org/2001/04/xmlenc#sha256"
+SHA1 = "http://www.w3.org/2000/09/xmldsig#sha1"
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+
+POLICY_IDENTIFIER = (
+    "http://www.facturae.es/politica_de_firma_formato_facturae/politica_de_firma_formato_facturae_v3_1.pdf"
+)
+POLICY_DESCRIPTION = "Política de Firma FacturaE v3.1"
+POLICY_SHA1 = "Ohixl6upD6av8N7pEvDABhEL6hM="
+
+IVA = "01"
+TWO_PLACES = Decimal("0.01")
+SIX_PLACES = Decimal("0.000001")
+
+COUNTRY_CODES: Dict[str, str] = {
+    "Spain": "ESP",
+    "Portugal": "PRT",
+    "France": "FRA",
+    "Germany": "DEU",
+    "Italy": "ITA",
+    "United Kingdom": "GBR",
+    "United States": "USA",
+}
+
+INVOICE_FIELDS = [
+    "name",
+    "company",
+    "customer",
+    "customer_name",
+    "tax_id",
+    "posting_date",
+    "currency",
+    "is_return",
+    "net_total",
+    "total_taxes_and_charges",
+    "grand_total",
+    "rounded_total",
+    "outstanding_amount",
+    "company_address",
+    "customer_address",
+]
+ITEM_FIELDS = ["parent", "idx", "item_code", "item_name", "description", "qty", "net_rate", "net_amount"]
+TAX_FIELDS = ["parent", "idx", "charge_type", "rate", "tax_amount"]
+ADDRESS_FIELDS = ["name", "address_line1", "pincode", "city", "state", "country"]
+
+
+class FacturaeError(ValueError):
+    """The invoice cannot be expressed as a FacturaE document."""
+
+
+@dataclass
+class FacturaeInvoice:
+    invoice: Dict[str, Any]
+    items: List[Dict[str, Any]]
+    taxes: List[Dict[str, Any]]
+    seller: Dict[str, Any]
+    seller_address: Dict[str, Any]
+    buyer_address: Dict[str, Any]
+
+
+@dataclass
+class SignedDocument:
+    invoice: str
+    xml: Optional[bytes]
+    error: str = ""
+
+
+def amount(value: Any, places: Decimal = TWO_PLACES) -> str:
+    return str(Decimal(str(value or 0)).quantize(places, rounding=ROUND_HALF_UP))
+
+
+def sub(parent: etree._Element, tag: str, text: Any = None, **attributes: str) -> etree._Element:
+    element = etree.SubElement(parent, tag, attributes)
+    if text is not None:
+        element.text = str(text)
+    return element
+
+
+def person_type(tax_id: str) -> str:
+    """``J`` for legal entities (CIF letters), ``F`` for individuals (DNI/NIE)."""
+
+    return "F" if tax_id[:1].isdigit() or tax_id[:1] in "KLMXYZ" else "J"
+
+
+def add_address(parent: etree._Element, address: Dict[str, Any]) -> None:
+    country = COUNTRY_CODES.get(address.get("country") or "Spain")
+    if country is None:
+        raise FacturaeError(f"no ISO 3166 alpha-3 code for country {address.get('country')}")
+
+    if country == "ESP":
+        node = sub(parent, "AddressInSpain")
+        sub(node, "Address", address.get("address_line1") or "")
+        sub(node, "PostCode", address.get("pincode") or "")
+        sub(node, "Town", address.get("city") or "")
+        sub(node, "Province", address.get("state") or address.get("city") or "")
+    else:
+        node = sub(parent, "OverseasAddress")
+        sub(node, "Address", address.get("address_line1") or "")
+        sub(node, "PostCodeAndTown", f"{address.get('pincode') or ''} {address.get('city') or ''}".strip())
+        sub(node, "Province", address.get("state") or address.get("city") or "")
+    sub(node, "CountryCode", country)
+
+
+def add_party(parent: etree._Element, tag: str, tax_id: str, name: str, address: Dict[str, Any]) -> None:
+    if not tax_id:
+        raise FacturaeError(f"{tag} {name} has no tax id")
+
+    party = sub(parent, tag)
+    identification = sub(party, "TaxIdentification")
+    kind = person_type(tax_id)
+    sub(identification, "PersonTypeCode", kind)
+    resident = COUNTRY_CODES.get(address.get("country") or "Spain") == "ESP"
+    sub(identification, "ResidenceTypeCode", "R" if resident else "U")
+    sub(identification, "TaxIdentificationNumber", tax_id)
+
+    if kind == "J":
+        entity = sub(party, "LegalEntity")
+        sub(entity, "CorporateName", name)
+    else:
+        entity = sub(party, "Individual")
+        first, _, surname = name.partition(" ")
+        sub(entity, "Name", first)
+        sub(entity, "FirstSurname", surname or first)
+    add_address(entity, address)
+
+
+def invoice_tax_rates(data: FacturaeInvoice) -> List[Tuple[Decimal, Decimal, Decimal]]:
+    """(rate, taxable base, tax amount) per tax row charged on the net total."""
+
+    net_total = Decimal(str(data.invoice.get("net_total") or 0))
+    rates = [
+        (Decimal(str(tax.get("rate") or 0)), net_total, Decimal(str(tax.get("tax_amount") or 0)))
+        for tax in data.taxes
+        if tax.get("charge_type") == "On Net Total"
+    ]
+    return rates or [(Decimal("0"), net_total, Decimal("0"))]
+
+
+def build_facturae(data: FacturaeInvoice) -> etree._Element:
+    """Unsigned FacturaE 3.2.2 document for one invoice."""
+
+    invoice = data.invoice
+    if invoice.get("is_return"):
+        raise FacturaeError("credit notes (corrective invoices) are not supported yet")
+
+    currency = invoice.get("currency") or "EUR"
+    total = amount(invoice.get("rounded_total") or invoice.get("grand_total"))
+    outstanding = amount(invoice.get("outstanding_amount"))
+    seller_tax_id = data.seller.get("tax_id") or ""
+    series, _, number = invoice["name"].rpartition("-")
+    rates = invoice_tax_rates(data)
+
+    root = etree.Element(etree.QName(FACTURAE_NS, "Facturae"), nsmap={"fe": FACTURAE_NS})
+
+    header = sub(root, "FileHeader")
+    sub(header, "SchemaVersion", "3.2.2")
+    sub(header, "Modality", "I")
+    sub(header, "InvoiceIssuerType", "EM")
+    batch = sub(header, "Batch")
+    sub(batch, "BatchIdentifier", f"{seller_tax_id}{invoice['name']}")
+    sub(batch, "InvoicesCount", 1)
+    for tag, value in (
+        ("TotalInvoicesAmount", total),
+        ("TotalOutstandingAmount", outstanding),
+        ("TotalExecutableAmount", outstanding),
+    ):
+        sub(sub(batch, tag), "TotalAmount", value)
+    sub(batch, "InvoiceCurrencyCode", currency)
+
+    parties = sub(root, "Parties")
+    seller_name = data.seller.get("company_name") or invoice["company"]
+    add_party(parties, "SellerParty", seller_tax_id, seller_name, data.seller_address)
+    buyer_name = invoice.get("customer_name") or invoice["customer"]
+    add_party(parties, "BuyerParty", invoice.get("tax_id") or "", buyer_name, data.buyer_address)
+
+    node = sub(sub(root, "Invoices"), "Invoice")
+    invoice_header = sub(node, "InvoiceHeader")
+    sub(invoice_header, "InvoiceNumber", number or invoice["name"])
+    if series:
+        sub(invoice_header, "InvoiceSeriesCode", series)
+    sub(invoice_header, "InvoiceDocumentType", "FC")
+    sub(invoice_header, "InvoiceClass", "OO")
+
+    issue = sub(node, "InvoiceIssueData")
+    sub(issue, "IssueDate", str(invoice.get("posting_date")))
+    sub(issue, "InvoiceCurrencyCode", currency)
+    sub(issue, "TaxCurrencyCode", currency)
+    sub(issue, "LanguageName", "es")
+
+    taxes = sub(node, "TaxesOutputs")
+    for rate, base, tax_amount in rates:
+        tax = sub(taxes, "Tax")
+        sub(tax, "TaxTypeCode", IVA)
+        sub(tax, "TaxRate", amount(rate))
+        sub(sub(tax, "TaxableBase"), "TotalAmount", amount(base))
+        sub(sub(tax, "TaxAmount"), "TotalAmount", amount(tax_amount))
+
+    totals = sub(node, "InvoiceTotals")
+    sub(totals, "TotalGrossAmount", amount(invoice.get("net_total")))
+    sub(totals, "TotalGrossAmountBeforeTaxes", amount(invoice.get("net_total")))
+    sub(totals, "TotalTaxOutputs", amount(invoice.get("total_taxes_and_charges")))
+    sub(totals, "TotalTaxesWithheld", amount(0))
+    sub(totals, "InvoiceTotal", total)
+    sub(totals, "TotalOutstandingAmount", outstanding)
+    sub(totals, "TotalExecutableAmount", outstanding)
+
+    lines = sub(node, "Items")
+    for item in data.items:
+        line = sub(lines, "InvoiceLine")
+        sub(line, "ItemDescription", item.get("item_name") or item.get("description") or item.get("item_code"))
+        sub(line, "Quantity", amount(item.get("qty")))
+        sub(line, "UnitOfMeasure", "01")
+        sub(line, "UnitPriceWithoutTax", amount(item.get("net_rate"), SIX_PLACES))
+        sub(line, "TotalCost", amount(item.get("net_amount"), SIX_PLACES))
+        sub(line, "GrossAmount", amount(item.get("net_amount"), SIX_PLACES))
+        line_taxes = sub(line, "TaxesOutputs")
+        for rate, _, _ in rates:
+            tax = sub(line_taxes, "Tax")
+            sub(tax, "TaxTypeCode", IVA)
+            sub(tax, "TaxRate", amount(rate))
+            sub(sub(tax, "TaxableBase"), "TotalAmount", amount(item.get("net_amount")))
+        if item.get("item_code"):
+            sub(line, "ArticleCode", item["item_code"])
+
+    return root
+
+
+def c14n(element: etree._Element) -> bytes:
+    return etree.tostring(element, method="c14n")
+
+
+def digest(data: bytes) -> str:
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+def ds(parent: etree._Element, tag: str, text: Any = None, **attributes: str) -> etree._Element:
+    return sub(parent, etree.QName(DS_NS, tag).text, text, **attributes)
+
+
+def xades(parent: etree._Element, tag: str, text: Any = None, **attributes: str) -> etree._Element:
+    return sub(parent, etree.QName(XADES_NS, tag).text, text, **attributes)
+
+
+class Signer:
+    """PKCS#12 key and certificate, parsed once and reused for every signature."""
+
+    def __init__(self, key: Any, certificate: Any) -> None:
+        self.key = key
+        self.certificate = certificate
+        der = certificate.public_bytes(serialization.Encoding.DER)
+        self.certificate_b64 = base64.b64encode(der).decode()
+        self.certificate_digest = digest(der)
+        self.issuer = certificate.issuer.rfc4514_string()
+        self.serial = str(certificate.serial_number)
+        numbers = key.public_key().public_numbers()
+        self.modulus = base64.b64encode(numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, "big")).decode()
+        self.exponent = base64.b64encode(numbers.e.to_bytes((numbers.e.bit_length() + 7) // 8, "big")).decode()
+
+    @classmethod
+    def from_pkcs12(cls, path: str, password: Optional[str]) -> "Signer":
+        key, certificate, _ = pkcs12.load_key_and_certificates(
+            Path(path).read_bytes(), password.encode() if password else None
+        )
+        if key is None or certificate is None:
+            raise FacturaeError(f"{path} does not contain a private key and certificate")
+        return cls(key, certificate)
+
+    def sign(self, root: etree._Element, signing_time: Optional[datetime.datetime] = None) -> bytes:
+        """Append an enveloped XAdES-EPES signature to ``root`` and serialise it."""
+
+        document_digest = digest(c14n(root))
+        suffix = uuid.uuid4().hex
+        signature_id = f"Signature-{suffix}"
+        signed_properties_id = f"SignedProperties-{suffix}"
+        key_info_id = f"Certificate-{suffix}"
+        reference_id = f"Reference-{suffix}"
+        signing_time = signing_time or datetime.datetime.now(datetime.timezone.utc)
+
+        signature = etree.SubElement(
+            root, etree.QName(DS_NS, "Signature"), {"Id": signature_id}, nsmap={"ds": DS_NS, "xades": XADES_NS}
+        )
+        signed_info = ds(signature, "SignedInfo")
+        ds(signed_info, "CanonicalizationMethod", Algorithm=C14N_ALGORITHM)
+        ds(signed_info, "SignatureMethod", Algorithm=RSA_SHA256)
+        signature_value = ds(signature, "SignatureValue")
+
+        key_info = ds(signature, "KeyInfo", Id=key_info_id)
+        ds(ds(key_info, "X509Data"), "X509Certificate", self.certificate_b64)
+        rsa_key = ds(ds(key_info, "KeyValue"), "RSAKeyValue")
+        ds(rsa_key, "Modulus", self.modulus)
+        ds(rsa_key, "Exponent", self.exponent)
+
+        qualifying = xades(ds(signature, "Object"), "QualifyingProperties", Target=f"#{signature_id}")
+        signed_properties = xades(qualifying, "SignedProperties", Id=signed_properties_id)
+        signature_properties = xades(signed_properties, "SignedSignatureProperties")
+        xades(signature_properties, "SigningTime", signing_time.isoformat(timespec="seconds"))
+        cert = xades(xades(signature_properties, "SigningCertificate"), "Cert")
+        cert_digest = xades(cert, "CertDigest")
+        ds(cert_digest, "DigestMethod", Algorithm=SHA256)
+        ds(cert_digest, "DigestValue", self.certificate_digest)
+        issuer_serial = xades(cert, "IssuerSerial")
+        ds(issuer_serial, "X509IssuerName", self.issuer)
+        ds(issuer_serial, "X509SerialNumber", self.serial)
+        policy = xades(xades(signature_properties, "SignaturePolicyIdentifier"), "SignaturePolicyId")
+        policy_id = xades(policy, "SigPolicyId")
+        xades(policy_id, "Identifier", POLICY_IDENTIFIER)
+        xades(policy_id, "Description", POLICY_DESCRIPTION)
+        policy_hash = xades(policy, "SigPolicyHash")
+        ds(policy_hash, "DigestMethod", Algorithm=SHA1)
+        ds(policy_hash, "DigestValue", POLICY_SHA1)
+        xades(xades(xades(signature_properties, "SignerRole"), "ClaimedRoles"), "ClaimedRole", "emisor")
+        data_format = xades(
+            xades(signed_properties, "SignedDataObjectProperties"),
+            "DataObjectFormat",
+            ObjectReference=f"#{reference_id}",
+        )
+        xades(data_format, "Description", "Factura electrónica")
+        xades(data_format, "MimeType", "text/xml")
+
+        signed_properties_type = "http://uri.etsi.org/01903#SignedProperties"
+        for uri, value, attributes in (
+            ("", document_digest, {"Id": reference_id}),
+            (f"#{signed_properties_id}", digest(c14n(signed_properties)), {"Type": signed_properties_type}),
+            (f"#{key_info_id}", digest(c14n(key_info)), {}),
+        ):
+            reference = ds(signed_info, "Reference", URI=uri, **attributes)
+            if not uri:
+                ds(ds(reference, "Transforms"), "Transform", Algorithm=ENVELOPED)
+            ds(reference, "DigestMethod", Algorithm=SHA256)
+            ds(reference, "DigestValue", value)
+
+        signed = self.key.sign(c14n(signed_info), padding.PKCS1v15(), hashes.SHA256())
+        signature_value.text = base64.b64encode(signed).decode()
+        return etree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+
+@functools.lru_cache(maxsize=4)
+def load_signer(path: str, password: Optional[str]) -> Signer:
+    return Signer.from_pkcs12(path, password)
+
+
+_worker_signer: Optional[Signer] = None
+
+
+def init_signing_worker(path: str, password: Optional[str]) -> None:
+    global _worker_signer
+    _worker_signer = Signer.from_pkcs12(path, password)
+
+
+def sign_job(signer: Signer, job: Tuple[str, bytes]) -> SignedDocument:
+    invoice, unsigned = job
+    try:
+        return SignedDocument(invoice, signer.sign(etree.fromstring(unsigned)))
+    except Exception as exc:  # reported per invoice, the batch continues
+        return SignedDocument(invoice, None, f"{type(exc).__name__}: {exc}")
+
+
+def sign_in_worker(job: Tuple[str, bytes]) -> SignedDocument:
+    return sign_job(_worker_signer, job)
+
+
+def signing_pool(path: str, password: Optional[str], workers: int) -> Executor:
+    # spawn keeps the parent's open DB connection out of the workers, as in utils.site_worker_pool
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_signing_worker,
+        initargs=(path, password),
+    )
+
+
+@instrumented()
+def load_facturae_data(invoices: List[Dict[str, Any]]) -> List[FacturaeInvoice]:
+    """Items, taxes, companies and addresses of a page of invoices, one query per doctype."""
+
+    names = [invoice["name"] for invoice in invoices]
+    items: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    taxes: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    for doctype, fields, rows in (
+        ("Sales Invoice Item", ITEM_FIELDS, items),
+        ("Sales Taxes and Charges", TAX_FIELDS, taxes),
+    ):
+        for chunk in chunked(names, EXISTS_CHUNK_SIZE):
+            for row in frappe.get_all(
+                doctype,
+                filters={"parenttype": "Sales Invoice", "parent": ["in", chunk]},
+                fields=fields,
+                order_by="idx asc",
+                limit_page_length=0,
+            ):
+                rows[row["parent"]].append(row)
+
+    companies = {
+        row["name"]: row
+        for row in frappe.get_all(
+            "Company",
+            filters={"name": ["in", sorted({invoice["company"] for invoice in invoices})]},
+            fields=["name", "company_name", "tax_id"],
+            limit_page_length=0,
+        )
+    }
+    address_names = sorted(
+        {
+            invoice[field]
+            for invoice in invoices
+            for field in ("company_address", "customer_address")
+            if invoice.get(field)
+        }
+    )
+    addresses: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunked(address_names, EXISTS_CHUNK_SIZE):
+        for row in frappe.get_all(
+            "Address", filters={"name": ["in", chunk]}, fields=ADDRESS_FIELDS, limit_page_length=0
+        ):
+            addresses[row["name"]] = row
+
+    return [
+        FacturaeInvoice(
+            invoice,
+            items[invoice["name"]],
+            taxes[invoice["name"]],
+            companies.get(invoice["company"], {}),
+            addresses.get(invoice.get("company_address") or "", {}),
+            addresses.get(invoice.get("customer_address") or "", {}),
+        )
+        for invoice in invoices
+    ]
+
+
+def unsigned_documents(data: Iterable[FacturaeInvoice]) -> Iterator[SignedDocument]:
+    """Serialised unsigned documents; invoices that cannot be expressed carry an error."""
+
+    for entry in data:
+        try:
+            yield SignedDocument(entry.invoice["name"], etree.tostring(build_facturae(entry)))
+        except FacturaeError as exc:
+            yield SignedDocument(entry.invoice["name"], None, str(exc))
+
+
+def sign_pages(
+    pages: Iterable[List[Dict[str, Any]]],
+    certificate: str,
+    password: Optional[str],
+    *,
+    workers: int = os.cpu_count() or 1,
+) -> Iterator[SignedDocument]:
+    """Build and sign every invoice of ``pages``, page by page, across ``workers`` processes."""
+
+    pool = signing_pool(certificate, password, workers) if workers > 1 else None
+    signer = None if pool else load_signer(certificate, password)
+    try:
+        for page in pages:
+            documents = list(unsigned_documents(load_facturae_data(page)))
+            jobs = [(document.invoice, document.xml) for document in documents if document.xml is not None]
+            yield from (document for document in documents if document.xml is None)
+
+            with instrumentation.step("sign_documents"):
+                if pool is not None:
+                    signed = list(pool.map(sign_in_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+                else:
+                    signed = [sign_job(signer, job) for job in jobs]
+            yield from signed
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def attach_document(invoice: str, xml: bytes) -> None:
+    frappe.get_doc(
+        {
+            "doctype": "File",
+            "file_name": f"{invoice}.xsig",
+            "attached_to_doctype": "Sales Invoice",
+            "attached_to_name": invoice,
+            "is_private": 1,
+            "content": xml,
+        }
+    ).insert(ignore_permissions=True)
+
+
+def without_facturae(pages: Iterable[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+    """Drop the invoices that already have a ``.xsig`` attachment, one query per page."""
+
+    for page in pages:
+        attached = set()
+        for chunk in chunked([invoice["name"] for invoice in page], EXISTS_CHUNK_SIZE):
+            attached.update(
+                frappe.get_all(
+                    "File",
+                    filters={
+                        "attached_to_doctype": "Sales Invoice",
+                        "attached_to_name": ["in", chunk],
+                        "file_name": ["like", "%.xsig"],
+                    },
+                    pluck="attached_to_name",
+                    limit_page_length=0,
+                )
+            )
+        page = [invoice for invoice in page if invoice["name"] not in attached]
+        if page:
+            yield page
+
+
+def log_failure(invoice: str, error: str) -> None:
+    frappe.log_error(title=f"FacturaE not attached to {invoice}", message=error)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build and sign FacturaE 3.2.2 documents for submitted invoices")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--certificate", required=True, help="PKCS#12 (.p12/.pfx) signing certificate")
+    parser.add_argument(
+        "--password-env",
+        default="FACTURAE_CERTIFICATE_PASSWORD",
+        help="Environment variable holding the certificate password",
+    )
+    parser.add_argument("--from-date", help="First posting date to include")
+    parser.add_argument("--to-date", help="Last posting date to include")
+    parser.add_argument("--company", help="Only invoices of this company")
+    parser.add_argument("--page-size", type=int, default=500, help="Invoices built per round")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Signing processes")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output-dir", type=Path, help="Write <invoice>.xsig files here")
+    target.add_argument(
+        "--attach",
+        action="store_true",
+        help="Attach the signed files to the invoices that do not have one yet",
+    )
+    parser.add_argument("--commit-every", type=int, default=200, help="Attachments written per transaction")
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    filters: Dict[str, Any] = {"docstatus": 1, "is_return": 0}
+    if args.from_date:
+        filters["posting_date"] = [">=", args.from_date]
+    if args.to_date:
+        filters["posting_date"] = (
+            ["between", [args.from_date, args.to_date]] if args.from_date else ["<=", args.to_date]
+        )
+    if args.company:
+        filters["company"] = args.company
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    password = os.environ.get(args.password_env)
+    with frappe_site_connection(args.site):
+        try:
+            load_signer(args.certificate, password)
+        except Exception as err:  # pragma: no cover - frappe specific
+            if args.attach:
+                frappe.log_error(title="FacturaE certificate could not be loaded", message=f"{args.certificate}: {err}")
+                frappe.db.commit()
+            raise SystemExit(f"❌ Cannot load the FacturaE certificate {args.certificate}: {err}")
+
+        exc: Exception | None = None
+        signed = failed = 0
+        try:
+            pages = iter_invoices(filters, args.page_size, fields=INVOICE_FIELDS)
+            if args.attach:
+                pages = without_facturae(pages)
+            with TransactionBatch(args.commit_every) as batch:
+                for document in sign_pages(pages, args.certificate, password, workers=args.workers):
+                    if document.xml is None:
+                        failed += 1
+                        print(f"  ❌ {document.invoice}: {document.error}")
+                        if args.attach:
+                            log_failure(document.invoice, document.error)
+                    elif args.output_dir:
+                        (args.output_dir / f"{document.invoice}.xsig").write_bytes(document.xml)
+                        signed += 1
+                    else:
+                        error = None
+                        with batch.record(f"attaching the FacturaE file of {document.invoice}"):
+                            try:
+                                attach_document(document.invoice, document.xml)
+                            except Exception as err:  # pragma: no cover - frappe specific
+                                error = f"{type(err).__name__}: {err}"
+                                raise
+                            signed += 1
+                        # logged after the record's savepoint was rolled back
+                        if error:
+                            failed += 1
+                            log_failure(document.invoice, error)
+            print(f"\n🧾 {signed} FacturaE documents signed, {failed} failed")
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error signing FacturaE documents: {err}")
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "facturae")
+
+
+if __name__ == "__main__":
+    main()
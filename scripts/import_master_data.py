@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Stream legacy master data from CSV/JSONL files into ERPNext."""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bulk_insert import bulk_ensure_docs, print_bulk_result
+from lazy_imports import lazy_import
+from utils import (
+    ExistenceIndex,
+    TransactionBatch,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    ensure_doc,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+    write_atomic,
+)
+
+
+frappe = lazy_import("frappe")
+
+
+DEFAULT_BATCH_SIZE = 500
+
+Row = Tuple[int, Dict[str, Any]]
+
+
+def iter_source_rows(path: Path) -> Iterator[Row]:
+    """Lazily yield ``(offset, row)`` pairs from a CSV or JSONL file."""
+
+    with path.open(newline="", encoding="utf-8-sig") as handle:
+        if path.suffix.lower() in {".jsonl", ".ndjson"}:
+            offset = 0
+            for line in handle:
+                if not line.strip():
+                    continue
+                yield offset, json.loads(line)
+                offset += 1
+        else:
+            yield from enumerate(csv.DictReader(handle))
+
+
+def map_rows(
+    rows: Iterable[Row],
+    mapping: Dict[str, str],
+    defaults: Dict[str, Any],
+) -> Iterator[Row]:
+    """Rename source columns to doctype fields and drop empty values."""
+
+    for offset, row in rows:
+        record = dict(defaults)
+        for column, value in row.items():
+            fieldname = mapping.get(column, column) if mapping else column
+            if not fieldname or value in (None, ""):
+                continue
+            record[fieldname] = value
+        yield offset, record
+
+
+class Checkpoint:
+    """Last committed offset of an import, persisted as a small JSON file."""
+
+    def __init__(self, path: Path, source: Path, doctype: str) -> None:
+        self.path = path
+        self.source = str(source.resolve())
+        self.doctype = doctype
+
+    def load(self) -> int:
+        if not self.path.exists():
+            return 0
+
+        state = json.loads(self.path.read_text())
+        if state.get("source") != self.source or state.get("doctype") != self.doctype:
+            print(f"  ⚠️ Checkpoint {self.path} belongs to another import, starting from the beginning")
+            return 0
+        return int(state.get("offset", 0))
+
+    def save(self, offset: int) -> None:
+        state = {"source": self.source, "doctype": self.doctype, "offset": offset}
+        write_atomic(self.path, json.dumps(state))
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+
+@instrumented()
+def import_file(
+    doctype: str,
+    key_field: str,
+    source: Path,
+    *,
+    mapping: Optional[Dict[str, str]] = None,
+    defaults: Optional[Dict[str, Any]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: Optional[Checkpoint] = None,
+    bulk: bool = False,
+) -> int:
+    """Import ``source`` batch by batch, committing and checkpointing after each one.
+
+    Only one batch is held in memory at a time. When a checkpoint exists the
+    rows before its offset are skipped, so an interrupted run resumes where
+    the last commit left off. The checkpoint never moves past a row that
+    failed (or lacked its key field) and is kept when the run ends with
+    failures, so the next run retries from the first of them. Returns the
+    number of rows processed.
+    """
+
+    start = checkpoint.load() if checkpoint else 0
+    if start:
+        print(f"  ↻ Resuming {doctype} import from row {start}")
+
+    rows = itertools.islice(iter_source_rows(source), start, None)
+    transaction = TransactionBatch(batch_size)
+    processed = 0
+    first_failed: Optional[int] = None
+
+    for batch in chunked(map_rows(rows, mapping or {}, defaults or {}), batch_size):
+        records: List[Row] = []
+        for offset, record in batch:
+            if record.get(key_field):
+                records.append((offset, record))
+            else:
+                print(f"    ❌ Row {offset}: missing key field {key_field}")
+                first_failed = offset if first_failed is None else first_failed
+
+        failed = transaction.failed
+        if bulk:
+            invalid = set()
+            with transaction.record(f"bulk importing {doctype} batch"):
+                docs = [record for _, record in records]
+                result = bulk_ensure_docs(doctype, key_field, docs, chunk_size=batch_size)
+                print_bulk_result(result)
+                invalid = {key for key, _ in result.invalid}
+            # a failed batch was rolled back as a whole, invalid records were skipped one by one
+            offsets = [
+                offset for offset, record in records if transaction.failed > failed or record[key_field] in invalid
+            ]
+            if offsets:
+                first_failed = offsets[0] if first_failed is None else min(first_failed, offsets[0])
+        else:
+            index = ExistenceIndex.for_keys(doctype, key_field, (record[key_field] for _, record in records))
+            for offset, record in records:
+                with transaction.record(f"importing {doctype} {record[key_field]}"):
+                    ensure_doc(doctype, {key_field: record[key_field]}, record, index=index)
+                if transaction.failed > failed:
+                    first_failed = offset if first_failed is None else first_failed
+                    failed = transaction.failed
+
+        transaction.commit()
+        last_offset = batch[-1][0] + 1
+        if checkpoint:
+            checkpoint.save(last_offset if first_failed is None else first_failed)
+        processed += len(batch)
+        print(f"  ✅ Committed {doctype} rows up to {last_offset}")
+
+    if checkpoint and first_failed is None:
+        checkpoint.clear()
+    elif checkpoint:
+        print(f"  ⚠️ Keeping {checkpoint.path}: the next run resumes from row {first_failed}, the first that failed")
+    return processed
+
+
+def parse_assignments(values: List[str], option: str) -> Dict[str, str]:
+    assignments: Dict[str, str] = {}
+    for value in values:
+        key, separator, target = value.partition("=")
+        if not separator or not key:
+            raise SystemExit(f"{option} expects KEY=VALUE, got {value!r}")
+        assignments[key] = target
+    return assignments
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stream CSV/JSONL master data into ERPNext")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--file", required=True, type=Path, help="CSV or JSONL source file")
+    parser.add_argument("--doctype", required=True, help="Target doctype, e.g. Customer")
+    parser.add_argument("--key-field", required=True, help="Field that identifies existing records")
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="COLUMN=FIELD",
+        help="Rename a source column to a doctype field (repeatable)",
+    )
+    parser.add_argument("--mapping-file", type=Path, help="JSON object of column -> field mappings")
+    parser.add_argument(
+        "--default",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="Value applied to every record unless the source provides one (repeatable)",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per commit")
+    parser.add_argument("--checkpoint", type=Path, help="Checkpoint file (default: <file>.checkpoint.json)")
+    parser.add_argument("--bulk", action="store_true", help="Use multi-row inserts for missing records")
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+
+    mapping = json.loads(args.mapping_file.read_text()) if args.mapping_file else {}
+    mapping.update(parse_assignments(args.map, "--map"))
+    defaults = parse_assignments(args.default, "--default")
+    checkpoint = Checkpoint(
+        args.checkpoint or args.file.with_name(args.file.name + ".checkpoint.json"),
+        args.file,
+        args.doctype,
+    )
+
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            print(f"📥 Importing {args.doctype} records from {args.file}...")
+            processed = import_file(
+                args.doctype,
+                args.key_field,
+                args.file,
+                mapping=mapping,
+                defaults=defaults,
+                batch_size=args.batch_size,
+                checkpoint=checkpoint,
+                bulk=args.bulk,
+            )
+            print(f"\n🎉 Imported {processed} {args.doctype} rows")
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error importing {args.doctype}: {err}")
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "import_master_data")
+
+
+if __name__ == "__main__":
+    main()
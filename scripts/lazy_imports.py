@@ -0,0 +1,48 @@
+"""Deferred imports for modules that are expensive to load, Frappe above all.
+
+``import frappe`` loads the framework, its hooks and most of its
+dependencies, which takes seconds in the container. Modules here bind
+``frappe = lazy_import("frappe")`` instead, so parsing arguments, printing
+``--help`` or rejecting a bad organisation document never pays for it; the
+real import happens on the first attribute access, i.e. the first DB call.
+"""
+
+from __future__ import annotations
+
+import importlib
+import sys
+import types
+from typing import Any, Dict
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in that imports the named module on first use and forwards every attribute to it.
+
+    It is never put in ``sys.modules``, so a plain ``import frappe`` elsewhere
+    still gets the real module.
+    """
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._load(), attr, value)
+
+    def _load(self) -> types.ModuleType:
+        return sys.modules.get(self.__name__) or importlib.import_module(self.__name__)
+
+
+_lazy_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> Any:
+    """Return a shared ``LazyModule`` for ``name``; importing it is deferred to first use."""
+
+    module = _lazy_modules.get(name)
+    if module is None:
+        module = _lazy_modules[name] = LazyModule(name)
+    return module
+
+
+def is_loaded(name: str) -> bool:
+    return name in sys.modules
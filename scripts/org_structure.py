@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Compiled model of ``docs/galaxy_holding_estructura_organizacional.json``.
+
+The organisation document is the single source for companies and roles.
+``load_org_structure`` parses and validates it once, precomputes the
+lookup indexes the setup scripts need and pickles the result in a cache
+keyed by the SHA-256 of the document (and of the mapping tables below),
+so later invocations skip parsing and validation entirely.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import CompanyConfig, write_atomic
+
+
+MODEL_VERSION = 1
+
+DEFAULT_ORG_STRUCTURE = (
+    Path(__file__).resolve().parents[1] / "docs" / "galaxy_holding_estructura_organizacional.json"
+)
+
+# Layer key in the document -> ERPNext role provisioned for it.
+LAYER_ROLES: Dict[str, str] = {
+    "direccion": "Galaxy Director",
+    "administracion_presupuestos": "Galaxy Administrator",
+    "it_desarrollo": "Galaxy IT Developer",
+    "operaciones_mantenimiento": "Galaxy Operations",
+    "legal": "Galaxy Legal",
+}
+
+# ``erpnext_modules`` labels used in the document -> doctypes they cover.
+# Labels without doctypes (dashboards, reports) grant nothing on their own;
+# ``*`` stands for every doctype.
+MODULE_DOCTYPES: Dict[str, Tuple[str, ...]] = {
+    "All Modules": ("*",),
+    "Dashboard": (),
+    "Reports": (),
+    "Approvals": (),
+    "Accounts": ("Account", "Journal Entry", "Payment Entry", "Purchase Invoice", "Sales Invoice"),
+    "Budget": ("Budget",),
+    "Buying": ("Supplier", "Purchase Order", "Purchase Invoice"),
+    "Selling": ("Customer", "Sales Order", "Sales Invoice"),
+    "CRM": ("Lead", "Opportunity", "Customer"),
+    "Contracts": ("Contract",),
+    "Documents": ("File",),
+    "HR": ("Employee",),
+    "Projects": ("Project", "Task", "Timesheet"),
+    "Tasks": ("Task",),
+    "Timesheet": ("Timesheet",),
+    "Issues": ("Issue",),
+    "Manufacturing": ("BOM", "Work Order"),
+    "Stock": ("Item", "Stock Entry", "Warehouse"),
+    "Quality": ("Quality Inspection",),
+    "Maintenance": ("Maintenance Schedule", "Maintenance Visit"),
+}
+
+# The document has no ERPNext industry field; everything else is "Services".
+COMPANY_DOMAINS: Dict[str, str] = {
+    "galaxy_bio": "Manufacturing",
+    "galaxy_engineering": "Manufacturing",
+}
+
+DOMAIN_TYPES = ("parent_entity", "subsidiary", "planned_subsidiary")
+
+
+class OrgStructureError(ValueError):
+    """The organisation document does not match the expected shape."""
+
+
+@dataclass(frozen=True, slots=True)
+class Layer:
+    key: str
+    name: str
+    employees: int
+    positions: Tuple[str, ...]
+    responsibilities: Tuple[str, ...]
+    erpnext_modules: Tuple[str, ...]
+    access_level: str
+    status: str = "active"
+
+
+@dataclass(frozen=True, slots=True)
+class Domain:
+    key: str
+    name: str
+    type: str
+    active: bool
+    employees: int
+    description: str
+    parent_key: Optional[str]
+    layers: Tuple[Layer, ...]
+    target_launch: Optional[str] = None
+    estimated_employees: int = 0
+    focus_areas: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class OrgStructure:
+    """Validated domains plus the indexes provisioning looks things up in."""
+
+    source_hash: str
+    domains: Tuple[Domain, ...]
+    domain_companies: Dict[str, CompanyConfig]
+    layer_roles: Dict[str, str]
+    role_modules: Dict[str, Tuple[str, ...]]
+    module_doctypes: Dict[str, Tuple[str, ...]]
+
+    def companies(self) -> List[CompanyConfig]:
+        return [self.domain_companies[domain.key] for domain in self.domains if domain.active]
+
+    def future_companies(self) -> List[CompanyConfig]:
+        return [self.domain_companies[domain.key] for domain in self.domains if not domain.active]
+
+    def role_doctypes(self, role_name: str) -> Tuple[str, ...]:
+        doctypes: Dict[str, None] = {}
+        for module in self.role_modules.get(role_name, ()):
+            doctypes.update(dict.fromkeys(self.module_doctypes[module]))
+        return tuple(doctypes)
+
+    def role_configs(self, permissions: Dict[str, Dict[str, List[str]]]) -> Dict[str, Dict[str, object]]:
+        """Role configurations for every role the organisation uses.
+
+        ``permissions`` holds the hand-tuned doctype grants per role; a role
+        without an entry gets read access to the doctypes of its modules.
+        """
+
+        configs: Dict[str, Dict[str, object]] = {}
+        for role_name, modules in self.role_modules.items():
+            granted = permissions.get(role_name)
+            if granted is None:
+                granted = {"read": list(self.role_doctypes(role_name))}
+            configs[role_name] = {"permissions": granted, "modules": list(modules)}
+        return configs
+
+
+def _require(value: Dict[str, Any], key: str, kind: type, where: str) -> Any:
+    if key not in value:
+        raise OrgStructureError(f"{where}: missing '{key}'")
+    if not isinstance(value[key], kind):
+        raise OrgStructureError(f"{where}.{key}: expected {kind.__name__}, got {type(value[key]).__name__}")
+    return value[key]
+
+
+def _strings(value: Dict[str, Any], key: str, where: str) -> Tuple[str, ...]:
+    items = value.get(key, [])
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        raise OrgStructureError(f"{where}.{key}: expected a list of strings")
+    return tuple(items)
+
+
+def parse_layer(key: str, raw: Dict[str, Any], where: str) -> Layer:
+    modules = _strings(raw, "erpnext_modules", where)
+    unknown = [module for module in modules if module not in MODULE_DOCTYPES]
+    if unknown:
+        raise OrgStructureError(f"{where}.erpnext_modules: unknown module(s) {', '.join(unknown)}")
+    if key not in LAYER_ROLES:
+        raise OrgStructureError(f"{where}: layer '{key}' has no role in LAYER_ROLES")
+
+    return Layer(
+        key=key,
+        name=_require(raw, "name", str, where),
+        employees=_require(raw, "employees", int, where),
+        positions=_strings(raw, "roles", where),
+        responsibilities=_strings(raw, "responsibilities", where),
+        erpnext_modules=modules,
+        access_level=_require(raw, "access_level", str, where),
+        status=raw.get("status", "active"),
+    )
+
+
+def parse_domain(key: str, raw: Dict[str, Any], *, active: bool) -> Domain:
+    where = f"domains.{'active' if active else 'expansion'}.{key}"
+    domain_type = _require(raw, "type", str, where)
+    if domain_type not in DOMAIN_TYPES:
+        raise OrgStructureError(f"{where}.type: unknown type '{domain_type}'")
+
+    layers = _require(raw, "layers", dict, where) if active else raw.get("layers", {})
+    return Domain(
+        key=key,
+        name=_require(raw, "name", str, where),
+        type=domain_type,
+        active=active,
+        employees=_require(raw, "employees", int, where),
+        description=raw.get("description", ""),
+        parent_key=raw.get("parent_company"),
+        layers=tuple(
+            parse_layer(layer_key, layer, f"{where}.layers.{layer_key}") for layer_key, layer in layers.items()
+        ),
+        target_launch=raw.get("target_launch"),
+        estimated_employees=raw.get("estimated_employees", 0),
+        focus_areas=_strings(raw, "focus_areas", where),
+    )
+
+
+def company_abbreviations(domains: Tuple[Domain, ...]) -> Dict[str, str]:
+    """Initials of each company name, lengthening the last word on clashes."""
+
+    abbreviations: Dict[str, str] = {}
+    taken = set()
+    for domain in domains:
+        words = domain.name.split()
+        abbr = "".join(word[0] for word in words).upper()
+        extra = 2
+        while abbr in taken and extra <= len(words[-1]):
+            abbr = ("".join(word[0] for word in words[:-1]) + words[-1][:extra]).upper()
+            extra += 1
+        if abbr in taken:
+            raise OrgStructureError(f"Cannot derive a unique abbreviation for {domain.name}")
+        taken.add(abbr)
+        abbreviations[domain.key] = abbr
+    return abbreviations
+
+
+def compile_org_structure(document: Dict[str, Any], source_hash: str) -> OrgStructure:
+    """Validate the parsed JSON document and build the model with its indexes."""
+
+    root = _require(document, "galaxy_holding_organizational_structure", dict, "document")
+    raw_domains = _require(root, "domains", dict, "domains")
+    domains = tuple(
+        parse_domain(key, raw, active=active)
+        for group, active in (("active", True), ("expansion", False))
+        for key, raw in _require(raw_domains, group, dict, "domains").items()
+    )
+
+    by_key = {domain.key: domain for domain in domains}
+    if len(by_key) != len(domains):
+        raise OrgStructureError("domains: duplicate domain keys across active and expansion")
+    roots = [domain for domain in domains if domain.parent_key is None]
+    if len(roots) != 1 or not roots[0].active:
+        raise OrgStructureError("domains: expected exactly one active parent entity")
+    for domain in domains:
+        if domain.parent_key is not None and domain.parent_key not in by_key:
+            raise OrgStructureError(f"domains.{domain.key}.parent_company: unknown domain '{domain.parent_key}'")
+
+    abbreviations = company_abbreviations(domains)
+    domain_companies = {
+        domain.key: CompanyConfig(
+            domain.name,
+            abbreviations[domain.key],
+            COMPANY_DOMAINS.get(domain.key, "Services"),
+            is_group=int(domain.parent_key is None),
+            parent_company=by_key[domain.parent_key].name if domain.parent_key else "",
+        )
+        for domain in domains
+    }
+
+    layer_roles: Dict[str, str] = {}
+    role_modules: Dict[str, Dict[str, None]] = {}
+    for domain in domains:
+        for layer in domain.layers:
+            role_name = LAYER_ROLES[layer.key]
+            layer_roles[layer.key] = role_name
+            role_modules.setdefault(role_name, {}).update(dict.fromkeys(layer.erpnext_modules))
+
+    return OrgStructure(
+        source_hash=source_hash,
+        domains=domains,
+        domain_companies=domain_companies,
+        layer_roles=layer_roles,
+        role_modules={role_name: tuple(modules) for role_name, modules in role_modules.items()},
+        module_doctypes=dict(MODULE_DOCTYPES),
+    )
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "galaxy_provisioning"
+
+
+def model_hash(raw: bytes) -> str:
+    """Hash of the document and of every table the compiled model depends on."""
+
+    digest = hashlib.sha256(raw)
+    tables = [MODEL_VERSION, LAYER_ROLES, MODULE_DOCTYPES, COMPANY_DOMAINS]
+    digest.update(json.dumps(tables, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_org_structure(
+    path: Path = DEFAULT_ORG_STRUCTURE,
+    *,
+    cache_dir: Optional[Path] = None,
+    use_cache: bool = True,
+) -> OrgStructure:
+    """Return the compiled model, reusing the pickled one when the inputs are unchanged."""
+
+    raw = path.read_bytes()
+    source_hash = model_hash(raw)
+    cache_path = (cache_dir or default_cache_dir()) / f"org_structure-{source_hash[:16]}.pickle"
+
+    if use_cache and cache_path.exists():
+        try:
+            model = pickle.loads(cache_path.read_bytes())
+        except Exception:  # stale or truncated cache, rebuild below
+            model = None
+        if isinstance(model, OrgStructure) and model.source_hash == source_hash:
+            return model
+
+    try:
+        document = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise OrgStructureError(f"{path}: invalid JSON ({exc})") from exc
+    model = compile_org_structure(document, source_hash)
+
+    if use_cache:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(cache_path, pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as exc:
+            print(f"⚠️  Could not cache the organisation model in {cache_path}: {exc}")
+    return model
+
+
+def add_org_structure_arguments(parser: Any) -> None:
+    parser.add_argument(
+        "--org-structure",
+        type=Path,
+        default=DEFAULT_ORG_STRUCTURE,
+        metavar="PATH",
+        help="Organisation structure document that drives provisioning",
+    )
+    parser.add_argument(
+        "--no-model-cache",
+        dest="model_cache",
+        action="store_false",
+        help="Parse the organisation document without reading or writing the pickled model",
+    )
+
+
+def load_from_arguments(args: Any) -> OrgStructure:
+    return load_org_structure(args.org_structure, use_cache=args.model_cache)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate and cache the organisation structure model")
+    add_org_structure_arguments(parser)
+    model = load_from_arguments(parser.parse_args())
+
+    for domain in model.domains:
+        company = model.domain_companies[domain.key]
+        state = "active" if domain.active else f"planned {domain.target_launch}"
+        print(f"🏢 {company.company_name} ({company.abbr}, {company.domain}) - {state}")
+        for layer in domain.layers:
+            print(f"   • {layer.name}: {model.layer_roles[layer.key]} ({layer.employees} employees)")
+    for role_name, modules in model.role_modules.items():
+        print(f"🔐 {role_name}: {', '.join(modules)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Upsert parties as a graph: the party, its primary Contact and the Dynamic Link between them.
+
+With ``ensure_doc`` every customer costs an existence query, a ``get_doc``
+and a save for the party, the same again for its contact, and a second
+contact save to rewrite the links. ``upsert_parties`` reads the parties and
+their contacts (matched on ``email_id``, child tables included) for a whole
+chunk with a handful of queries, diffs them in memory and writes each
+contact once with its final links, emails and phones. Unchanged parties
+cost no writes at all.
+
+With ``bulk`` the missing parties, contacts and their child rows are written
+with multi-row inserts instead of ``insert()``, so no controller runs for
+them (no Version rows, no contact autolinking hooks).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bulk_insert import build_doc, validate_records, write_rows
+from lazy_imports import lazy_import
+from planner import Snapshot, changed_values
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    ExistenceIndex,
+    ProvisioningStats,
+    TransactionBatch,
+    chunked,
+    instrumentation,
+    merge_child_rows,
+    provisioning_stats,
+)
+
+
+frappe = lazy_import("frappe")
+
+
+# Contact child tables and the fields their rows are matched on
+CONTACT_TABLE_KEYS: Dict[str, str | Tuple[str, ...]] = {
+    "email_ids": "email_id",
+    "phone_nos": "phone",
+    "links": ("link_doctype", "link_name"),
+}
+
+
+@dataclass
+class Party:
+    """One party record and, optionally, the fields of its primary contact."""
+
+    values: Dict[str, Any]
+    contact: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class PartyUpsertResult:
+    doctype: str
+    parties: int = 0
+    contacts: int = 0
+    bulk_rows: int = 0
+    queries: int = 0
+    invalid: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def queries_per_party(self) -> float:
+        return self.queries / self.parties if self.parties else 0.0
+
+
+def upsert_parties(
+    batch: TransactionBatch,
+    doctype: str,
+    key_field: str,
+    parties: Iterable[Party],
+    *,
+    bulk: bool = False,
+    chunk_size: int = EXISTS_CHUNK_SIZE,
+    stats: Optional[ProvisioningStats] = None,
+) -> PartyUpsertResult:
+    """Create or update ``parties`` of ``doctype`` and their contacts, one chunk at a time."""
+
+    stats = stats if stats is not None else provisioning_stats
+    result = PartyUpsertResult(doctype)
+    link_indexes: Dict[str, ExistenceIndex] = {}
+
+    with instrumentation.step("upsert_parties") as metrics:
+        queries_before = metrics.queries
+        for chunk in chunked(unique_parties(parties, key_field), chunk_size):
+            names = upsert_party_rows(batch, doctype, key_field, chunk, bulk, link_indexes, result, stats)
+            upsert_contacts(batch, doctype, key_field, chunk, names, bulk, result, stats)
+            result.parties += len(chunk)
+        result.queries = metrics.queries - queries_before
+
+    stats.record_queries(f"{doctype} parties", result.queries, result.parties)
+    return result
+
+
+def unique_parties(parties: Iterable[Party], key_field: str) -> Iterable[Party]:
+    """Drop repeated party keys and repeated contact emails; the first occurrence wins."""
+
+    seen_keys: set = set()
+    seen_emails: set = set()
+    for party in parties:
+        key = party.values[key_field]
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+
+        email = (party.contact or {}).get("email_id")
+        if email in seen_emails:
+            party = Party(party.values)
+        elif email:
+            seen_emails.add(email)
+        yield party
+
+
+def upsert_party_rows(
+    batch: TransactionBatch,
+    doctype: str,
+    key_field: str,
+    chunk: List[Party],
+    bulk: bool,
+    link_indexes: Dict[str, ExistenceIndex],
+    result: PartyUpsertResult,
+    stats: ProvisioningStats,
+) -> Dict[str, str]:
+    """Write the parties of one chunk; returns ``key -> document name`` of those that exist afterwards."""
+
+    fields = list(dict.fromkeys(field for party in chunk for field in party.values))
+    snapshot = Snapshot(doctype, key_field, (party.values[key_field] for party in chunk), fields)
+    names: Dict[str, str] = {}
+    missing: List[Dict[str, Any]] = []
+
+    for party in chunk:
+        key = party.values[key_field]
+        row = snapshot.get(key)
+        if row is None:
+            missing.append(party.values)
+            continue
+
+        names[key] = row["name"]
+        changed = changed_values(row, party.values)
+        if not changed:
+            stats.record(doctype, "unchanged")
+            continue
+
+        with batch.record(f"updating {doctype} {key}"):
+            doc = frappe.get_doc(doctype, row["name"])
+            doc.update(changed)
+            doc.save(ignore_permissions=True)
+            stats.record(doctype, "updated")
+
+    if bulk:
+        for doc in bulk_insert_records(batch, doctype, key_field, missing, link_indexes, result):
+            names[doc.get(key_field)] = doc.name
+            stats.record(doctype, "created")
+        return names
+
+    for values in missing:
+        with batch.record(f"creating {doctype} {values[key_field]}"):
+            doc = frappe.get_doc({"doctype": doctype, **values}).insert(ignore_permissions=True)
+            names[values[key_field]] = doc.name
+            stats.record(doctype, "created")
+    return names
+
+
+def upsert_contacts(
+    batch: TransactionBatch,
+    doctype: str,
+    key_field: str,
+    chunk: List[Party],
+    names: Dict[str, str],
+    bulk: bool,
+    result: PartyUpsertResult,
+    stats: ProvisioningStats,
+) -> None:
+    """Write every contact of the chunk once, linked to its party's document name."""
+
+    contacts: List[Dict[str, Any]] = []
+    for party in chunk:
+        name = names.get(party.values[key_field])
+        if party.contact and party.contact.get("email_id") and name:
+            contacts.append({**party.contact, "links": [{"link_doctype": doctype, "link_name": name}]})
+    if not contacts:
+        return
+
+    scalar_fields: List[str] = []
+    tables: Dict[str, List[str]] = {}
+    for contact in contacts:
+        for fieldname, value in contact.items():
+            if fieldname in CONTACT_TABLE_KEYS:
+                child_fields = tables.setdefault(fieldname, [])
+                child_fields.extend(column for row in value for column in row if column not in child_fields)
+            elif fieldname not in scalar_fields:
+                scalar_fields.append(fieldname)
+    emails = [contact["email_id"] for contact in contacts]
+    snapshot = Snapshot("Contact", "email_id", emails, scalar_fields, tables=tables)
+
+    missing: List[Dict[str, Any]] = []
+    for contact in contacts:
+        row = snapshot.get(contact["email_id"])
+        if row is None:
+            missing.append(contact)
+            continue
+
+        changed = changed_values(row, contact)
+        if not changed:
+            stats.record("Contact", "unchanged")
+            continue
+
+        with batch.record(f"updating contact {contact['email_id']}"):
+            doc = frappe.get_doc("Contact", row["name"])
+            doc.update({key: value for key, value in changed.items() if key not in CONTACT_TABLE_KEYS})
+            for fieldname, key in CONTACT_TABLE_KEYS.items():
+                if fieldname in changed:
+                    merge_child_rows(doc, fieldname, contact[fieldname], key)
+            doc.save(ignore_permissions=True)
+            stats.record("Contact", "updated")
+            result.contacts += 1
+
+    if bulk:
+        for _ in bulk_insert_records(batch, "Contact", "email_id", missing, {}, result):
+            stats.record("Contact", "created")
+            result.contacts += 1
+        return
+
+    for contact in missing:
+        with batch.record(f"creating contact {contact['email_id']}"):
+            frappe.get_doc({"doctype": "Contact", **contact}).insert(ignore_permissions=True)
+            stats.record("Contact", "created")
+            result.contacts += 1
+
+
+def bulk_insert_records(
+    batch: TransactionBatch,
+    doctype: str,
+    key_field: str,
+    records: List[Dict[str, Any]],
+    link_indexes: Dict[str, ExistenceIndex],
+    result: PartyUpsertResult,
+) -> List[Any]:
+    """Validate ``records`` and write them and their child rows with one multi-row insert per doctype."""
+
+    if not records:
+        return []
+
+    meta = frappe.get_meta(doctype)
+    child_doctypes = {df.fieldname: df.options for df in meta.get_table_fields()}
+    docs: List[Any] = []
+    children: Dict[str, List[Any]] = {}
+
+    for record, error in validate_records(meta, records, link_indexes):
+        if error:
+            result.invalid.append((f"{doctype} {record[key_field]}", error))
+            continue
+
+        values = {fieldname: value for fieldname, value in record.items() if fieldname not in child_doctypes}
+        doc = build_doc(doctype, values)
+        docs.append(doc)
+        for fieldname, child_doctype in child_doctypes.items():
+            for idx, row in enumerate(record.get(fieldname) or [], start=1):
+                child = build_doc(
+                    child_doctype,
+                    {**row, "parent": doc.name, "parenttype": doctype, "parentfield": fieldname, "idx": idx},
+                )
+                children.setdefault(child_doctype, []).append(child)
+
+    failed = batch.failed
+    with batch.record(f"bulk inserting {len(docs)} {doctype} rows"):
+        write_rows(doctype, docs)
+        for child_doctype, rows in children.items():
+            write_rows(child_doctype, rows)
+    if batch.failed != failed:
+        return []
+    result.bulk_rows += len(docs) + sum(len(rows) for rows in children.values())
+    return docs
+
+
+def print_party_result(result: PartyUpsertResult) -> None:
+    print(
+        f"  👥 {result.doctype}: {result.parties} parties, {result.contacts} contacts written, "
+        f"{result.bulk_rows} bulk rows, {result.queries} queries ({result.queries_per_party:.2f} per party)"
+    )
+    for label, error in result.invalid:
+        print(f"    ❌ Skipped {label}: {error}")
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""Stage-weighted CRM pipeline forecast per company and expected closing month.
+
+Report queries load every Opportunity document again on each run. Here
+Opportunities and their Opportunity Items are read in bulk (keyset pages,
+``as_list`` rows, one item query per chunk of opportunities) into NumPy
+columns. The columns are cached per opportunity in
+``sites/<site>/private/galaxy_provisioning/pipeline_forecast.npz``.
+
+Later runs only read the opportunities ``modified`` since the last one and
+replace their cached rows. The window overlaps by ``--overlap-seconds``,
+so a transaction that committed late is not missed. Deleted opportunities
+are dropped after a name-only query. Weights are applied when the
+forecast is computed, so changing them needs no reload:
+
+- the probability of the opportunity's sales stage (``STAGE_WEIGHTS``,
+  override with ``--stage-weights``), else its own ``probability``;
+- only ``Open``, ``Replied`` and ``Quotation`` opportunities count.
+
+Amounts are ``qty × rate`` of the items (or ``opportunity_amount`` without
+items) in company currency::
+
+    python3 /scripts/pipeline_forecast.py --site galaxy.local
+    python3 /scripts/pipeline_forecast.py --site galaxy.local --company "Galaxy Software" --from-month 2025-01 --output forecast.csv
+    python3 /scripts/pipeline_forecast.py --site galaxy.local --full    # ignore the cache and reload everything
+
+NumPy is imported lazily and is only needed by this script.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime
+import importlib.util
+import io
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from lazy_imports import lazy_import
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+    write_atomic,
+)
+
+
+frappe = lazy_import("frappe")
+frappe_utils = lazy_import("frappe.utils")
+np = lazy_import("numpy")
+
+
+CACHE_VERSION = 1
+DEFAULT_PAGE_SIZE = 5_000
+DEFAULT_OVERLAP_SECONDS = 300
+OPEN_STATUSES = ("Open", "Replied", "Quotation")
+OPPORTUNITY_FIELDS = [
+    "name",
+    "modified",
+    "company",
+    "status",
+    "sales_stage",
+    "probability",
+    "expected_closing",
+    "with_items",
+    "opportunity_amount",
+    "conversion_rate",
+]
+
+# ERPNext's default Sales Stages
+STAGE_WEIGHTS: Dict[str, float] = {
+    "Prospecting": 0.10,
+    "Qualification": 0.20,
+    "Needs Analysis": 0.30,
+    "Value Proposition": 0.40,
+    "Identifying Decision Makers": 0.50,
+    "Perception Analysis": 0.60,
+    "Proposal/Price Quote": 0.75,
+    "Negotiation/Review": 0.90,
+}
+
+
+@dataclass
+class OpportunityColumns:
+    """One entry per opportunity; ``month`` counts from 1970-01, -1 when there is no expected closing."""
+
+    names: Any
+    company: Any
+    status: Any
+    stage: Any
+    probability: Any
+    month: Any
+    amount: Any
+
+    FIELDS = ("names", "company", "status", "stage", "probability", "month", "amount")
+
+    @classmethod
+    def empty(cls) -> "OpportunityColumns":
+        return cls(
+            np.empty(0, dtype=str),
+            np.empty(0, dtype=str),
+            np.empty(0, dtype=str),
+            np.empty(0, dtype=str),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def select(self, mask: Any) -> "OpportunityColumns":
+        return OpportunityColumns(*(getattr(self, name)[mask] for name in self.FIELDS))
+
+    def concat(self, other: "OpportunityColumns") -> "OpportunityColumns":
+        return OpportunityColumns(
+            *(np.concatenate([getattr(self, name), getattr(other, name)]) for name in self.FIELDS)
+        )
+
+
+@dataclass
+class ForecastCache:
+    path: Optional[Path]
+    columns: OpportunityColumns
+    # latest ``modified`` seen; "" until the first full load
+    mark: str = ""
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> "ForecastCache":
+        if path is None or not path.is_file():
+            return cls(path, OpportunityColumns.empty())
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != CACHE_VERSION:
+                return cls(path, OpportunityColumns.empty())
+            columns = OpportunityColumns(*(data[name] for name in OpportunityColumns.FIELDS))
+        return cls(path, columns, meta["mark"])
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        buffer = io.BytesIO()
+        arrays = {name: getattr(self.columns, name) for name in OpportunityColumns.FIELDS}
+        meta = json.dumps({"version": CACHE_VERSION, "mark": self.mark})
+        np.savez(buffer, meta=np.array(meta), **arrays)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path, buffer.getvalue())
+
+
+@dataclass
+class RefreshResult:
+    full: bool
+    read: int = 0
+    removed: int = 0
+    cached: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class ForecastRow:
+    company: str
+    month: str  # YYYY-MM, "" without an expected closing date
+    opportunities: int
+    pipeline: float
+    weighted: float
+
+
+@dataclass
+class Forecast:
+    rows: List[ForecastRow] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def default_cache_path() -> Path:
+    return Path(frappe.get_site_path("private", "galaxy_provisioning", "pipeline_forecast.npz"))
+
+
+def iter_opportunity_pages(modified_since: str, page_size: int) -> Iterator[List[Sequence[Any]]]:
+    """Pages of ``OPPORTUNITY_FIELDS`` tuples modified since ``modified_since``, by name (keyset pagination)."""
+
+    filters: Dict[str, Any] = {"modified": [">=", modified_since]} if modified_since else {}
+    last_name = ""
+    while True:
+        page = frappe.get_all(
+            "Opportunity",
+            filters={**filters, "name": [">", last_name]},
+            fields=OPPORTUNITY_FIELDS,
+            order_by="name asc",
+            limit_page_length=page_size,
+            as_list=True,
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_name = page[-1][0]
+
+
+def month_numbers(dates: Sequence[Any]) -> Any:
+    """Months since 1970-01 of each date; -1 for missing dates."""
+
+    present = np.fromiter((bool(date) for date in dates), dtype=bool, count=len(dates))
+    months = np.full(len(dates), -1, dtype=np.int64)
+    if present.any():
+        values = [str(date)[:10] for date in dates if date]
+        months[present] = np.asarray(values, dtype="datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    return months
+
+
+def item_amounts(names: Sequence[str], chunk_size: int = EXISTS_CHUNK_SIZE) -> Any:
+    """``sum(qty × rate)`` of the items of each opportunity in ``names``."""
+
+    index = {name: position for position, name in enumerate(names)}
+    totals = np.zeros(len(names), dtype=np.float64)
+    for chunk in chunked(names, chunk_size):
+        rows = frappe.get_all(
+            "Opportunity Item",
+            filters={"parenttype": "Opportunity", "parent": ["in", chunk]},
+            fields=["parent", "qty", "rate"],
+            limit_page_length=0,
+            as_list=True,
+        )
+        if not rows:
+            continue
+        parents = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        qty = np.asarray([row[1] or 0 for row in rows], dtype=np.float64)
+        rate = np.asarray([row[2] or 0 for row in rows], dtype=np.float64)
+        totals += np.bincount(parents, weights=qty * rate, minlength=len(names))
+    return totals
+
+
+def read_page(page: List[Sequence[Any]]) -> Tuple[OpportunityColumns, str]:
+    """Columns of one page of opportunities, with the latest ``modified`` among them."""
+
+    (
+        names,
+        modified,
+        companies,
+        statuses,
+        stages,
+        probabilities,
+        closing,
+        with_items,
+        amounts,
+        rates,
+    ) = (list(column) for column in zip(*page))
+    from_items = np.asarray([bool(flag) for flag in with_items])
+    amount = np.asarray([value or 0 for value in amounts], dtype=np.float64)
+    if from_items.any():
+        amount = np.where(from_items, item_amounts(names), amount)
+    amount *= np.asarray([rate or 1 for rate in rates], dtype=np.float64)
+
+    columns = OpportunityColumns(
+        np.asarray(names, dtype=str),
+        np.asarray([company or "" for company in companies], dtype=str),
+        np.asarray([status or "" for status in statuses], dtype=str),
+        np.asarray([stage or "" for stage in stages], dtype=str),
+        np.asarray([value if value is not None else 100 for value in probabilities], dtype=np.float64),
+        month_numbers(closing),
+        amount,
+    )
+    return columns, max(str(value) for value in modified)
+
+
+@instrumented()
+def refresh_cache(
+    cache: ForecastCache,
+    *,
+    full: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    overlap_seconds: int = DEFAULT_OVERLAP_SECONDS,
+) -> RefreshResult:
+    """Replace the cached rows of opportunities modified since the mark (everything with ``full``)."""
+
+    started = time.perf_counter()
+    full = full or not cache.mark
+    result = RefreshResult(full)
+    since = ""
+    if not full:
+        since = str(frappe_utils.add_to_date(cache.mark, seconds=-overlap_seconds, as_string=True))
+
+    pages: List[OpportunityColumns] = []
+    mark = "" if full else cache.mark
+    for page in iter_opportunity_pages(since, page_size):
+        columns, page_mark = read_page(page)
+        pages.append(columns)
+        mark = max(mark, page_mark)
+        result.read += len(columns)
+
+    fresh = OpportunityColumns.empty()
+    for columns in pages:
+        fresh = fresh.concat(columns)
+
+    current = OpportunityColumns.empty() if full else cache.columns
+    if not full:
+        # drop the stale rows of re-read opportunities and of deleted ones
+        existing = np.asarray(frappe.get_all("Opportunity", pluck="name", limit_page_length=0), dtype=str)
+        keep = np.isin(current.names, existing) & ~np.isin(current.names, fresh.names)
+        result.removed = int((~np.isin(current.names, existing)).sum())
+        current = current.select(keep)
+
+    cache.columns = current.concat(fresh)
+    cache.mark = mark
+    result.cached = len(cache.columns)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def stage_weights(columns: OpportunityColumns, weights: Dict[str, float]) -> Any:
+    """Weight of each opportunity: its sales stage's, else its own probability."""
+
+    stages, inverse = np.unique(columns.stage, return_inverse=True)
+    by_stage = np.asarray([weights.get(stage, np.nan) for stage in stages], dtype=np.float64)[inverse]
+    return np.where(np.isnan(by_stage), columns.probability / 100, by_stage)
+
+
+@instrumented()
+def compute_forecast(
+    cache: ForecastCache,
+    *,
+    weights: Optional[Dict[str, float]] = None,
+    companies: Optional[Sequence[str]] = None,
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+) -> Forecast:
+    """Pipeline and weighted totals per ``(company, month)`` of the open opportunities."""
+
+    started = time.perf_counter()
+    columns = cache.columns
+    mask = np.isin(columns.status, OPEN_STATUSES)
+    if companies:
+        mask &= np.isin(columns.company, list(companies))
+    if from_month:
+        mask &= columns.month >= np.datetime64(from_month, "M").astype(np.int64)
+    if to_month:
+        mask &= (columns.month <= np.datetime64(to_month, "M").astype(np.int64)) & (columns.month >= 0)
+    columns = columns.select(mask)
+    if not len(columns):
+        return Forecast(seconds=time.perf_counter() - started)
+
+    weighted = columns.amount * stage_weights(columns, STAGE_WEIGHTS if weights is None else weights)
+    company_names, company_ids = np.unique(columns.company, return_inverse=True)
+    # months start at -1 (no date), so shift them to keep the packed key non-negative
+    keys, inverse = np.unique((company_ids.astype(np.int64) << 32) | (columns.month + 1), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    pipeline = np.bincount(inverse, weights=columns.amount, minlength=len(keys))
+    weighted_totals = np.bincount(inverse, weights=weighted, minlength=len(keys))
+
+    rows = []
+    for position, key in enumerate(keys.tolist()):
+        month = (key & 0xFFFFFFFF) - 1
+        label = str(np.datetime64(month, "M")) if month >= 0 else ""
+        rows.append(
+            ForecastRow(
+                str(company_names[key >> 32]),
+                label,
+                int(counts[position]),
+                round(float(pipeline[position]), 2),
+                round(float(weighted_totals[position]), 2),
+            )
+        )
+    return Forecast(rows, time.perf_counter() - started)
+
+
+def write_forecast(forecast: Forecast, stream: TextIO) -> None:
+    writer = csv.writer(stream)
+    writer.writerow(["company", "month", "opportunities", "pipeline", "weighted"])
+    for row in forecast.rows:
+        writer.writerow([row.company, row.month, row.opportunities, f"{row.pipeline:.2f}", f"{row.weighted:.2f}"])
+
+
+def print_forecast(forecast: Forecast, refresh: RefreshResult) -> None:
+    mode = "full load" if refresh.full else "incremental refresh"
+    print(
+        f"📈 Pipeline forecast: {mode} read {refresh.read} opportunities ({refresh.removed} deleted) "
+        f"in {refresh.seconds:.2f}s, {refresh.cached} cached, forecast in {forecast.seconds * 1000:.1f}ms"
+    )
+    for row in forecast.rows:
+        month = row.month or "no date"
+        print(
+            f"  {row.company:<22} {month:<8} {row.opportunities:>6} opps  "
+            f"{row.pipeline:>16,.2f} pipeline  {row.weighted:>16,.2f} weighted"
+        )
+
+
+def load_stage_weights(path: Optional[Path]) -> Dict[str, float]:
+    if path is None:
+        return STAGE_WEIGHTS
+    weights = json.loads(path.read_text())
+    if not isinstance(weights, dict) or not all(isinstance(value, (int, float)) for value in weights.values()):
+        raise ValueError(f"{path}: expected an object of sales stage -> weight (0-1)")
+    return {str(stage): float(value) for stage, value in weights.items()}
+
+
+def parse_arguments() -> Tuple[argparse.Namespace, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description="Stage-weighted CRM pipeline forecast per company and month")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--company", action="append", help="Only these companies (repeatable)")
+    parser.add_argument("--from-month", help="First expected closing month (YYYY-MM)")
+    parser.add_argument("--to-month", help="Last expected closing month (YYYY-MM)")
+    parser.add_argument("--stage-weights", type=Path, help="JSON object of sales stage -> weight (0-1)")
+    parser.add_argument("--cache", type=Path, help="Cache file (default: the site's private galaxy_provisioning folder)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the cache")
+    parser.add_argument("--full", action="store_true", help="Reload every opportunity instead of the modified ones")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Opportunities fetched per query")
+    parser.add_argument(
+        "--overlap-seconds",
+        type=int,
+        default=DEFAULT_OVERLAP_SECONDS,
+        help="Re-read opportunities modified this long before the last mark",
+    )
+    parser.add_argument("--output", type=Path, help="Write the forecast as CSV here")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("numpy") is None:
+        parser.error("numpy is required for the pipeline forecast (pip install numpy)")
+    for option in ("from_month", "to_month"):
+        value = getattr(args, option)
+        try:
+            if value:
+                datetime.datetime.strptime(value, "%Y-%m")
+        except ValueError:
+            parser.error(f"--{option.replace('_', '-')}: expected YYYY-MM, got {value!r}")
+    try:
+        weights = load_stage_weights(args.stage_weights)
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    return args, weights
+
+
+def main() -> None:
+    args, weights = parse_arguments()
+
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            path = None if args.no_cache else args.cache or default_cache_path()
+            cache = ForecastCache.load(path)
+            refresh = refresh_cache(
+                cache,
+                full=args.full,
+                page_size=args.page_size,
+                overlap_seconds=args.overlap_seconds,
+            )
+            forecast = compute_forecast(
+                cache,
+                weights=weights,
+                companies=args.company,
+                from_month=args.from_month,
+                to_month=args.to_month,
+            )
+            cache.save()
+            print_forecast(forecast, refresh)
+            if args.output:
+                with open(args.output, "w", newline="") as stream:
+                    write_forecast(forecast, stream)
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error computing the pipeline forecast: {err}", file=sys.stderr)
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "pipeline_forecast")
+
+
+if __name__ == "__main__":
+    main()
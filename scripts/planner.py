@@ -0,0 +1,350 @@
+"""Plan-then-apply provisioning: bulk snapshots, in-memory diffs and JSON plans."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bulk_insert import build_doc, write_rows
+from lazy_imports import lazy_import
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    TransactionBatch,
+    chunked,
+    frappe_site_connection,
+    instrumentation,
+    merge_child_rows,
+    report_metrics,
+    rows_match,
+    values_equal,
+)
+
+
+frappe = lazy_import("frappe")
+
+
+PLAN_VERSION = 2
+
+
+@dataclass
+class PlannedChange:
+    """One write the apply phase will perform.
+
+    ``set_global`` changes store ``values["value"]`` under the key ``name``
+    with ``frappe.db.set_global``. ``direct`` changes bypass the document controller: creates become
+    multi-row inserts, updates become ``frappe.db.set_value`` calls and
+    deletes a single ``DELETE ... IN``. ``guard`` filters are only set on
+    creates that depend on another change of the same plan (for example a
+    cost centre ERPNext may create itself when the company is inserted);
+    the apply phase checks those, and only those, before writing.
+    ``child_keys`` names the natural key of every child table an update
+    carries, so the apply phase merges those rows instead of replacing the
+    table.
+    """
+
+    action: str
+    doctype: str
+    section: str
+    name: Optional[str] = None
+    values: Dict[str, Any] = field(default_factory=dict)
+    direct: bool = False
+    guard: Optional[Dict[str, Any]] = None
+    child_keys: Optional[Dict[str, str | Tuple[str, ...]]] = None
+
+    def label(self) -> str:
+        target = self.name or next(iter(self.values.values()), "")
+        return f"{self.action} {self.doctype} {target}".strip()
+
+
+@dataclass
+class ProvisioningPlan:
+    """Ordered list of planned changes for one setup script."""
+
+    script: str
+    site: str
+    changes: List[PlannedChange] = field(default_factory=list)
+
+    def add(self, action: str, doctype: str, section: str, **kwargs: Any) -> None:
+        self.changes.append(PlannedChange(action, doctype, section, **kwargs))
+
+    def counts(self) -> Counter:
+        return Counter((change.section, change.action) for change in self.changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PLAN_VERSION,
+            "script": self.script,
+            "site": self.site,
+            "summary": {
+                f"{section}.{action}": count for (section, action), count in sorted(self.counts().items())
+            },
+            "changes": [asdict(change) for change in self.changes],
+        }
+
+    def write(self, target: str) -> None:
+        payload = json.dumps(self.to_dict(), indent=2, default=str)
+        if target == "-":
+            print(payload)
+        else:
+            Path(target).write_text(payload + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "ProvisioningPlan":
+        data = json.loads(Path(path).read_text())
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version {data.get('version')!r}")
+        return cls(
+            script=data["script"],
+            site=data["site"],
+            changes=[PlannedChange(**change) for change in data["changes"]],
+        )
+
+    def print_summary(self, stream: Any = None) -> None:
+        stream = stream or sys.stdout
+        if not self.changes:
+            print("✅ Nothing to do, the site already matches the configuration", file=stream)
+            return
+
+        print(f"📝 Plan for {self.script} on {self.site}: {len(self.changes)} changes", file=stream)
+        for (section, action), count in sorted(self.counts().items()):
+            print(f"  • {section}: {count} {action}", file=stream)
+
+    def apply(self, batch: TransactionBatch) -> None:
+        """Execute the plan as recorded, without re-checking what exists."""
+
+        direct_creates: Dict[str, List[Any]] = {}
+        deletes: Dict[str, List[str]] = {}
+
+        for change in self.changes:
+            if change.action == "create" and change.direct:
+                direct_creates.setdefault(change.doctype, []).append(build_doc(change.doctype, change.values))
+                continue
+            if change.action == "delete":
+                deletes.setdefault(change.doctype, []).append(change.name)
+                continue
+
+            with batch.record(change.label()):
+                apply_change(change)
+
+        for doctype, docs in direct_creates.items():
+            for chunk in chunked(docs, EXISTS_CHUNK_SIZE):
+                with batch.record(f"inserting {len(chunk)} {doctype} rows"):
+                    write_rows(doctype, chunk)
+
+        for doctype, names in deletes.items():
+            for chunk in chunked(names, EXISTS_CHUNK_SIZE):
+                with batch.record(f"deleting {len(chunk)} {doctype} rows"):
+                    frappe.db.delete(doctype, {"name": ["in", chunk]})
+
+        # direct writes skip the controllers that would normally clear caches
+        if any(change.direct for change in self.changes):
+            frappe.clear_cache()
+
+
+def apply_change(change: PlannedChange) -> None:
+    if change.action == "create":
+        if change.guard and frappe.db.exists(change.doctype, change.guard):
+            return
+        frappe.get_doc({"doctype": change.doctype, **change.values}).insert(ignore_permissions=True)
+    elif change.action == "update" and change.direct:
+        frappe.db.set_value(change.doctype, change.name, change.values)
+    elif change.action == "update":
+        # JSON plans store multi-field keys as lists
+        child_keys = {
+            fieldname: key if isinstance(key, str) else tuple(key)
+            for fieldname, key in (change.child_keys or {}).items()
+        }
+        doc = frappe.get_doc(change.doctype, change.name)
+        doc.update({key: value for key, value in change.values.items() if key not in child_keys})
+        for fieldname, key in child_keys.items():
+            if fieldname in change.values:
+                merge_child_rows(doc, fieldname, change.values[fieldname], key)
+        doc.save(ignore_permissions=True)
+    elif change.action == "set_global":
+        frappe.db.set_global(change.name, change.values["value"])
+    else:
+        raise ValueError(f"Unknown plan action {change.action!r}")
+
+
+class Snapshot:
+    """Rows of one doctype keyed by ``key_field``, read with chunked ``IN`` queries.
+
+    Child tables listed in ``tables`` are attached to each row as lists
+    ordered by ``idx``, using one query per chunk of parents.
+    """
+
+    def __init__(
+        self,
+        doctype: str,
+        key_field: str,
+        keys: Iterable[str],
+        fields: Iterable[str],
+        *,
+        tables: Optional[Dict[str, Iterable[str]]] = None,
+        chunk_size: int = EXISTS_CHUNK_SIZE,
+    ) -> None:
+        self.doctype = doctype
+        self.key_field = key_field
+        self.rows: Dict[str, Dict[str, Any]] = {}
+
+        columns = list(dict.fromkeys(["name", key_field, *fields]))
+        for chunk in chunked(dict.fromkeys(key for key in keys if key), chunk_size):
+            for row in frappe.get_all(
+                doctype,
+                filters={key_field: ["in", chunk]},
+                fields=columns,
+                limit_page_length=0,
+            ):
+                self.rows.setdefault(row[key_field], row)
+
+        for table_field, child_fields in (tables or {}).items():
+            self._load_children(table_field, child_fields, chunk_size)
+
+    def _load_children(self, table_field: str, child_fields: Iterable[str], chunk_size: int) -> None:
+        child_doctype = frappe.get_meta(self.doctype).get_field(table_field).options
+        by_name = {row["name"]: row for row in self.rows.values()}
+        for row in by_name.values():
+            row[table_field] = []
+
+        columns = list(dict.fromkeys(["parent", "idx", *child_fields]))
+        for chunk in chunked(by_name, chunk_size):
+            children = frappe.get_all(
+                child_doctype,
+                filters={"parent": ["in", chunk], "parenttype": self.doctype, "parentfield": table_field},
+                fields=columns,
+                order_by="idx asc",
+                parent_doctype=self.doctype,
+                limit_page_length=0,
+            )
+            for child in children:
+                by_name[child["parent"]][table_field].append(child)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.rows.get(key)
+
+
+def changed_values(row: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the subset of ``values`` that differs from the snapshot ``row``."""
+
+    changed: Dict[str, Any] = {}
+    for key, expected in values.items():
+        current = row.get(key)
+        if isinstance(expected, (list, tuple)):
+            if not rows_match(current, expected):
+                changed[key] = expected
+        elif not values_equal(current, expected):
+            changed[key] = expected
+    return changed
+
+
+def plan_records(
+    plan: ProvisioningPlan,
+    section: str,
+    doctype: str,
+    key_field: str,
+    records: Iterable[Dict[str, Any]],
+    *,
+    create_only: bool = False,
+    child_keys: Optional[Dict[str, str | Tuple[str, ...]]] = None,
+) -> None:
+    """Diff declared ``records`` against one bulk snapshot and add the needed changes.
+
+    Every child table the records declare needs its natural key in
+    ``child_keys`` (as for ``ensure_doc``) unless ``create_only`` is set.
+    """
+
+    records = list(records)
+    scalar_fields: List[str] = []
+    tables: Dict[str, List[str]] = {}
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, (list, tuple)):
+                child_fields = tables.setdefault(key, [])
+                for row in value:
+                    child_fields.extend(column for column in row if column not in child_fields)
+            elif key not in scalar_fields:
+                scalar_fields.append(key)
+
+    child_keys = child_keys or {}
+    missing = sorted(table for table in tables if table not in child_keys)
+    if missing and not create_only:
+        raise ValueError(f"No child key for the {doctype} tables {', '.join(missing)}")
+
+    snapshot = Snapshot(
+        doctype,
+        key_field,
+        (record[key_field] for record in records),
+        scalar_fields,
+        tables=None if create_only else tables,
+    )
+
+    for record in records:
+        row = snapshot.get(record[key_field])
+        if row is None:
+            plan.add("create", doctype, section, values=record)
+        elif not create_only:
+            changed = changed_values(row, record)
+            if changed:
+                keys = {table: key for table, key in child_keys.items() if table in changed}
+                plan.add("update", doctype, section, name=row["name"], values=changed, child_keys=keys or None)
+
+
+def plan_global(plan: ProvisioningPlan, section: str, key: str, value: Any) -> None:
+    """Plan a ``frappe.db.set_global`` of ``key`` unless the site already has a value for it."""
+
+    if not frappe.db.get_global(key):
+        plan.add("set_global", "DefaultValue", section, name=key, values={"value": value})
+
+
+def add_plan_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--plan",
+        nargs="?",
+        const="-",
+        metavar="PATH",
+        help="Write the JSON plan of creates/updates to PATH (or stdout) without changing anything",
+    )
+    group.add_argument("--apply-plan", metavar="PATH", help="Execute a plan written by --plan")
+
+
+def run_plan_mode(
+    args: argparse.Namespace,
+    script: str,
+    build_plan: Callable[[], ProvisioningPlan],
+) -> bool:
+    """Handle ``--plan``/``--apply-plan``; return False when neither was requested."""
+
+    if not (args.plan or args.apply_plan):
+        return False
+
+    if args.apply_plan:
+        plan = ProvisioningPlan.load(args.apply_plan)
+        if plan.script != script:
+            raise SystemExit(f"{args.apply_plan} is a plan for {plan.script}, not {script}")
+        if plan.site != args.site:
+            raise SystemExit(f"{args.apply_plan} is a plan for site {plan.site}, not {args.site}")
+
+    with frappe_site_connection(args.site):
+        if args.plan:
+            with instrumentation.step("build_plan"):
+                plan = build_plan()
+            plan.write(args.plan)
+            stream = sys.stderr if args.plan == "-" else sys.stdout
+            plan.print_summary(stream)
+            report_metrics(args, script, stream)
+            frappe.db.rollback()
+            return True
+
+        plan.print_summary()
+        with instrumentation.step("apply_plan"), TransactionBatch(args.commit_every) as batch:
+            plan.apply(batch)
+        print(f"  ↳ {batch.succeeded} changes applied, {batch.failed} failed")
+        report_metrics(args, script)
+
+    return True
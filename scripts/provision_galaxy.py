@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Provision companies, roles and ERP/CRM data in one process over one site connection.
+
+Running the three setup scripts one after another pays ``frappe.init`` and
+``frappe.connect`` (site config, hooks, DB handshake) three times and loads
+the organisation model twice. This driver opens the site once and runs the
+stages in dependency order against the warm connection, committing after
+each one::
+
+    python3 /scripts/provision_galaxy.py --site galaxy.local --verifactu-api-key <sandbox-key>
+    python3 /scripts/provision_galaxy.py --site galaxy.local --only roles --only erp_crm
+
+The options of the individual scripts are accepted here too. Use each
+script's ``--plan`` to preview its changes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from cli import base_parser, finish_parser, load_configuration, parse_arguments, positive_int, run_provisioning
+from lazy_imports import lazy_import
+from org_structure import OrgStructure, add_org_structure_arguments, load_from_arguments
+from provisioning_state import ProvisioningState
+from setup_companies import setup_galaxy_companies
+from setup_erp_crm import provision_all
+from setup_roles_permissions import ROLE_PERMISSIONS, setup_galaxy_roles
+from utils import instrumentation
+
+
+frappe = lazy_import("frappe")
+
+
+Stage = Callable[[argparse.Namespace, OrgStructure], None]
+
+
+def provision_companies(args: argparse.Namespace, model: OrgStructure) -> None:
+    setup_galaxy_companies(
+        model.companies(),
+        model.future_companies(),
+        include_future=not args.skip_future,
+        commit_every=args.commit_every,
+        site=args.site,
+        workers=args.workers,
+    )
+
+
+def provision_roles(args: argparse.Namespace, model: OrgStructure) -> None:
+    setup_galaxy_roles(
+        model.role_configs(ROLE_PERMISSIONS),
+        commit_every=args.commit_every,
+        prune_permissions=args.prune_permissions,
+        bulk_users=args.bulk_users,
+    )
+
+
+def provision_erp_crm(args: argparse.Namespace, model: OrgStructure) -> None:
+    provision_all(
+        verifactu_api_key=args.verifactu_api_key,
+        bulk=args.bulk,
+        commit_every=args.commit_every,
+        state=ProvisioningState.for_site("setup_erp_crm", path=args.state_file, force=args.force),
+    )
+
+
+# Dependency order: roles reference companies, ERP/CRM records reference both.
+STAGES: Dict[str, Stage] = {
+    "companies": provision_companies,
+    "roles": provision_roles,
+    "erp_crm": provision_erp_crm,
+}
+
+
+def run_stages(args: argparse.Namespace, model: OrgStructure, stages: List[str]) -> Dict[str, float]:
+    """Run the selected stages in order, committing after each; returns seconds per stage."""
+
+    timings: Dict[str, float] = {}
+    for name in STAGES:
+        if name not in stages:
+            continue
+
+        print(f"\n▶️  Stage {name}")
+        started = time.perf_counter()
+        with instrumentation.step(f"stage_{name}"):
+            STAGES[name](args, model)
+        frappe.db.commit()
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def print_timings(timings: Dict[str, float]) -> None:
+    cold_start = instrumentation.steps["site_cold_start"].seconds
+    saved = f" (paid once instead of {len(timings)} times)" if len(timings) > 1 else ""
+    print(f"\n🔌 Site cold start: {cold_start:.2f}s{saved}")
+    for name, seconds in timings.items():
+        print(f"  • {name:<10} {seconds:>8.2f}s")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = base_parser("Provision Galaxy Holding companies, roles and ERP/CRM data")
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=list(STAGES),
+        help="Run only this stage (repeatable; default: all, in dependency order)",
+    )
+
+    companies = parser.add_argument_group("companies")
+    companies.add_argument("--skip-future", action="store_true", help="Do not create placeholder companies")
+    companies.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Worker processes used to provision sibling companies in parallel",
+    )
+
+    roles = parser.add_argument_group("roles")
+    roles.add_argument(
+        "--prune-permissions",
+        action="store_true",
+        help="Delete Custom DocPerm rows of managed roles that the matrix does not list (except roles granted '*')",
+    )
+    roles.add_argument(
+        "--bulk-users",
+        action="store_true",
+        help="Resolve users and role grants with bulk reads and multi-row inserts",
+    )
+
+    erp_crm = parser.add_argument_group("erp_crm")
+    erp_crm.add_argument(
+        "--verifactu-api-key",
+        default=os.environ.get("VERIFACTU_API_KEY"),
+        help="Sandbox API key for Verifactu integration",
+    )
+    erp_crm.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Insert missing customers, suppliers and leads with multi-row inserts",
+    )
+    erp_crm.add_argument(
+        "--force",
+        action="store_true",
+        help="Process every section and record even if its inputs did not change since the last run",
+    )
+    erp_crm.add_argument(
+        "--state-file",
+        type=Path,
+        help="Input hash state file (default: <site>/private/galaxy_provisioning/setup_erp_crm.json)",
+    )
+
+    add_org_structure_arguments(parser)
+    return finish_parser(parser, plan=False)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = build_parser()
+    args = parse_arguments(parser, argv)
+    model = load_configuration(parser, lambda: load_from_arguments(args))
+
+    run_provisioning(
+        args,
+        "provision_galaxy",
+        lambda: print_timings(run_stages(args, model, args.only or list(STAGES))),
+        failure="provisioning Galaxy Holding",
+    )
+
+
+if __name__ == "__main__":
+    main()
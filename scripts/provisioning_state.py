@@ -0,0 +1,84 @@
+"""Content hashes of previously applied inputs, so re-runs only touch what changed."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from lazy_imports import lazy_import
+from utils import write_atomic
+
+
+frappe = lazy_import("frappe")
+
+
+STATE_VERSION = 1
+
+
+def content_hash(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ProvisioningState:
+    """Per-section and per-record input hashes of the last successful run.
+
+    ``changed`` returns the records whose hash differs from the stored one
+    (all of them with ``force`` or when no state file is used). ``accept``
+    stages the new hashes of a section once it completed without failures,
+    and ``save`` persists them after the run's final commit, so a crash or
+    a failed record simply means the next run retries.
+    """
+
+    def __init__(self, path: Optional[Path], script: str, *, force: bool = False) -> None:
+        self.path = path
+        self.script = script
+        self.force = force or path is None
+        self.sections: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+        if path is not None and path.exists():
+            state = json.loads(path.read_text())
+            if state.get("version") == STATE_VERSION and state.get("script") == script:
+                self.sections = state.get("sections", {})
+
+    @classmethod
+    def for_site(cls, script: str, *, path: Optional[Path] = None, force: bool = False) -> "ProvisioningState":
+        """Open the state file kept in the site's private folder (or ``path``)."""
+
+        if path is None:
+            path = Path(frappe.get_site_path("private", "galaxy_provisioning", f"{script}.json"))
+        return cls(path, script, force=force)
+
+    def changed(self, section: str, records: List[Dict[str, Any]], key_field: str) -> List[Dict[str, Any]]:
+        hashes = {str(record[key_field]): content_hash(record) for record in records}
+        section_hash = content_hash(sorted(hashes.items()))
+        self._pending[section] = {"hash": section_hash, "records": hashes}
+
+        if self.force:
+            return list(records)
+
+        stored = self.sections.get(section, {})
+        if stored.get("hash") == section_hash:
+            return []
+
+        stored_records = stored.get("records", {})
+        return [
+            record
+            for record in records
+            if stored_records.get(str(record[key_field])) != hashes[str(record[key_field])]
+        ]
+
+    def accept(self, section: str) -> None:
+        if section in self._pending:
+            self.sections[section] = self._pending.pop(section)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"version": STATE_VERSION, "script": self.script, "sections": self.sections}
+        write_atomic(self.path, json.dumps(state, indent=2, sort_keys=True) + "\n")
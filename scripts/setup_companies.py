@@ -4,213 +4,465 @@
 from __future__ import annotations
 
 import argparse
-from typing import Iterable, List
+import contextlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
-import frappe
-from frappe.utils import nowdate
+from cli import base_parser, finish_parser, load_configuration, parse_arguments, positive_int, run_provisioning
+from lazy_imports import lazy_import
+from org_structure import add_org_structure_arguments, load_from_arguments
+from planner import ProvisioningPlan, Snapshot
+from utils import (
+    DEFAULT_COMMIT_EVERY,
+    EXISTS_CHUNK_SIZE,
+    CompanyConfig,
+    ExistenceIndex,
+    TransactionBatch,
+    chunked,
+    instrumented,
+    site_worker_pool,
+    take_worker_cold_start,
+)
 
-from utils import CompanyConfig, commit_or_rollback, frappe_site_connection
 
+frappe = lazy_import("frappe")
+frappe_utils = lazy_import("frappe.utils")
 
+
+CompanyTask = Tuple[CompanyConfig, bool]
+
+
+@instrumented()
 def setup_galaxy_companies(
     company_configs: Iterable[CompanyConfig],
     future_configs: Iterable[CompanyConfig],
     *,
     include_future: bool = True,
+    commit_every: int = DEFAULT_COMMIT_EVERY,
+    site: str | None = None,
+    workers: int = 1,
 ) -> None:
-    """Create the base holding structure and optional future companies."""
+    """Create the base holding structure and optional future companies.
+
+    Companies are provisioned in dependency waves: a company only starts
+    once its parent exists. With ``workers > 1`` (and a ``site`` to connect
+    to) the siblings of each wave run in a process pool started on the first
+    parallel wave and reused by the later ones; every worker keeps one warm
+    site connection. Companies whose worker failed (concurrent inserts
+    rebuild the shared account and cost centre trees, so lock waits and
+    deadlocks happen) are retried one at a time once the wave is done. The
+    descendants of a company that still failed are skipped, and the run
+    exits non-zero after the defaults of every active company that exists
+    were created in one set-based pass.
+    """
 
     print("🏢 Setting up Galaxy Holding companies...")
 
-    for company_config in company_configs:
-        try:
-            name = frappe.db.exists("Company", company_config.company_name)
-            if name:
-                print(f"• Company {company_config.company_name} already exists, refreshing defaults")
-                setup_company_defaults(company_config.company_name)
+    tasks: List[CompanyTask] = [(config, False) for config in company_configs]
+    if include_future:
+        tasks.extend((config, True) for config in future_configs)
+
+    company_index = ExistenceIndex.for_keys(
+        "Company",
+        "name",
+        [config.company_name for config, _ in tasks],
+    )
+    parallel = workers > 1 and site is not None
+
+    failed: Set[str] = set()
+    pool: ProcessPoolExecutor | None = None
+    with contextlib.ExitStack() as stack, TransactionBatch(commit_every) as batch:
+        for wave in plan_company_waves(tasks):
+            pending = []
+            for config, placeholder in wave:
+                if company_parent(config, placeholder) in failed:
+                    print(f"  ⏭️  Skipping {config.company_name}, its parent {company_parent(config, placeholder)} failed")
+                    failed.add(config.company_name)
+                    batch.failed += 1
+                elif not (placeholder and config.company_name in company_index):
+                    pending.append((config, placeholder))
+            if not pending:
                 continue
 
-            company = frappe.get_doc(
-                {
-                    "doctype": "Company",
-                    "company_name": company_config.company_name,
-                    "abbr": company_config.abbr,
-                    "domain": company_config.domain,
-                    "country": company_config.country,
-                    "default_currency": company_config.default_currency,
-                    "is_group": company_config.is_group,
-                    "parent_company": company_config.parent_company or None,
-                    "date_of_establishment": nowdate(),
-                    "date_of_incorporation": nowdate(),
-                }
-            )
-            company.insert(ignore_permissions=True)
-            setup_company_defaults(company.name)
-            frappe.db.commit()
-            print(f"  ✅ Created company: {company_config.company_name}")
-        except Exception as exc:  # pragma: no cover - frappe specific
-            print(f"  ❌ Error creating company {company_config.company_name}: {exc}")
-            frappe.db.rollback()
+            if parallel and len(pending) > 1:
+                batch.commit()
+                if pool is None:
+                    pool = stack.enter_context(site_worker_pool(site, workers))
+                failed |= provision_wave_in_parallel(pool, pending, company_index, commit_every, workers, batch)
+                # Always end this connection's REPEATABLE READ snapshot, even with nothing pending:
+                # later waves and the defaults pass must see the companies the workers committed.
+                frappe.db.commit()
+                continue
 
-    if not include_future:
-        return
+            for config, placeholder in pending:
+                if not provision_company(
+                    config,
+                    placeholder=placeholder,
+                    exists=config.company_name in company_index,
+                    batch=batch,
+                ):
+                    failed.add(config.company_name)
+
+        setup_company_defaults(
+            (config.company_name for config, placeholder in tasks if not placeholder and config.company_name not in failed),
+            batch,
+        )
+
+    if failed:
+        raise SystemExit(f"❌ {len(failed)} companies could not be provisioned: {', '.join(sorted(failed))}")
+    print("\n🎉 Galaxy Holding company structure setup completed!")
 
-    print("\n🗂️  Creating placeholder companies for future expansion...")
-    for future_config in future_configs:
-        try:
-            if frappe.db.exists("Company", future_config.company_name):
-                continue
 
-            company = frappe.get_doc(
-                {
-                    "doctype": "Company",
-                    "company_name": future_config.company_name,
-                    "abbr": future_config.abbr,
-                    "domain": future_config.domain,
-                    "country": future_config.country,
-                    "default_currency": future_config.default_currency,
-                    "is_group": future_config.is_group,
-                    "parent_company": future_config.parent_company or "Galaxy Holding",
-                    "date_of_establishment": nowdate(),
-                    "date_of_incorporation": nowdate(),
-                    "is_active": 0,
-                }
-            )
+def company_parent(config: CompanyConfig, placeholder: bool) -> str:
+    return config.parent_company or ("Galaxy Holding" if placeholder else "")
+
+
+def company_values(config: CompanyConfig, placeholder: bool) -> Dict[str, Any]:
+    values: Dict[str, Any] = {
+        "company_name": config.company_name,
+        "abbr": config.abbr,
+        "domain": config.domain,
+        "country": config.country,
+        "default_currency": config.default_currency,
+        "is_group": config.is_group,
+        "parent_company": company_parent(config, placeholder) if placeholder else config.parent_company or None,
+        "date_of_establishment": frappe_utils.nowdate(),
+        "date_of_incorporation": frappe_utils.nowdate(),
+    }
+    if placeholder:
+        values["is_active"] = 0
+    return values
+
+
+def plan_company_waves(tasks: Iterable[CompanyTask]) -> List[List[CompanyTask]]:
+    """Group companies into waves where every parent sits in an earlier wave."""
+
+    remaining = list(tasks)
+    managed = {config.company_name for config, _ in remaining}
+    placed: Set[str] = set()
+    waves: List[List[CompanyTask]] = []
+
+    while remaining:
+        wave = [
+            task
+            for task in remaining
+            if company_parent(*task) not in managed or company_parent(*task) in placed
+        ]
+        if not wave:
+            names = ", ".join(config.company_name for config, _ in remaining)
+            raise ValueError(f"Circular parent_company chain between: {names}")
+
+        waves.append(wave)
+        placed.update(config.company_name for config, _ in wave)
+        scheduled = set(wave)
+        remaining = [task for task in remaining if task not in scheduled]
+
+    return waves
+
+
+@instrumented()
+def provision_company(
+    config: CompanyConfig,
+    *,
+    placeholder: bool,
+    exists: bool,
+    batch: TransactionBatch,
+) -> bool:
+    """Create one company or placeholder; defaults are handled by ``setup_company_defaults``.
+
+    Returns False when the insert failed (and was rolled back).
+    """
+
+    failed = batch.failed
+    if placeholder:
+        with batch.record(f"creating placeholder {config.company_name}"):
+            company = frappe.get_doc({"doctype": "Company", **company_values(config, placeholder)})
             company.insert(ignore_permissions=True)
-            print(f"  📋 Created placeholder: {future_config.company_name}")
+            print(f"  📋 Created placeholder: {config.company_name}")
+        return batch.failed == failed
+
+    if exists:
+        print(f"• Company {config.company_name} already exists, refreshing defaults")
+        return True
+
+    with batch.record(f"creating company {config.company_name}"):
+        company = frappe.get_doc({"doctype": "Company", **company_values(config, placeholder)})
+        company.insert(ignore_permissions=True)
+        print(f"  ✅ Created company: {config.company_name}")
+    return batch.failed == failed
+
+
+def provision_company_worker(
+    config: CompanyConfig,
+    placeholder: bool,
+    exists: bool,
+    commit_every: int,
+) -> Tuple[str, float, int, float]:
+    """Process-pool entry point: provision one company over the worker's warm connection."""
+
+    started = time.perf_counter()
+    with TransactionBatch(commit_every) as batch:
+        provision_company(config, placeholder=placeholder, exists=exists, batch=batch)
+
+    return config.company_name, time.perf_counter() - started, batch.failed, take_worker_cold_start()
+
+
+@instrumented()
+def provision_wave_in_parallel(
+    pool: ProcessPoolExecutor,
+    tasks: List[CompanyTask],
+    company_index: ExistenceIndex,
+    commit_every: int,
+    workers: int,
+    batch: TransactionBatch,
+) -> Set[str]:
+    """Provision ``tasks`` across the pool, then retry the failed ones in this process; returns what still failed."""
+
+    started = time.perf_counter()
+    print(f"\n⚡ Provisioning {len(tasks)} sibling companies with {min(workers, len(tasks))} workers...")
+
+    cold_starts: List[float] = []
+    retry: List[CompanyTask] = []
+    futures = {
+        pool.submit(
+            provision_company_worker,
+            config,
+            placeholder,
+            config.company_name in company_index,
+            commit_every,
+        ): (config, placeholder)
+        for config, placeholder in tasks
+    }
+    for future in as_completed(futures):
+        config, placeholder = futures[future]
+        try:
+            company_name, elapsed, failed, cold_start = future.result()
         except Exception as exc:  # pragma: no cover - frappe specific
-            print(f"  ❌ Error creating placeholder {future_config.company_name}: {exc}")
-            frappe.db.rollback()
+            print(f"  ❌ Worker for {config.company_name} crashed: {exc}")
+            retry.append((config, placeholder))
+            continue
+
+        if cold_start:
+            cold_starts.append(cold_start)
+        status = f"{failed} failed records" if failed else "ok"
+        print(f"    ↳ {company_name} finished in {elapsed:.1f}s ({status})")
+        if failed:
+            retry.append((config, placeholder))
+
+    if cold_starts:
+        print(
+            f"  🔌 {len(cold_starts)} worker connections opened "
+            f"(cold start {sum(cold_starts) / len(cold_starts):.2f}s avg, {max(cold_starts):.2f}s max)"
+        )
 
-    frappe.db.commit()
-    print("\n🎉 Galaxy Holding company structure setup completed!")
+    still_failed: Set[str] = set()
+    if retry:
+        # see what the workers committed, then retry without siblings competing for the same tree locks
+        frappe.db.commit()
+        print(f"  🔁 Retrying {len(retry)} companies one at a time...")
+    for config, placeholder in retry:
+        exists = bool(frappe.db.exists("Company", config.company_name))
+        if not (placeholder and exists):
+            if not provision_company(config, placeholder=placeholder, exists=exists, batch=batch):
+                still_failed.add(config.company_name)
+    batch.commit()
 
+    print(f"  ⏱️  Wave completed in {time.perf_counter() - started:.1f}s")
+    return still_failed
 
-def setup_company_defaults(company_name: str) -> None:
-    """Create cost centres, warehouses and intercompany accounts."""
 
-    try:
-        abbr = frappe.get_value("Company", company_name, "abbr")
+INTERCOMPANY_ACCOUNTS = ("Intercompany Receivable", "Intercompany Payable")
 
-        ensure_cost_center(company_name, abbr)
-        ensure_warehouse(company_name, abbr)
+# (doctype, values, identifying filters) of a default record to create
+DefaultRow = Tuple[str, Dict[str, Any], Dict[str, Any]]
 
-        if company_name != "Galaxy Holding":
-            setup_intercompany_accounts(company_name, abbr)
 
-        print(f"    ↳ Defaults ready for {company_name}")
-    except Exception as exc:  # pragma: no cover - frappe specific
-        print(f"    ❌ Error setting up defaults for {company_name}: {exc}")
-        frappe.db.rollback()
+@instrumented()
+def setup_company_defaults(company_names: Iterable[str], batch: TransactionBatch) -> None:
+    """Create the missing cost centres, warehouses and intercompany accounts of all companies.
 
+    Abbreviations and existing rows are read with one query per doctype and
+    chunk of companies, so the lookups do not grow with each subsidiary.
+    The rows themselves still go through ``insert()`` because the tree
+    doctypes maintain their nested-set columns in the controller.
+    """
 
-def ensure_cost_center(company_name: str, abbr: str) -> None:
-    name = f"Main - {abbr}"
-    if frappe.db.exists("Cost Center", name):
-        return
+    names = list(dict.fromkeys(company_names))
+    missing = missing_company_defaults(company_abbreviations(names))
 
-    cost_center = frappe.get_doc(
-        {
-            "doctype": "Cost Center",
-            "cost_center_name": "Main",
-            "company": company_name,
-            "is_group": 0,
-        }
+    for company_name in names:
+        rows = missing.get(company_name)
+        if not rows:
+            continue
+
+        with batch.record(f"setting up defaults for {company_name}"):
+            for doctype, values, _ in rows:
+                frappe.get_doc({"doctype": doctype, **values}).insert(ignore_permissions=True)
+            print(f"    ↳ Defaults ready for {company_name}")
+
+
+def company_abbreviations(company_names: Iterable[str]) -> Dict[str, str]:
+    abbrs: Dict[str, str] = {}
+    for chunk in chunked(company_names, EXISTS_CHUNK_SIZE):
+        for row in frappe.get_all(
+            "Company",
+            filters={"name": ["in", chunk]},
+            fields=["name", "abbr"],
+            limit_page_length=0,
+        ):
+            abbrs[row["name"]] = row["abbr"]
+    return abbrs
+
+
+def missing_company_defaults(abbrs: Dict[str, str]) -> Dict[str, List[DefaultRow]]:
+    """Return, per company, the default rows that do not exist yet."""
+
+    cost_centers = ExistenceIndex.for_keys("Cost Center", "name", (f"Main - {abbr}" for abbr in abbrs.values()))
+    warehouses = ExistenceIndex.for_keys(
+        "Warehouse", "name", (f"Main Warehouse - {abbr}" for abbr in abbrs.values())
     )
-    cost_center.insert(ignore_permissions=True)
+    accounts: Set[Tuple[str, str]] = set()
+    for chunk in chunked(abbrs, EXISTS_CHUNK_SIZE):
+        for row in frappe.get_all(
+            "Account",
+            filters={"company": ["in", chunk], "account_name": ["in", list(INTERCOMPANY_ACCOUNTS)]},
+            fields=["company", "account_name"],
+            limit_page_length=0,
+        ):
+            accounts.add((row["company"], row["account_name"]))
+
+    missing: Dict[str, List[DefaultRow]] = {}
+    for company_name, abbr in abbrs.items():
+        rows: List[DefaultRow] = []
+        if f"Main - {abbr}" not in cost_centers:
+            rows.append(("Cost Center", cost_center_values(company_name), {"name": f"Main - {abbr}"}))
+        if f"Main Warehouse - {abbr}" not in warehouses:
+            rows.append(("Warehouse", warehouse_values(company_name), {"name": f"Main Warehouse - {abbr}"}))
+        if company_name != "Galaxy Holding":
+            for values in intercompany_account_values(company_name, abbr):
+                if (company_name, values["account_name"]) not in accounts:
+                    filters = {"company": company_name, "account_name": values["account_name"]}
+                    rows.append(("Account", values, filters))
+        if rows:
+            missing[company_name] = rows
+    return missing
+
 
+def cost_center_values(company_name: str) -> Dict[str, Any]:
+    return {"cost_center_name": "Main", "company": company_name, "is_group": 0}
 
-def ensure_warehouse(company_name: str, abbr: str) -> None:
-    name = f"Main Warehouse - {abbr}"
-    if frappe.db.exists("Warehouse", name):
-        return
 
-    warehouse = frappe.get_doc(
+def warehouse_values(company_name: str) -> Dict[str, Any]:
+    return {"warehouse_name": "Main Warehouse", "company": company_name, "is_group": 0}
+
+
+def intercompany_account_values(company_name: str, abbr: str) -> List[Dict[str, Any]]:
+    return [
         {
-            "doctype": "Warehouse",
-            "warehouse_name": "Main Warehouse",
+            "account_name": "Intercompany Receivable",
+            "parent_account": f"Accounts Receivable - {abbr}",
             "company": company_name,
-            "is_group": 0,
-        }
-    )
-    warehouse.insert(ignore_permissions=True)
-
-
-def setup_intercompany_accounts(company_name: str, abbr: str) -> None:
-    receivable_parent = f"Accounts Receivable - {abbr}"
-    payable_parent = f"Accounts Payable - {abbr}"
-
-    if not frappe.db.exists("Account", {"company": company_name, "account_name": "Intercompany Receivable"}):
-        intercompany_receivable = frappe.get_doc(
-            {
-                "doctype": "Account",
-                "account_name": "Intercompany Receivable",
-                "parent_account": receivable_parent,
-                "company": company_name,
-                "account_type": "Receivable",
-                "account_currency": "EUR",
-            }
-        )
-        intercompany_receivable.insert(ignore_permissions=True)
-
-    if not frappe.db.exists("Account", {"company": company_name, "account_name": "Intercompany Payable"}):
-        intercompany_payable = frappe.get_doc(
-            {
-                "doctype": "Account",
-                "account_name": "Intercompany Payable",
-                "parent_account": payable_parent,
-                "company": company_name,
-                "account_type": "Payable",
-                "account_currency": "EUR",
-            }
-        )
-        intercompany_payable.insert(ignore_permissions=True)
+            "account_type": "Receivable",
+            "account_currency": "EUR",
+        },
+        {
+            "account_name": "Intercompany Payable",
+            "parent_account": f"Accounts Payable - {abbr}",
+            "company": company_name,
+            "account_type": "Payable",
+            "account_currency": "EUR",
+        },
+    ]
+
+
+def build_plan(
+    site: str,
+    company_configs: Iterable[CompanyConfig],
+    future_configs: Iterable[CompanyConfig],
+    *,
+    include_future: bool = True,
+) -> ProvisioningPlan:
+    """Diff companies and their defaults against bulk snapshots, parents first.
+
+    Cost centres, warehouses and accounts of a company that the plan itself
+    creates cannot be snapshotted yet (ERPNext may create some of them on
+    insert), so those creates carry a guard that is checked at apply time.
+    """
+
+    plan = ProvisioningPlan("setup_companies", site)
+    tasks: List[CompanyTask] = [(config, False) for config in company_configs]
+    if include_future:
+        tasks.extend((config, True) for config in future_configs)
+
+    companies = Snapshot("Company", "name", (config.company_name for config, _ in tasks), ["abbr"])
+    active = [config for config, placeholder in tasks if not placeholder]
+    abbrs = {
+        config.company_name: (companies.get(config.company_name) or {}).get("abbr") or config.abbr
+        for config in active
+    }
+    missing = missing_company_defaults(abbrs)
+
+    for wave in plan_company_waves(tasks):
+        for config, placeholder in wave:
+            exists = companies.get(config.company_name) is not None
+            if not exists:
+                plan.add("create", "Company", "companies", values=company_values(config, placeholder))
+            if placeholder:
+                continue
 
+            for doctype, values, filters in missing.get(config.company_name, []):
+                plan.add(
+                    "create",
+                    doctype,
+                    "intercompany" if doctype == "Account" else "defaults",
+                    values=values,
+                    guard=None if exists else filters,
+                )
 
-def parse_arguments() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Provision Galaxy Holding companies")
-    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    return plan
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = base_parser(
+        "Provision Galaxy Holding companies",
+        commit_help="Number of companies written per transaction",
+    )
     parser.add_argument(
         "--skip-future",
         action="store_true",
         help="Do not create placeholder companies",
     )
-    return parser.parse_args()
-
-
-def main() -> None:
-    args = parse_arguments()
-
-    companies: List[CompanyConfig] = [
-        CompanyConfig("Galaxy Holding", "GH", "Services", is_group=1),
-        CompanyConfig("Galaxy Bio", "GB", "Manufacturing", parent_company="Galaxy Holding"),
-        CompanyConfig("Galaxy Software", "GS", "Services", parent_company="Galaxy Holding"),
-    ]
-
-    future_companies: List[CompanyConfig] = [
-        CompanyConfig("Galaxy Pay", "GP", "Services", parent_company="Galaxy Holding"),
-        CompanyConfig("Galaxy Financial", "GF", "Services", parent_company="Galaxy Holding"),
-        CompanyConfig("Asterion Capital", "AC", "Services", parent_company="Galaxy Holding"),
-        CompanyConfig("Sygma Insurance", "SI", "Services", parent_company="Galaxy Holding"),
-        CompanyConfig("Galaxy Tower", "GT", "Services", parent_company="Galaxy Holding"),
-        CompanyConfig("Galaxy Engineering", "GE", "Manufacturing", parent_company="Galaxy Holding"),
-        CompanyConfig("Galaxy Flash", "GFL", "Services", parent_company="Galaxy Holding"),
-    ]
-
-    with frappe_site_connection(args.site):
-        exc: Exception | None = None
-        try:
-            setup_galaxy_companies(
-                companies,
-                future_companies,
-                include_future=not args.skip_future,
-            )
-        except Exception as err:  # pragma: no cover - frappe specific
-            exc = err
-            print(f"❌ Fatal error provisioning companies: {err}")
-            raise
-        finally:
-            commit_or_rollback(exc)
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Worker processes used to provision sibling companies in parallel",
+    )
+    add_org_structure_arguments(parser)
+    return finish_parser(parser)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = build_parser()
+    args = parse_arguments(parser, argv)
+    model = load_configuration(parser, lambda: load_from_arguments(args))
+    companies, future_companies = model.companies(), model.future_companies()
+
+    run_provisioning(
+        args,
+        "setup_companies",
+        lambda: setup_galaxy_companies(
+            companies,
+            future_companies,
+            include_future=not args.skip_future,
+            commit_every=args.commit_every,
+            site=args.site,
+            workers=args.workers,
+        ),
+        build_plan=lambda: build_plan(args.site, companies, future_companies, include_future=not args.skip_future),
+        failure="provisioning companies",
+    )
 
 
 if __name__ == "__main__":
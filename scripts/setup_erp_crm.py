@@ -6,376 +6,561 @@ from __future__ import annotations
 import argparse
 import json
 import os
-from textwrap import dedent
-from typing import Dict, List
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from bom_graph import Bom, BomGraph, load_boms
+from bulk_insert import bulk_ensure_docs, print_bulk_result
+from cli import base_parser, finish_parser, parse_arguments, run_provisioning
+from lazy_imports import lazy_import
+from party_upsert import CONTACT_TABLE_KEYS, Party, print_party_result, upsert_parties
+from planner import ProvisioningPlan, plan_global, plan_records
+from provisioning_state import ProvisioningState
+from utils import (
+    ExistenceIndex,
+    DEFAULT_COMMIT_EVERY,
+    TransactionBatch,
+    ensure_doc,
+    instrumented,
+    provisioning_stats,
+)
+from verifactu_payloads import VERIFACTU_PAYLOAD_TEMPLATE
+from verifactu_submitter import QUEUE_SINCE_KEY, VERIFACTU_FIELDS, verifactu_field_values
+
+
+frappe = lazy_import("frappe")
+frappe_utils = lazy_import("frappe.utils")
+
+
+@instrumented()
+def provision_all(
+    *,
+    verifactu_api_key: str | None,
+    bulk: bool = False,
+    commit_every: int = DEFAULT_COMMIT_EVERY,
+    state: ProvisioningState | None = None,
+) -> None:
+    """Provision every dataset, skipping sections and records ``state`` already applied."""
 
-import frappe
-
-from utils import commit_or_rollback, ensure_doc, frappe_site_connection
-
-
-def provision_all(*, verifactu_api_key: str | None) -> None:
     print("🚀 Bootstrapping ERPNext & CRM records...")
-    setup_customers()
-    setup_suppliers()
-    setup_items()
-    setup_projects()
-    setup_crm_pipeline()
-    setup_manufacturing_templates()
-    configure_verifactu_integration(verifactu_api_key)
+    provisioning_stats.reset()
+    state = state or ProvisioningState(None, "setup_erp_crm")
+    with TransactionBatch(commit_every) as batch:
+        for section, records, key_field, step in (
+            ("customers", CUSTOMERS, "customer_name", lambda rows: setup_customers(batch, rows, bulk=bulk)),
+            ("suppliers", SUPPLIERS, "supplier_name", lambda rows: setup_suppliers(batch, rows, bulk=bulk)),
+            ("items", ITEMS, "item_code", lambda rows: setup_items(batch, rows, bulk=bulk)),
+            ("projects", PROJECTS, "project_name", lambda rows: setup_projects(batch, rows)),
+            ("leads", LEADS, "company_name", lambda rows: setup_leads(batch, rows, bulk=bulk)),
+            ("opportunities", OPPORTUNITIES, "opportunity_name", lambda rows: setup_opportunities(batch, rows)),
+            ("manufacturing", BOM_TEMPLATES, "item", lambda rows: setup_manufacturing_templates(batch, rows)),
+            (
+                "verifactu_fields",
+                verifactu_fields(),
+                "fieldname",
+                lambda rows: setup_verifactu_fields(batch, rows),
+            ),
+            (
+                "verifactu",
+                [verifactu_webhook_values(verifactu_api_key)],
+                "webhook_name",
+                lambda rows: configure_verifactu_integration(batch, verifactu_api_key),
+            ),
+        ):
+            run_section(batch, state, section, records, key_field, step)
+    state.save()
+    provisioning_stats.print_summary()
+    print(f"  ↳ {batch.succeeded} records committed in {batch.commits} transactions, {batch.failed} failed")
     print("\n✅ ERPNext and CRM data provisioning complete!")
 
 
-def setup_customers() -> None:
-    print("\n👔 Creating customers and contacts...")
-    customers: List[Dict[str, object]] = [
-        {
-            "customer_name": "BioPharma Iberia",
-            "customer_group": "Commercial",
-            "territory": "Spain",
-            "customer_type": "Company",
-            "primary_contact": {
-                "first_name": "Laura",
-                "last_name": "Gomez",
-                "email_id": "laura.gomez@biopharmaiberia.com",
-                "phone": "+34 600 111 222",
-            },
-        },
-        {
-            "customer_name": "Asterion Renewable",
-            "customer_group": "Commercial",
-            "territory": "Portugal",
-            "customer_type": "Company",
-            "primary_contact": {
-                "first_name": "Miguel",
-                "last_name": "Ferreira",
-                "email_id": "miguel.ferreira@asterionrenew.com",
-                "phone": "+351 910 222 333",
-            },
-        },
-    ]
-
-    for customer in customers:
-        ensure_doc(
-            "Customer",
-            {"customer_name": customer["customer_name"]},
-            {
-                "customer_name": customer["customer_name"],
-                "customer_group": customer["customer_group"],
-                "territory": customer["territory"],
-                "customer_type": customer["customer_type"],
-            },
-        )
-
-        contact_filters = {"email_id": customer["primary_contact"]["email_id"]}
-        contact = ensure_doc(
-            "Contact",
-            contact_filters,
-            {
-                "first_name": customer["primary_contact"]["first_name"],
-                "last_name": customer["primary_contact"]["last_name"],
-                "email_id": customer["primary_contact"]["email_id"],
-                "phone": customer["primary_contact"]["phone"],
-            },
-        )
-        contact.links = []
-        contact.append(
-            "links",
-            {"link_doctype": "Customer", "link_name": customer["customer_name"]},
-        )
-        contact.save(ignore_permissions=True)
-
-    frappe.db.commit()
-
-
-def setup_suppliers() -> None:
-    print("\n🏭 Creating suppliers...")
-    suppliers = [
-        {
-            "supplier_name": "Sygma Raw Materials",
-            "supplier_group": "Local",
-            "supplier_type": "Company",
-            "country": "Spain",
-        },
-        {
-            "supplier_name": "Helios Packaging",
-            "supplier_group": "International",
-            "supplier_type": "Company",
-            "country": "Germany",
-        },
-    ]
-
-    for supplier in suppliers:
-        ensure_doc("Supplier", {"supplier_name": supplier["supplier_name"]}, supplier)
+def run_section(
+    batch: TransactionBatch,
+    state: ProvisioningState,
+    section: str,
+    records: List[Dict[str, Any]],
+    key_field: str,
+    step: Callable[[List[Dict[str, Any]]], None],
+) -> None:
+    pending = state.changed(section, records, key_field)
+    if not pending:
+        print(f"\n⏭️  {section}: inputs unchanged since the last run, skipping")
+        return
 
-    frappe.db.commit()
+    failed = batch.failed
+    step(pending)
+    if batch.failed == failed:
+        state.accept(section)
 
 
-def setup_items() -> None:
-    print("\n📦 Seeding inventory items...")
-    items = [
-        {
-            "item_code": "BIO-INS-001",
-            "item_name": "Bio Insulin Lot",
-            "description": "Pharmaceutical-grade insulin batch",
-            "item_group": "Products",
-            "stock_uom": "Nos",
-            "is_stock_item": 1,
-            "company": "Galaxy Bio",
-        },
+def customer_records(customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
         {
-            "item_code": "SOFT-DEV-001",
-            "item_name": "Custom Software Sprint",
-            "description": "Four-week agile delivery sprint",
-            "item_group": "Services",
-            "stock_uom": "Hour",
-            "is_stock_item": 0,
-            "company": "Galaxy Software",
-        },
+            "customer_name": customer["customer_name"],
+            "customer_group": customer["customer_group"],
+            "territory": customer["territory"],
+            "customer_type": customer["customer_type"],
+        }
+        for customer in customers
     ]
 
-    for item in items:
-        ensure_doc("Item", {"item_code": item["item_code"]}, item)
 
-    frappe.db.commit()
+def contact_values(customer: Dict[str, Any]) -> Dict[str, Any]:
+    contact = customer["primary_contact"]
+    # Contact.validate derives email_id and phone from these tables and blanks them when empty
+    return {
+        "first_name": contact["first_name"],
+        "last_name": contact["last_name"],
+        "email_id": contact["email_id"],
+        "phone": contact["phone"],
+        "email_ids": [{"email_id": contact["email_id"], "is_primary": 1}],
+        "phone_nos": [{"phone": contact["phone"], "is_primary_phone": 1}],
+    }
 
 
-def setup_projects() -> None:
-    print("\n📁 Creating flagship projects...")
-    projects = [
-        {
-            "project_name": "Galaxy Bio GMP Upgrade",
-            "company": "Galaxy Bio",
-            "is_active": 1,
-            "expected_start_date": "2024-01-01",
-            "expected_end_date": "2024-12-31",
-            "tasks": [
-                {
-                    "subject": "Facility Assessment",
-                    "start_date": "2024-01-05",
-                    "end_date": "2024-02-15",
-                },
-                {
-                    "subject": "Validation Protocols",
-                    "start_date": "2024-02-16",
-                    "end_date": "2024-05-30",
-                },
-            ],
-        },
-        {
-            "project_name": "Galaxy Software ERP Rollout",
-            "company": "Galaxy Software",
-            "is_active": 1,
-            "expected_start_date": "2024-03-01",
-            "expected_end_date": "2024-09-30",
-            "tasks": [
-                {
-                    "subject": "Requirement Workshops",
-                    "start_date": "2024-03-05",
-                    "end_date": "2024-04-15",
-                },
-                {
-                    "subject": "MVP Delivery",
-                    "start_date": "2024-04-16",
-                    "end_date": "2024-07-31",
-                },
-            ],
-        },
+def customer_parties(customers: List[Dict[str, Any]]) -> List[Party]:
+    return [
+        Party(record, contact_values(customer)) for record, customer in zip(customer_records(customers), customers)
     ]
 
-    for project in projects:
-        doc = ensure_doc(
-            "Project",
-            {"project_name": project["project_name"]},
-            {
-                "project_name": project["project_name"],
-                "company": project["company"],
-                "is_active": project["is_active"],
-                "expected_start_date": project["expected_start_date"],
-                "expected_end_date": project["expected_end_date"],
-            },
-        )
 
-        doc.tasks = []
-        for task in project["tasks"]:
-            doc.append(
-                "tasks",
-                {
-                    "subject": task["subject"],
-                    "start_date": task["start_date"],
-                    "end_date": task["end_date"],
-                },
-            )
-        doc.save(ignore_permissions=True)
+def contact_links(customer: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"link_doctype": "Customer", "link_name": customer["customer_name"]}]
 
-    frappe.db.commit()
 
+def project_values(project: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "project_name": project["project_name"],
+        "company": project["company"],
+        "is_active": project["is_active"],
+        "expected_start_date": project["expected_start_date"],
+        "expected_end_date": project["expected_end_date"],
+    }
 
-def setup_crm_pipeline() -> None:
-    print("\n🧲 Building CRM pipeline...")
-    leads = [
-        {
-            "company_name": "Solaria Health",
-            "lead_name": "Solaria Health",
-            "lead_owner": "natalia.rodriguez@galaxyholding.com",
-            "status": "Interested",
-            "email_id": "contact@solariahealth.eu",
-            "phone": "+34 655 444 555",
-            "source": "Website",
-            "company": "Galaxy Holding",
-        },
-        {
-            "company_name": "Andes Pharma",
-            "lead_name": "Andes Pharma",
-            "lead_owner": "manuel.martinez@galaxyholding.com",
-            "status": "Open",
-            "email_id": "info@andespharma.co",
-            "phone": "+57 310 789 0000",
-            "source": "Referral",
-            "company": "Galaxy Holding",
-        },
-    ]
 
-    opportunities = [
-        {
-            "opportunity_name": "Solaria MES Deployment",
-            "party_type": "Customer",
-            "company": "Galaxy Software",
-            "with_items": 1,
-            "opportunity_from": "Lead",
-            "lead": "Solaria Health",
-            "expected_closing": "2024-06-30",
-            "items": [
-                {"item_code": "SOFT-DEV-001", "qty": 1, "rate": 65000},
-            ],
-        },
+def project_tasks(project: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
         {
-            "opportunity_name": "Andes Pharma Manufacturing",
-            "party_type": "Customer",
-            "company": "Galaxy Bio",
-            "with_items": 1,
-            "opportunity_from": "Lead",
-            "lead": "Andes Pharma",
-            "expected_closing": "2024-08-15",
-            "items": [
-                {"item_code": "BIO-INS-001", "qty": 5, "rate": 18000},
-            ],
-        },
+            "subject": task["subject"],
+            "start_date": task["start_date"],
+            "end_date": task["end_date"],
+        }
+        for task in project["tasks"]
     ]
 
-    for lead in leads:
-        ensure_doc("Lead", {"company_name": lead["company_name"]}, lead)
 
-    for opportunity in opportunities:
-        doc = ensure_doc(
-            "Opportunity",
-            {"opportunity_name": opportunity["opportunity_name"]},
-            {key: value for key, value in opportunity.items() if key != "items"},
-        )
-        doc.items = []
-        for item in opportunity["items"]:
-            doc.append("items", item)
-        doc.save(ignore_permissions=True)
+def verifactu_fields() -> List[Dict[str, Any]]:
+    return [verifactu_field_values(field_config) for field_config in VERIFACTU_FIELDS]
+
+
+def verifactu_webhook_values(api_key: str | None) -> Dict[str, Any]:
+    # Kept as a disabled fallback: verifactu_submitter.py drains the invoice
+    # queue with pooled connections, retries and stored acknowledgements.
+    return {
+        "webhook_name": "Verifactu Sandbox",
+        "webhook_docevent": "on_submit",
+        "webhook_doctype": "Sales Invoice",
+        "request_method": "POST",
+        "request_url": "https://api.verifactu.sandbox/v1/invoices",
+        "headers": json.dumps(
+            [
+                {"key": "Content-Type", "value": "application/json"},
+                {"key": "X-API-KEY", "value": api_key or "REPLACE_ME"},
+            ]
+        ),
+        "data": VERIFACTU_PAYLOAD_TEMPLATE,
+        "enabled": 0,
+    }
+
+
+@instrumented()
+def setup_customers(batch: TransactionBatch, customers: List[Dict[str, Any]], *, bulk: bool = False) -> None:
+    print("\n👔 Creating customers and contacts...")
+    print_party_result(upsert_parties(batch, "Customer", "customer_name", customer_parties(customers), bulk=bulk))
 
-    frappe.db.commit()
 
+@instrumented()
+def setup_suppliers(batch: TransactionBatch, suppliers: List[Dict[str, Any]], *, bulk: bool = False) -> None:
+    print("\n🏭 Creating suppliers...")
+    if bulk:
+        with batch.record("bulk inserting suppliers"):
+            print_bulk_result(bulk_ensure_docs("Supplier", "supplier_name", suppliers))
+    else:
+        supplier_index = ExistenceIndex.for_keys(
+            "Supplier", "supplier_name", (supplier["supplier_name"] for supplier in suppliers)
+        )
+        for supplier in suppliers:
+            with batch.record(f"creating supplier {supplier['supplier_name']}"):
+                ensure_doc(
+                    "Supplier",
+                    {"supplier_name": supplier["supplier_name"]},
+                    supplier,
+                    index=supplier_index,
+                )
+
+
+@instrumented()
+def setup_items(batch: TransactionBatch, items: List[Dict[str, Any]], *, bulk: bool = False) -> None:
+    print("\n📦 Seeding inventory items...")
+    if bulk:
+        with batch.record("bulk inserting items"):
+            print_bulk_result(bulk_ensure_docs("Item", "item_code", items))
+    else:
+        item_index = ExistenceIndex.for_keys("Item", "item_code", (item["item_code"] for item in items))
+        for item in items:
+            with batch.record(f"creating item {item['item_code']}"):
+                ensure_doc("Item", {"item_code": item["item_code"]}, item, index=item_index)
+
+
+@instrumented()
+def setup_projects(batch: TransactionBatch, projects: List[Dict[str, Any]]) -> None:
+    print("\n📁 Creating flagship projects...")
+    project_index = ExistenceIndex.for_keys(
+        "Project", "project_name", (project["project_name"] for project in projects)
+    )
+    for project in projects:
+        with batch.record(f"creating project {project['project_name']}"):
+            ensure_doc(
+                "Project",
+                {"project_name": project["project_name"]},
+                {**project_values(project), "tasks": project_tasks(project)},
+                index=project_index,
+                child_keys={"tasks": "subject"},
+            )
 
-def setup_manufacturing_templates() -> None:
-    print("\n⚙️  Creating BOM & routing templates...")
-    if frappe.db.exists("BOM", {"item": "BIO-INS-001"}):
-        return
 
-    bom = frappe.get_doc(
-        {
-            "doctype": "BOM",
-            "item": "BIO-INS-001",
-            "company": "Galaxy Bio",
-            "quantity": 1,
-            "is_active": 1,
-            "is_default": 1,
-            "items": [
-                {"item_code": "BIO-INS-001", "qty": 1, "rate": 0},
-            ],
-        }
+@instrumented()
+def setup_leads(batch: TransactionBatch, leads: List[Dict[str, Any]], *, bulk: bool = False) -> None:
+    print("\n🧲 Building CRM pipeline leads...")
+    if bulk:
+        with batch.record("bulk inserting leads"):
+            print_bulk_result(bulk_ensure_docs("Lead", "company_name", leads))
+    else:
+        lead_index = ExistenceIndex.for_keys("Lead", "company_name", (lead["company_name"] for lead in leads))
+        for lead in leads:
+            with batch.record(f"creating lead {lead['company_name']}"):
+                ensure_doc("Lead", {"company_name": lead["company_name"]}, lead, index=lead_index)
+
+
+@instrumented()
+def setup_opportunities(batch: TransactionBatch, opportunities: List[Dict[str, Any]]) -> None:
+    print("\n🧲 Building CRM pipeline opportunities...")
+    opportunity_index = ExistenceIndex.for_keys(
+        "Opportunity",
+        "opportunity_name",
+        (opportunity["opportunity_name"] for opportunity in opportunities),
     )
-    bom.insert(ignore_permissions=True)
-    frappe.db.commit()
+    for opportunity in opportunities:
+        with batch.record(f"creating opportunity {opportunity['opportunity_name']}"):
+            ensure_doc(
+                "Opportunity",
+                {"opportunity_name": opportunity["opportunity_name"]},
+                opportunity,
+                index=opportunity_index,
+                child_keys={"items": "item_code"},
+            )
 
 
-def configure_verifactu_integration(api_key: str | None) -> None:
+@instrumented()
+def setup_manufacturing_templates(batch: TransactionBatch, templates: List[Dict[str, Any]]) -> None:
+    print("\n⚙️  Creating BOM & routing templates...")
+    cyclic = cyclic_templates(templates)
+    for template in templates:
+        if frappe.db.exists("BOM", {"item": template["item"]}):
+            continue
+        if template["item"] in cyclic:
+            print(f"  ⚠️ Skipping BOM for {template['item']}, it would close a cycle: {cyclic[template['item']]}")
+            continue
+
+        with batch.record(f"creating BOM for {template['item']}"):
+            bom = frappe.get_doc({"doctype": "BOM", **template})
+            bom.insert(ignore_permissions=True)
+
+
+def cyclic_templates(templates: List[Dict[str, Any]]) -> Dict[str, str]:
+    """``item -> cycle`` for templates whose BOM would be part of a cycle, together with the site's BOMs."""
+
+    drafts = [Bom.from_values(f"new BOM {template['item']}", template, template.get("items", [])) for template in templates]
+    graph = BomGraph([*load_boms(include_drafts=True), *drafts])
+    cyclic: Dict[str, str] = {}
+    for cycle in graph.cycles:
+        for name in cycle:
+            if name.startswith("new BOM "):
+                cyclic.setdefault(graph.boms[name].item, graph.describe_cycle(cycle))
+    return cyclic
+
+
+@instrumented()
+def setup_verifactu_fields(batch: TransactionBatch, fields: List[Dict[str, Any]]) -> None:
+    print("\n🧾 Adding Verifactu queue fields to Sales Invoice...")
+    for field in fields:
+        with batch.record(f"adding custom field {field['fieldname']}"):
+            ensure_doc("Custom Field", {"dt": field["dt"], "fieldname": field["fieldname"]}, field)
+    # Invoices posted from today on are queued; older ones only with --since or --requeue.
+    if not frappe.db.get_global(QUEUE_SINCE_KEY):
+        frappe.db.set_global(QUEUE_SINCE_KEY, frappe_utils.nowdate())
+
+
+@instrumented()
+def configure_verifactu_integration(batch: TransactionBatch, api_key: str | None) -> None:
     print("\n🧾 Configuring Verifactu sandbox webhook...")
     if not api_key:
         print("  ⚠️ No Verifactu API key provided, creating placeholder configuration")
 
-    payload_template = dedent(
-        """
-        {
-          "invoice_number": "{{ doc.name }}",
-          "customer": "{{ doc.customer_name }}",
-          "total": "{{ doc.rounded_total or doc.grand_total }}",
-          "issue_date": "{{ doc.posting_date }}",
-          "tax_id": "{{ doc.tax_id or '' }}",
-          "items": [
-            {% for item in doc.items %}
-            {
-              "code": "{{ item.item_code }}",
-              "description": "{{ item.description }}",
-              "amount": "{{ item.base_net_amount }}",
-              "quantity": "{{ item.qty }}"
-            }{% if not loop.last %},{% endif %}
-            {% endfor %}
-          ]
-        }
-        """
-    ).strip()
-
-    ensure_doc(
-        "Webhook",
-        {"webhook_name": "Verifactu Sandbox"},
-        {
-            "webhook_name": "Verifactu Sandbox",
-            "webhook_docevent": "on_submit",
-            "webhook_doctype": "Sales Invoice",
-            "request_method": "POST",
-            "request_url": "https://api.verifactu.sandbox/v1/invoices",
-            "headers": json.dumps(
-                [
-                    {"key": "Content-Type", "value": "application/json"},
-                    {"key": "X-API-KEY", "value": api_key or "REPLACE_ME"},
-                ]
-            ),
-            "data": payload_template,
-            "enabled": 1 if api_key else 0,
-        },
-    )
+    with batch.record("configuring the Verifactu webhook"):
+        ensure_doc(
+            "Webhook",
+            {"webhook_name": "Verifactu Sandbox"},
+            verifactu_webhook_values(api_key),
+        )
 
-    frappe.db.commit()
 
+def build_plan(site: str, *, verifactu_api_key: str | None) -> ProvisioningPlan:
+    """Diff every dataset above against one bulk snapshot per doctype."""
 
-def parse_arguments() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Provision Galaxy ERPNext & CRM data")
-    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    plan = ProvisioningPlan("setup_erp_crm", site)
+    plan_records(plan, "customers", "Customer", "customer_name", customer_records(CUSTOMERS))
+    plan_records(
+        plan,
+        "contacts",
+        "Contact",
+        "email_id",
+        ({**contact_values(customer), "links": contact_links(customer)} for customer in CUSTOMERS),
+        child_keys=CONTACT_TABLE_KEYS,
+    )
+    plan_records(plan, "suppliers", "Supplier", "supplier_name", SUPPLIERS)
+    plan_records(plan, "items", "Item", "item_code", ITEMS)
+    plan_records(
+        plan,
+        "projects",
+        "Project",
+        "project_name",
+        ({**project_values(project), "tasks": project_tasks(project)} for project in PROJECTS),
+        child_keys={"tasks": "subject"},
+    )
+    plan_records(plan, "crm", "Lead", "company_name", LEADS)
+    plan_records(plan, "crm", "Opportunity", "opportunity_name", OPPORTUNITIES, child_keys={"items": "item_code"})
+    cyclic = cyclic_templates(BOM_TEMPLATES)
+    for item, cycle in cyclic.items():
+        # stderr, so that ``--plan -`` keeps stdout valid JSON
+        print(f"  ⚠️ Skipping BOM for {item}, it would close a cycle: {cycle}", file=sys.stderr)
+    templates = [template for template in BOM_TEMPLATES if template["item"] not in cyclic]
+    plan_records(plan, "manufacturing", "BOM", "item", templates, create_only=True)
+    plan_records(plan, "verifactu", "Custom Field", "fieldname", verifactu_fields())
+    plan_global(plan, "verifactu", QUEUE_SINCE_KEY, frappe_utils.nowdate())
+    plan_records(plan, "verifactu", "Webhook", "webhook_name", [verifactu_webhook_values(verifactu_api_key)])
+    return plan
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = base_parser("Provision Galaxy ERPNext & CRM data")
     parser.add_argument(
         "--verifactu-api-key",
         default=os.environ.get("VERIFACTU_API_KEY"),
         help="Sandbox API key for Verifactu integration",
     )
-    return parser.parse_args()
-
-
-def main() -> None:
-    args = parse_arguments()
-
-    with frappe_site_connection(args.site):
-        exc: Exception | None = None
-        try:
-            provision_all(verifactu_api_key=args.verifactu_api_key)
-        except Exception as err:  # pragma: no cover - frappe specific
-            exc = err
-            print(f"❌ Fatal error provisioning ERPNext data: {err}")
-            raise
-        finally:
-            commit_or_rollback(exc)
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Insert missing customers, suppliers and leads with multi-row inserts",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Process every section and record even if its inputs did not change since the last run",
+    )
+    parser.add_argument(
+        "--state-file",
+        type=Path,
+        help="Input hash state file (default: <site>/private/galaxy_provisioning/setup_erp_crm.json)",
+    )
+    return finish_parser(parser)
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = parse_arguments(build_parser(), argv)
+
+    run_provisioning(
+        args,
+        "setup_erp_crm",
+        lambda: provision_all(
+            verifactu_api_key=args.verifactu_api_key,
+            bulk=args.bulk,
+            commit_every=args.commit_every,
+            state=ProvisioningState.for_site("setup_erp_crm", path=args.state_file, force=args.force),
+        ),
+        build_plan=lambda: build_plan(args.site, verifactu_api_key=args.verifactu_api_key),
+        failure="provisioning ERPNext data",
+    )
+
+
+CUSTOMERS: List[Dict[str, Any]] = [
+    {
+        "customer_name": "BioPharma Iberia",
+        "customer_group": "Commercial",
+        "territory": "Spain",
+        "customer_type": "Company",
+        "primary_contact": {
+            "first_name": "Laura",
+            "last_name": "Gomez",
+            "email_id": "laura.gomez@biopharmaiberia.com",
+            "phone": "+34 600 111 222",
+        },
+    },
+    {
+        "customer_name": "Asterion Renewable",
+        "customer_group": "Commercial",
+        "territory": "Portugal",
+        "customer_type": "Company",
+        "primary_contact": {
+            "first_name": "Miguel",
+            "last_name": "Ferreira",
+            "email_id": "miguel.ferreira@asterionrenew.com",
+            "phone": "+351 910 222 333",
+        },
+    },
+]
+
+SUPPLIERS: List[Dict[str, Any]] = [
+    {
+        "supplier_name": "Sygma Raw Materials",
+        "supplier_group": "Local",
+        "supplier_type": "Company",
+        "country": "Spain",
+    },
+    {
+        "supplier_name": "Helios Packaging",
+        "supplier_group": "International",
+        "supplier_type": "Company",
+        "country": "Germany",
+    },
+]
+
+ITEMS: List[Dict[str, Any]] = [
+    {
+        "item_code": "BIO-INS-001",
+        "item_name": "Bio Insulin Lot",
+        "description": "Pharmaceutical-grade insulin batch",
+        "item_group": "Products",
+        "stock_uom": "Nos",
+        "is_stock_item": 1,
+        "company": "Galaxy Bio",
+    },
+    {
+        "item_code": "SOFT-DEV-001",
+        "item_name": "Custom Software Sprint",
+        "description": "Four-week agile delivery sprint",
+        "item_group": "Services",
+        "stock_uom": "Hour",
+        "is_stock_item": 0,
+        "company": "Galaxy Software",
+    },
+]
+
+PROJECTS: List[Dict[str, Any]] = [
+    {
+        "project_name": "Galaxy Bio GMP Upgrade",
+        "company": "Galaxy Bio",
+        "is_active": 1,
+        "expected_start_date": "2024-01-01",
+        "expected_end_date": "2024-12-31",
+        "tasks": [
+            {
+                "subject": "Facility Assessment",
+                "start_date": "2024-01-05",
+                "end_date": "2024-02-15",
+            },
+            {
+                "subject": "Validation Protocols",
+                "start_date": "2024-02-16",
+                "end_date": "2024-05-30",
+            },
+        ],
+    },
+    {
+        "project_name": "Galaxy Software ERP Rollout",
+        "company": "Galaxy Software",
+        "is_active": 1,
+        "expected_start_date": "2024-03-01",
+        "expected_end_date": "2024-09-30",
+        "tasks": [
+            {
+                "subject": "Requirement Workshops",
+                "start_date": "2024-03-05",
+                "end_date": "2024-04-15",
+            },
+            {
+                "subject": "MVP Delivery",
+                "start_date": "2024-04-16",
+                "end_date": "2024-07-31",
+            },
+        ],
+    },
+]
+
+LEADS: List[Dict[str, Any]] = [
+    {
+        "company_name": "Solaria Health",
+        "lead_name": "Solaria Health",
+        "lead_owner": "natalia.rodriguez@galaxyholding.com",
+        "status": "Interested",
+        "email_id": "contact@solariahealth.eu",
+        "phone": "+34 655 444 555",
+        "source": "Website",
+        "company": "Galaxy Holding",
+    },
+    {
+        "company_name": "Andes Pharma",
+        "lead_name": "Andes Pharma",
+        "lead_owner": "manuel.martinez@galaxyholding.com",
+        "status": "Open",
+        "email_id": "info@andespharma.co",
+        "phone": "+57 310 789 0000",
+        "source": "Referral",
+        "company": "Galaxy Holding",
+    },
+]
+
+OPPORTUNITIES: List[Dict[str, Any]] = [
+    {
+        "opportunity_name": "Solaria MES Deployment",
+        "party_type": "Customer",
+        "company": "Galaxy Software",
+        "with_items": 1,
+        "opportunity_from": "Lead",
+        "lead": "Solaria Health",
+        "expected_closing": "2024-06-30",
+        "items": [
+            {"item_code": "SOFT-DEV-001", "qty": 1, "rate": 65000},
+        ],
+    },
+    {
+        "opportunity_name": "Andes Pharma Manufacturing",
+        "party_type": "Customer",
+        "company": "Galaxy Bio",
+        "with_items": 1,
+        "opportunity_from": "Lead",
+        "lead": "Andes Pharma",
+        "expected_closing": "2024-08-15",
+        "items": [
+            {"item_code": "BIO-INS-001", "qty": 5, "rate": 18000},
+        ],
+    },
+]
+
+BOM_TEMPLATES: List[Dict[str, Any]] = [
+    {
+        "item": "BIO-INS-001",
+        "company": "Galaxy Bio",
+        "quantity": 1,
+        "is_active": 1,
+        "is_default": 1,
+        "items": [
+            {"item_code": "BIO-INS-001", "qty": 1, "rate": 0},
+        ],
+    },
+]
 
 
 if __name__ == "__main__":
@@ -4,32 +4,59 @@
 from __future__ import annotations
 
 import argparse
-from typing import Dict, Iterable, List
+import time
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Iterable, List, Set, Tuple
 
-import frappe
+from bulk_insert import build_doc, write_rows
+from cli import base_parser, finish_parser, load_configuration, parse_arguments, run_provisioning
+from lazy_imports import lazy_import
+from org_structure import add_org_structure_arguments, load_from_arguments
+from planner import ProvisioningPlan, Snapshot
+from utils import (
+    DEFAULT_COMMIT_EVERY,
+    EXISTS_CHUNK_SIZE,
+    ExistenceIndex,
+    TransactionBatch,
+    chunked,
+    instrumented,
+)
 
-from utils import commit_or_rollback, frappe_site_connection
+
+frappe = lazy_import("frappe")
 
 
 RolePermissions = Dict[str, List[str]]
+RoleConfigs = Dict[str, Dict[str, object]]
 
 
-def setup_galaxy_roles() -> None:
+@instrumented()
+def setup_galaxy_roles(
+    roles: RoleConfigs,
+    *,
+    commit_every: int = DEFAULT_COMMIT_EVERY,
+    prune_permissions: bool = False,
+    bulk_users: bool = False,
+) -> None:
     """Create tailored roles, grant permissions and assign users."""
 
-    for role_name, role_config in ORGANIZATIONAL_ROLES.items():
-        try:
-            provision_role(role_name, role_config)
-            setup_role_permissions(role_name, role_config["permissions"])
-        except Exception as exc:  # pragma: no cover - frappe specific
-            print(f"❌ Error creating role {role_name}: {exc}")
-            frappe.db.rollback()
+    with TransactionBatch(commit_every) as batch:
+        for role_name, role_config in roles.items():
+            with batch.record(f"creating role {role_name}"):
+                provision_role(role_name, role_config)
+
+        with batch.record("reconciling role permissions"):
+            reconcile_permissions(roles, prune=prune_permissions)
+
+        if bulk_users:
+            bulk_assign_user_roles(USER_ROLE_MATRIX, batch)
+        else:
+            setup_user_role_assignments(USER_ROLE_MATRIX, batch)
 
-    setup_user_role_assignments(USER_ROLE_MATRIX)
-    frappe.db.commit()
     print("\n🎉 Galaxy Holding roles and permissions setup completed!")
 
 
+@instrumented()
 def provision_role(role_name: str, role_config: Dict[str, object]) -> None:
     if frappe.db.exists("Role", role_name):
         role = frappe.get_doc("Role", role_name)
@@ -38,192 +65,450 @@ def provision_role(role_name: str, role_config: Dict[str, object]) -> None:
         print(f"• Role {role_name} already exists, updating configuration")
         return
 
-    role = frappe.get_doc(
-        {
-            "doctype": "Role",
-            "role_name": role_name,
-            "desk_access": 1,
-            "is_custom": 1,
-            "restrict_to_domain": role_config.get("domain"),
-        }
-    )
+    role = frappe.get_doc({"doctype": "Role", **role_values(role_name, role_config)})
     role.insert(ignore_permissions=True)
     print(f"  ✅ Created role: {role_name}")
 
 
-def setup_role_permissions(role_name: str, permissions_config: RolePermissions) -> None:
-    for permission_type, doctypes in permissions_config.items():
-        if doctypes == ["*"]:
-            continue
+def role_values(role_name: str, role_config: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "role_name": role_name,
+        "desk_access": 1,
+        "is_custom": 1,
+        "restrict_to_domain": role_config.get("domain"),
+    }
+
+
+PERMISSION_FLAGS = ("read", "write", "create", "delete", "submit", "cancel", "amend")
+
+# Granting a permission type also grants the flags it depends on.
+IMPLIED_FLAGS: Dict[str, Tuple[str, ...]] = {
+    "read": ("read",),
+    "write": ("read", "write"),
+    "create": ("read", "write", "create"),
+}
+
+PermissionKey = Tuple[str, str]
+PermissionFlags = Dict[str, int]
+
+
+@dataclass
+class PermissionDiff:
+    """Changes needed to bring Custom DocPerm rows in line with the role matrix."""
+
+    inserts: Dict[PermissionKey, PermissionFlags] = field(default_factory=dict)
+    updates: Dict[str, PermissionFlags] = field(default_factory=dict)
+    deletes: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    def is_empty(self) -> bool:
+        return not (self.inserts or self.updates or self.deletes)
+
 
-        for doctype_name in doctypes:
-            try:
-                provision_permission(role_name, doctype_name, permission_type)
-            except Exception as exc:  # pragma: no cover - frappe specific
-                print(f"  ❌ Error setting permission for {doctype_name}: {exc}")
+def build_target_permissions(roles_config: Dict[str, Dict[str, object]]) -> Dict[PermissionKey, PermissionFlags]:
+    """Merge every permission type of a role into one flag set per (role, doctype)."""
 
+    targets: Dict[PermissionKey, PermissionFlags] = {}
+    for role_name, role_config in roles_config.items():
+        permissions_config: RolePermissions = role_config["permissions"]
+        for permission_type, doctypes in permissions_config.items():
+            if doctypes == ["*"]:
+                continue
 
-def provision_permission(role_name: str, doctype_name: str, permission_type: str) -> None:
-    existing_perm = frappe.db.get_value(
+            for doctype_name in doctypes:
+                flags = targets.setdefault(
+                    (role_name, doctype_name), {flag: 0 for flag in PERMISSION_FLAGS}
+                )
+                for flag in IMPLIED_FLAGS.get(permission_type, (permission_type,)):
+                    flags[flag] = 1
+
+    return targets
+
+
+def wildcard_roles(roles_config: Dict[str, Dict[str, object]]) -> Set[str]:
+    """Roles granted ``"*"``; their rows are managed outside the matrix, so they are never pruned."""
+
+    return {
+        role_name
+        for role_name, role_config in roles_config.items()
+        if any(doctypes == ["*"] for doctypes in role_config["permissions"].values())
+    }
+
+
+def load_existing_permissions(role_names: Iterable[str]) -> List[Dict[str, object]]:
+    """Fetch the permlevel 0 Custom DocPerm rows of the managed roles in one query."""
+
+    return frappe.get_all(
         "Custom DocPerm",
-        {"parent": doctype_name, "role": role_name, "permlevel": 0},
-        "name",
+        filters={"role": ["in", list(role_names)], "permlevel": 0},
+        fields=["name", "role", "parent", "if_owner", *PERMISSION_FLAGS],
+        order_by="creation asc",
+        limit_page_length=0,
     )
 
-    values = {
-        "doctype": "Custom DocPerm",
+
+def diff_permissions(
+    targets: Dict[PermissionKey, PermissionFlags],
+    existing_rows: Iterable[Dict[str, object]],
+    *,
+    prune: bool = False,
+    keep_roles: Collection[str] = (),
+) -> PermissionDiff:
+    """Rows to insert, update and delete.
+
+    The matrix describes the plain (not ``if_owner``) row of each role and
+    doctype. Other rows, and further rows with the same role, doctype and
+    ``if_owner``, are only deleted with ``prune`` and never for
+    ``keep_roles``; duplicates that stay get the matrix flags as well.
+    """
+
+    diff = PermissionDiff()
+    seen: Set[Tuple[str, str, int]] = set()
+
+    for row in existing_rows:
+        key = (row["role"], row["parent"])
+        if_owner = int(row.get("if_owner") or 0)
+        listed = key in targets and not if_owner
+        duplicate = (*key, if_owner) in seen
+        seen.add((*key, if_owner))
+        if prune and row["role"] not in keep_roles and (duplicate or not listed):
+            diff.deletes.append(row["name"])
+            continue
+        if not listed:
+            continue
+
+        changed = {
+            flag: value
+            for flag, value in targets[key].items()
+            if int(row.get(flag) or 0) != value
+        }
+        if changed:
+            diff.updates[row["name"]] = changed
+        else:
+            diff.unchanged += 1
+
+    for key, flags in targets.items():
+        if (*key, 0) not in seen:
+            diff.inserts[key] = flags
+
+    return diff
+
+
+def permission_row(key: PermissionKey, flags: PermissionFlags) -> Dict[str, object]:
+    role_name, doctype_name = key
+    return {
         "parent": doctype_name,
         "parenttype": "DocType",
         "parentfield": "permissions",
         "role": role_name,
-        "read": 1 if permission_type in {"read", "write", "create"} else 0,
-        "write": 1 if permission_type in {"write", "create"} else 0,
-        "create": 1 if permission_type == "create" else 0,
-        "delete": 1 if permission_type == "delete" else 0,
-        "submit": 1 if permission_type == "submit" else 0,
-        "cancel": 1 if permission_type == "cancel" else 0,
-        "amend": 1 if permission_type == "amend" else 0,
+        "permlevel": 0,
+        **flags,
     }
 
-    if existing_perm:
-        perm = frappe.get_doc("Custom DocPerm", existing_perm)
-        perm.update(values)
-        perm.save(ignore_permissions=True)
-    else:
-        perm = frappe.get_doc(values)
-        perm.insert(ignore_permissions=True)
 
+@instrumented()
+def reconcile_permissions(
+    roles_config: Dict[str, Dict[str, object]],
+    *,
+    prune: bool = False,
+) -> PermissionDiff:
+    """Apply only the Custom DocPerm inserts, updates and deletes the role matrix needs.
+
+    Existing rows are loaded with one query and the permission cache is
+    cleared once at the end instead of after every row. Rows the matrix
+    does not list are kept unless ``prune`` is set, and those of roles
+    with ``"*"`` grants are always kept.
+    """
+
+    targets = build_target_permissions(roles_config)
+    diff = diff_permissions(
+        targets,
+        load_existing_permissions(list(roles_config)),
+        prune=prune,
+        keep_roles=wildcard_roles(roles_config),
+    )
+
+    if diff.inserts:
+        write_rows(
+            "Custom DocPerm",
+            [
+                build_doc("Custom DocPerm", permission_row(key, flags))
+                for key, flags in diff.inserts.items()
+            ],
+        )
+
+    for name, changed in diff.updates.items():
+        frappe.db.set_value("Custom DocPerm", name, changed)
+
+    if diff.deletes:
+        frappe.db.delete("Custom DocPerm", {"name": ["in", diff.deletes]})
+
+    if not diff.is_empty():
+        frappe.clear_cache()
+
+    print(
+        f"  🔐 Permissions: {len(diff.inserts)} inserted, {len(diff.updates)} updated, "
+        f"{len(diff.deletes)} deleted, {diff.unchanged} unchanged"
+    )
+    return diff
 
-def setup_user_role_assignments(user_matrix: Dict[str, List[str]]) -> None:
+
+@instrumented()
+def setup_user_role_assignments(user_matrix: Dict[str, List[str]], batch: TransactionBatch) -> None:
     print("\n👥 Setting up user role assignments...")
 
     for email, roles in user_matrix.items():
-        try:
+        with batch.record(f"setting up user {email}"):
             ensure_user(email)
             assign_roles(email, roles)
             print(f"  ✅ Assigned roles to {email}: {', '.join(roles)}")
-        except Exception as exc:  # pragma: no cover - frappe specific
-            print(f"  ❌ Error setting up user {email}: {exc}")
+
+
+def user_values(email: str, roles: Iterable[str] = ()) -> Dict[str, Any]:
+    return {
+        "email": email,
+        "first_name": email.split("@")[0].replace(".", " ").title(),
+        "enabled": 1,
+        "user_type": "System User",
+        "send_welcome_email": 0,
+        "roles": [{"role": role} for role in roles],
+    }
+
+
+def new_user_doc(email: str, roles: Iterable[str] = ()) -> Any:
+    return frappe.get_doc({"doctype": "User", **user_values(email, roles)})
 
 
 def ensure_user(email: str) -> None:
     if frappe.db.exists("User", email):
         return
 
-    first_name = email.split("@")[0].replace(".", " ").title()
-    user = frappe.get_doc(
-        {
-            "doctype": "User",
-            "email": email,
-            "first_name": first_name,
-            "enabled": 1,
-            "user_type": "System User",
-            "send_welcome_email": 0,
-        }
-    )
-    user.insert(ignore_permissions=True)
+    new_user_doc(email).insert(ignore_permissions=True)
     print(f"  ✅ Created user: {email}")
 
 
 def assign_roles(email: str, roles: Iterable[str]) -> None:
     user = frappe.get_doc("User", email)
     current_roles = {entry.role for entry in user.roles}
+    missing_roles = [role for role in dict.fromkeys(roles) if role not in current_roles]
 
-    for role in roles:
-        if role not in current_roles:
-            user.append("roles", {"role": role})
+    if not missing_roles:
+        return
+
+    for role in missing_roles:
+        user.append("roles", {"role": role})
 
     user.save(ignore_permissions=True)
 
 
-def parse_arguments() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(description="Provision Galaxy Holding roles")
-    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
-    return parser.parse_args()
+@instrumented()
+def bulk_assign_user_roles(
+    user_matrix: Dict[str, List[str]],
+    batch: TransactionBatch,
+    *,
+    chunk_size: int = EXISTS_CHUNK_SIZE,
+) -> None:
+    """Grant ``user_matrix`` roles with two reads per chunk of users.
+
+    Existing users and their ``Has Role`` rows are fetched in bulk and only
+    the missing grants are written, as one multi-row insert per chunk.
+    Users whose roles did not change are never loaded or saved. New users
+    still go through ``insert()`` (the User controller is required) but
+    carry their roles in that single insert.
+    """
+
+    print("\n👥 Setting up user role assignments (bulk)...")
+    started = time.perf_counter()
+    created = granted_users = granted_roles = 0
+
+    for emails in chunked(user_matrix, chunk_size):
+        existing_users = ExistenceIndex.for_keys("User", "name", emails, chunk_size=chunk_size)
+        current_roles = load_user_roles(emails)
+
+        grants = []
+        changed_users: List[str] = []
+        for email in emails:
+            roles = list(dict.fromkeys(user_matrix[email]))
+            if email not in existing_users:
+                with batch.record(f"creating user {email}"):
+                    new_user_doc(email, roles).insert(ignore_permissions=True)
+                    created += 1
+                continue
+
+            held = current_roles.get(email, set())
+            missing_roles = [role for role in roles if role not in held]
+            if not missing_roles:
+                continue
+
+            changed_users.append(email)
+            for offset, role in enumerate(missing_roles, start=len(held) + 1):
+                grants.append(build_doc("Has Role", role_grant_row(email, role, offset)))
+
+        if grants:
+            with batch.record(f"granting {len(grants)} roles"):
+                write_rows("Has Role", grants)
+                for email in changed_users:
+                    frappe.clear_cache(user=email)
+            granted_users += len(changed_users)
+            granted_roles += len(grants)
+
+    elapsed = time.perf_counter() - started
+    throughput = len(user_matrix) / elapsed if elapsed else float(len(user_matrix))
+    print(
+        f"  ✅ {len(user_matrix)} users checked: {created} created, "
+        f"{granted_roles} roles granted to {granted_users} users ({throughput:.0f} users/s)"
+    )
+
+
+def role_grant_row(email: str, role: str, idx: int) -> Dict[str, object]:
+    return {"parent": email, "parenttype": "User", "parentfield": "roles", "role": role, "idx": idx}
+
+
+def load_user_roles(emails: List[str]) -> Dict[str, Set[str]]:
+    current_roles: Dict[str, Set[str]] = {}
+    for row in frappe.get_all(
+        "Has Role",
+        filters={"parenttype": "User", "parent": ["in", emails]},
+        fields=["parent", "role"],
+        parent_doctype="User",
+        limit_page_length=0,
+    ):
+        current_roles.setdefault(row["parent"], set()).add(row["role"])
+    return current_roles
+
 
+def build_plan(site: str, roles: RoleConfigs, *, prune_permissions: bool = False) -> ProvisioningPlan:
+    """Diff roles, Custom DocPerm rows and user grants without writing anything.
 
-def main() -> None:
-    args = parse_arguments()
+    Permission rows and role grants are planned as direct changes, so the
+    apply phase writes them with multi-row inserts and a single delete.
+    """
 
-    with frappe_site_connection(args.site):
-        exc: Exception | None = None
-        try:
-            setup_galaxy_roles()
-        except Exception as err:  # pragma: no cover - frappe specific
-            exc = err
-            print(f"❌ Fatal error provisioning roles: {err}")
-            raise
-        finally:
-            commit_or_rollback(exc)
+    plan = ProvisioningPlan("setup_roles_permissions", site)
 
+    existing_roles = Snapshot("Role", "name", roles, ["desk_access", "is_custom"])
+    for role_name, role_config in roles.items():
+        row = existing_roles.get(role_name)
+        if row is None:
+            plan.add("create", "Role", "roles", values=role_values(role_name, role_config))
+        elif not (int(row.get("desk_access") or 0) and int(row.get("is_custom") or 0)):
+            plan.add("update", "Role", "roles", name=role_name, values={"desk_access": 1, "is_custom": 1})
 
-ORGANIZATIONAL_ROLES: Dict[str, Dict[str, object]] = {
+    targets = build_target_permissions(roles)
+    diff = diff_permissions(
+        targets,
+        load_existing_permissions(list(roles)),
+        prune=prune_permissions,
+        keep_roles=wildcard_roles(roles),
+    )
+    for key, flags in diff.inserts.items():
+        plan.add("create", "Custom DocPerm", "permissions", values=permission_row(key, flags), direct=True)
+    for name, changed in diff.updates.items():
+        plan.add("update", "Custom DocPerm", "permissions", name=name, values=changed, direct=True)
+    for name in diff.deletes:
+        plan.add("delete", "Custom DocPerm", "permissions", name=name, direct=True)
+
+    for emails in chunked(USER_ROLE_MATRIX, EXISTS_CHUNK_SIZE):
+        existing_users = ExistenceIndex.for_keys("User", "name", emails)
+        current_roles = load_user_roles(emails)
+        for email in emails:
+            roles_needed = list(dict.fromkeys(USER_ROLE_MATRIX[email]))
+            if email not in existing_users:
+                plan.add("create", "User", "users", values=user_values(email, roles_needed))
+                continue
+
+            held = current_roles.get(email, set())
+            missing_roles = [role for role in roles_needed if role not in held]
+            for offset, role in enumerate(missing_roles, start=len(held) + 1):
+                plan.add("create", "Has Role", "users", values=role_grant_row(email, role, offset), direct=True)
+
+    return plan
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = base_parser("Provision Galaxy Holding roles")
+    parser.add_argument(
+        "--prune-permissions",
+        action="store_true",
+        help="Delete Custom DocPerm rows of managed roles that the matrix does not list (except roles granted '*')",
+    )
+    parser.add_argument(
+        "--bulk-users",
+        action="store_true",
+        help="Resolve users and role grants with bulk reads and multi-row inserts",
+    )
+    add_org_structure_arguments(parser)
+    return finish_parser(parser)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = build_parser()
+    args = parse_arguments(parser, argv)
+    roles = load_configuration(parser, lambda: load_from_arguments(args).role_configs(ROLE_PERMISSIONS))
+
+    run_provisioning(
+        args,
+        "setup_roles_permissions",
+        lambda: setup_galaxy_roles(
+            roles,
+            commit_every=args.commit_every,
+            prune_permissions=args.prune_permissions,
+            bulk_users=args.bulk_users,
+        ),
+        build_plan=lambda: build_plan(args.site, roles, prune_permissions=args.prune_permissions),
+        failure="provisioning roles",
+    )
+
+
+# Doctype grants per role. Which roles exist, and their modules, come from the
+# organisation structure document (see org_structure.py).
+ROLE_PERMISSIONS: Dict[str, RolePermissions] = {
     "Galaxy Director": {
-        "description": "Executive leadership with unrestricted access",
-        "permissions": {
-            "read": ["*"],
-            "write": ["*"],
-            "create": ["*"],
-            "delete": ["*"],
-            "submit": ["*"],
-            "cancel": ["*"],
-            "amend": ["*"],
-        },
-        "modules": ["all"],
+        "read": ["*"],
+        "write": ["*"],
+        "create": ["*"],
+        "delete": ["*"],
+        "submit": ["*"],
+        "cancel": ["*"],
+        "amend": ["*"],
     },
     "Galaxy Administrator": {
-        "description": "Finance and administration",
-        "permissions": {
-            "read": [
-                "Account",
-                "Journal Entry",
-                "Payment Entry",
-                "Purchase Invoice",
-                "Sales Invoice",
-                "Budget",
-            ],
-            "write": [
-                "Account",
-                "Journal Entry",
-                "Payment Entry",
-                "Purchase Invoice",
-                "Sales Invoice",
-                "Budget",
-            ],
-            "create": ["Journal Entry", "Payment Entry", "Purchase Invoice", "Sales Invoice"],
-            "submit": ["Journal Entry", "Payment Entry", "Purchase Invoice", "Sales Invoice"],
-            "cancel": ["Journal Entry", "Payment Entry"],
-        },
-        "modules": ["Accounts", "Buying", "Selling", "HR"],
+        "read": [
+            "Account",
+            "Journal Entry",
+            "Payment Entry",
+            "Purchase Invoice",
+            "Sales Invoice",
+            "Budget",
+        ],
+        "write": [
+            "Account",
+            "Journal Entry",
+            "Payment Entry",
+            "Purchase Invoice",
+            "Sales Invoice",
+            "Budget",
+        ],
+        "create": ["Journal Entry", "Payment Entry", "Purchase Invoice", "Sales Invoice"],
+        "submit": ["Journal Entry", "Payment Entry", "Purchase Invoice", "Sales Invoice"],
+        "cancel": ["Journal Entry", "Payment Entry"],
     },
     "Galaxy IT Developer": {
-        "description": "IT development and project delivery",
-        "permissions": {
-            "read": ["Project", "Task", "Timesheet", "Issue"],
-            "write": ["Project", "Task", "Timesheet", "Issue"],
-            "create": ["Project", "Task", "Timesheet", "Issue"],
-            "submit": ["Timesheet"],
-        },
-        "modules": ["Projects", "Support", "HR"],
+        "read": ["Project", "Task", "Timesheet", "Issue"],
+        "write": ["Project", "Task", "Timesheet", "Issue"],
+        "create": ["Project", "Task", "Timesheet", "Issue"],
+        "submit": ["Timesheet"],
     },
     "Galaxy Operations": {
-        "description": "Manufacturing and quality operations",
-        "permissions": {
-            "read": ["Work Order", "Stock Entry", "Item", "BOM", "Quality Inspection"],
-            "write": ["Work Order", "Stock Entry", "Item", "BOM", "Quality Inspection"],
-            "create": ["Work Order", "Stock Entry", "Quality Inspection"],
-            "submit": ["Work Order", "Stock Entry", "Quality Inspection"],
-        },
-        "modules": ["Manufacturing", "Stock", "Quality Management"],
+        "read": ["Work Order", "Stock Entry", "Item", "BOM", "Quality Inspection"],
+        "write": ["Work Order", "Stock Entry", "Item", "BOM", "Quality Inspection"],
+        "create": ["Work Order", "Stock Entry", "Quality Inspection"],
+        "submit": ["Work Order", "Stock Entry", "Quality Inspection"],
     },
     "Galaxy Legal": {
-        "description": "Legal and compliance governance",
-        "permissions": {
-            "read": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
-            "write": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
-            "create": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
-        },
-        "modules": ["CRM", "Buying", "Selling"],
+        "read": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
+        "write": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
+        "create": ["Customer", "Supplier", "Contract", "Lead", "Opportunity"],
     },
 }
 
@@ -2,19 +2,46 @@
 
 from __future__ import annotations
 
+import atexit
 import contextlib
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Iterator, Optional
+import datetime
+import fcntl
+import functools
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
 
-import frappe
+from lazy_imports import lazy_import
+
+
+frappe = lazy_import("frappe")
+
+
+EXISTS_CHUNK_SIZE = 500
+DEFAULT_COMMIT_EVERY = 200
+WRITE_STATEMENTS = ("insert", "update", "delete", "replace")
+
+F = TypeVar("F", bound=Callable[..., Any])
 
 
 @contextlib.contextmanager
 def frappe_site_connection(site: str) -> Iterator[None]:
-    """Context manager that initializes and tears down a Frappe site connection."""
+    """Context manager that initializes and tears down a Frappe site connection.
 
-    frappe.init(site=site)
-    frappe.connect()
+    ``frappe.init`` plus ``frappe.connect`` (site config, hooks, DB handshake)
+    is recorded as the ``site_cold_start`` step, so every script reports it.
+    """
+
+    with instrumentation.step("site_cold_start"):
+        frappe.init(site=site)
+        frappe.connect()
 
     try:
         yield
@@ -22,22 +49,586 @@ def frappe_site_connection(site: str) -> Iterator[None]:
         frappe.destroy()
 
 
-def ensure_doc(doctype: str, filters: Dict[str, Any], values: Dict[str, Any]) -> Any:
-    """Get an existing document or create a new one if it does not exist."""
+# Cold-start seconds of this worker process's connection, until a task takes them.
+_worker_cold_start: Optional[float] = None
+
+
+def connect_site_worker(site: str) -> None:
+    """Process-pool initializer: open one site connection that every task of the worker reuses."""
+
+    global _worker_cold_start
+
+    started = time.perf_counter()
+    frappe.init(site=site)
+    frappe.connect()
+    _worker_cold_start = time.perf_counter() - started
+    # spawn children leave through sys.exit, so the connection is closed cleanly
+    atexit.register(frappe.destroy)
+
+
+def take_worker_cold_start() -> float:
+    """Return the worker's connection cold start once (0.0 afterwards), for the parent to report."""
+
+    global _worker_cold_start
+
+    seconds, _worker_cold_start = _worker_cold_start or 0.0, None
+    return seconds
+
+
+def site_worker_pool(site: str, workers: int) -> ProcessPoolExecutor:
+    """Process pool whose workers each hold one warm site connection for their whole life.
+
+    Tasks run against ``frappe.db`` directly instead of opening a connection
+    each; they can return ``take_worker_cold_start()`` so the parent can
+    report what the pool's connections cost.
+    """
+
+    # spawn keeps the parent's open DB connection out of the workers
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=connect_site_worker,
+        initargs=(site,),
+    )
+
+
+@contextlib.contextmanager
+def single_instance(name: str) -> Iterator[bool]:
+    """Hold an exclusive lock file in the site folder; yields False if another run holds it."""
+
+    path = Path(frappe.get_site_path("private", "galaxy_provisioning", f"{name}.lock"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def chunked(values: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most ``size`` elements."""
+
+    chunk: List[Any] = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class ExistenceIndex:
+    """In-memory ``key -> name`` map for a doctype, filled with chunked ``IN`` queries.
+
+    ``prefetch`` resolves any number of keys with one query per chunk, so
+    loops over thousands of records no longer pay one ``frappe.db.exists``
+    round-trip each. Keys that were looked up and not found are remembered
+    as missing until ``add`` records them.
+    """
+
+    def __init__(self, doctype: str, field: str = "name", *, chunk_size: int = EXISTS_CHUNK_SIZE) -> None:
+        self.doctype = doctype
+        self.field = field
+        self.chunk_size = chunk_size
+        self._names: Dict[str, str] = {}
+        self._loaded: Set[str] = set()
+
+    @classmethod
+    def for_keys(
+        cls,
+        doctype: str,
+        field: str,
+        keys: Iterable[str],
+        *,
+        chunk_size: int = EXISTS_CHUNK_SIZE,
+    ) -> "ExistenceIndex":
+        index = cls(doctype, field, chunk_size=chunk_size)
+        index.prefetch(keys)
+        return index
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        pending = [key for key in dict.fromkeys(keys) if key and key not in self._loaded]
+
+        for chunk in chunked(pending, self.chunk_size):
+            rows = frappe.get_all(
+                self.doctype,
+                filters={self.field: ["in", chunk]},
+                fields=["name", self.field],
+                limit_page_length=0,
+            )
+            for row in rows:
+                self._names.setdefault(row[self.field], row["name"])
+            self._loaded.update(chunk)
+
+    def get(self, key: str) -> Optional[str]:
+        if key not in self._loaded:
+            self.prefetch([key])
+        return self._names.get(key)
+
+    def add(self, key: str, name: str) -> None:
+        self._names[key] = name
+        self._loaded.add(key)
+
+    def covers(self, doctype: str, filters: Dict[str, Any]) -> bool:
+        """Return True when ``filters`` is a plain equality lookup on the indexed field."""
+
+        return (
+            doctype == self.doctype
+            and len(filters) == 1
+            and self.field in filters
+            and isinstance(filters[self.field], str)
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+@dataclass
+class ProvisioningStats:
+    """Per-doctype tally of what ``ensure_doc`` did with each record."""
+
+    created: Counter = field(default_factory=Counter)
+    updated: Counter = field(default_factory=Counter)
+    unchanged: Counter = field(default_factory=Counter)
+    # label -> [queries, records] of steps that report their query cost
+    query_costs: Dict[str, List[int]] = field(default_factory=dict)
+
+    def record(self, doctype: str, outcome: str) -> None:
+        getattr(self, outcome)[doctype] += 1
+
+    def record_queries(self, label: str, queries: int, records: int) -> None:
+        cost = self.query_costs.setdefault(label, [0, 0])
+        cost[0] += queries
+        cost[1] += records
+
+    def reset(self) -> None:
+        self.created.clear()
+        self.updated.clear()
+        self.unchanged.clear()
+        self.query_costs.clear()
+
+    def print_summary(self) -> None:
+        doctypes = sorted(set(self.created) | set(self.updated) | set(self.unchanged))
+        if not doctypes:
+            return
+
+        print("\n📊 Provisioning summary (created / updated / unchanged):")
+        for doctype in doctypes:
+            print(
+                f"  • {doctype}: {self.created[doctype]} / "
+                f"{self.updated[doctype]} / {self.unchanged[doctype]}"
+            )
+        for label, (queries, records) in self.query_costs.items():
+            per_record = queries / records if records else 0.0
+            print(f"  • {label}: {queries} queries for {records} records ({per_record:.2f} per record)")
+
+
+provisioning_stats = ProvisioningStats()
+
+
+@dataclass(eq=False)
+class StepMetrics:
+    """Accumulated cost of one named provisioning step."""
+
+    calls: int = 0
+    seconds: float = 0.0
+    queries: int = 0
+    rows_written: int = 0
+
+
+class Instrumentation:
+    """Wall time, SQL query count and rows written per provisioning step.
+
+    Queries are counted by wrapping ``frappe.db.sql`` of the current
+    connection the first time a step starts. Every step that is active when
+    a query runs is charged for it, so nested steps report inclusive figures.
+    """
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, StepMetrics] = {}
+        self._active: List[StepMetrics] = []
+
+    def reset(self) -> None:
+        self.steps.clear()
+        self._active.clear()
+
+    @contextlib.contextmanager
+    def step(self, name: str) -> Iterator[StepMetrics]:
+        self._install_hook()
+        metrics = self.steps.setdefault(name, StepMetrics())
+        self._active.append(metrics)
+        started = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            self._active.pop()
+            if metrics not in self._active:
+                metrics.seconds += time.perf_counter() - started
+            metrics.calls += 1
+
+    def _install_hook(self) -> None:
+        db = getattr(frappe, "db", None)
+        if db is None or getattr(db.sql, "_galaxy_instrumented", False):
+            return
+
+        original_sql = db.sql
+
+        def counting_sql(query: Any, *args: Any, **kwargs: Any) -> Any:
+            result = original_sql(query, *args, **kwargs)
+            self._charge(str(query), db)
+            return result
+
+        counting_sql._galaxy_instrumented = True  # type: ignore[attr-defined]
+        db.sql = counting_sql
+
+    def _charge(self, query: str, db: Any) -> None:
+        rows = 0
+        if query.lstrip().lower().startswith(WRITE_STATEMENTS):
+            rowcount = getattr(getattr(db, "_cursor", None), "rowcount", None)
+            rows = rowcount if isinstance(rowcount, int) and rowcount >= 0 else 1
+
+        for metrics in dict.fromkeys(self._active):
+            metrics.queries += 1
+            metrics.rows_written += rows
 
-    name = frappe.db.exists(doctype, filters)
+    def print_summary(self, stream: Any = None) -> None:
+        if not self.steps:
+            return
+
+        width = max(len(name) for name in self.steps)
+        print("\n⏱️  Step timings:", file=stream)
+        print(
+            f"  {'step':<{width}}  {'calls':>6}  {'seconds':>9}  {'queries':>8}  {'q/call':>7}  {'rows':>7}",
+            file=stream,
+        )
+        for name, metrics in self.steps.items():
+            per_call = metrics.queries / metrics.calls if metrics.calls else 0.0
+            print(
+                f"  {name:<{width}}  {metrics.calls:>6}  {metrics.seconds:>9.3f}  "
+                f"{metrics.queries:>8}  {per_call:>7.1f}  {metrics.rows_written:>7}",
+                file=stream,
+            )
+
+    def to_dict(self, script: str) -> Dict[str, Any]:
+        return {
+            "script": script,
+            "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "steps": {name: asdict(metrics) for name, metrics in self.steps.items()},
+        }
+
+    def write_json(self, path: Path, script: str) -> None:
+        write_atomic(path, json.dumps(self.to_dict(script), indent=2) + "\n")
+
+    def write_prometheus(self, path: Path, script: str) -> None:
+        """Write the steps in the node_exporter textfile collector format."""
+
+        lines: List[str] = []
+        for metric, help_text in (
+            ("calls", "Number of times the step ran"),
+            ("seconds", "Wall time spent in the step"),
+            ("queries", "SQL queries issued by the step"),
+            ("rows_written", "Rows inserted, updated or deleted by the step"),
+        ):
+            lines.append(f"# HELP galaxy_provisioning_step_{metric} {help_text}.")
+            lines.append(f"# TYPE galaxy_provisioning_step_{metric} gauge")
+            for name, metrics in self.steps.items():
+                lines.append(
+                    f'galaxy_provisioning_step_{metric}{{script="{script}",step="{name}"}} '
+                    f"{getattr(metrics, metric)}"
+                )
+        write_atomic(path, "\n".join(lines) + "\n")
+
+
+instrumentation = Instrumentation()
+
+
+def instrumented(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator recording each call of the function as an instrumentation step."""
+
+    def decorator(func: F) -> F:
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with instrumentation.step(step_name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def write_atomic(path: Path, content: str | bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    if isinstance(content, bytes):
+        tmp_path.write_bytes(content)
+    else:
+        tmp_path.write_text(content)
+    os.replace(tmp_path, path)
+
+
+def add_metrics_arguments(parser: Any) -> None:
+    parser.add_argument("--metrics-json", type=Path, metavar="PATH", help="Write step metrics as JSON")
+    parser.add_argument(
+        "--metrics-prom",
+        type=Path,
+        metavar="PATH",
+        help="Write step metrics in Prometheus textfile format",
+    )
+
+
+def report_metrics(args: Any, script: str, stream: Any = None) -> None:
+    """Print the step table and write the metric files requested on the command line."""
+
+    instrumentation.print_summary(stream)
+    if getattr(args, "metrics_json", None):
+        instrumentation.write_json(args.metrics_json, script)
+    if getattr(args, "metrics_prom", None):
+        instrumentation.write_prometheus(args.metrics_prom, script)
+
+
+def values_equal(current: Any, expected: Any) -> bool:
+    """Compare a stored field value with a requested one, tolerating DB type coercion."""
+
+    if current in (None, "") and expected in (None, ""):
+        return True
+    if current == expected:
+        return True
+    if isinstance(current, bool) or isinstance(expected, bool):
+        return False
+    if isinstance(current, (int, float, Decimal)) and isinstance(expected, (int, float, Decimal)):
+        return float(current) == float(expected)
+    if isinstance(current, (datetime.date, datetime.timedelta)) and isinstance(expected, str):
+        return str(current) == expected
+    return False
+
+
+def rows_match(rows: Iterable[Any], expected_rows: Iterable[Any]) -> bool:
+    """Return True when child ``rows`` carry the requested values in the same order."""
+
+    rows = list(rows or [])
+    expected_rows = list(expected_rows)
+    if len(rows) != len(expected_rows):
+        return False
+
+    for row, expected in zip(rows, expected_rows):
+        if hasattr(expected, "as_dict"):
+            expected = expected.as_dict()
+        if not all(values_equal(row.get(key), value) for key, value in expected.items()):
+            return False
+
+    return True
+
+
+def doc_matches(doc: Any, values: Dict[str, Any]) -> bool:
+    """Return True when ``doc`` already holds every requested value, child tables included."""
+
+    for key, expected in values.items():
+        if key == "doctype":
+            continue
+        current = doc.get(key)
+        if isinstance(expected, (list, tuple)):
+            if not rows_match(current, expected):
+                return False
+        elif not values_equal(current, expected):
+            return False
+
+    return True
+
+
+@dataclass
+class ChildTableMerge:
+    """What ``merge_child_rows`` changed in one child table."""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    moved: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed or self.moved)
+
+
+def merge_child_rows(
+    doc: Any,
+    fieldname: str,
+    expected_rows: Iterable[Dict[str, Any]],
+    key: str | Tuple[str, ...],
+) -> ChildTableMerge:
+    """Merge ``expected_rows`` into the child table ``fieldname`` of ``doc``, matching rows on ``key``.
+
+    Rows that already exist keep their ``name`` and are only updated where a
+    value differs, new rows are appended and only rows whose key is no longer
+    expected are dropped, so a save writes the difference instead of deleting
+    and re-inserting the whole table. The table ends up in the order of
+    ``expected_rows``. ``key`` may name several fields (e.g. ``link_doctype``
+    and ``link_name``). Nothing on ``doc`` is touched when the result
+    reports no change, so callers can skip the save.
+    """
+
+    key_fields = (key,) if isinstance(key, str) else key
+    merge = ChildTableMerge()
+    existing: Dict[Tuple[Any, ...], List[Any]] = {}
+    for row in doc.get(fieldname) or []:
+        existing.setdefault(tuple(row.get(field) for field in key_fields), []).append(row)
+
+    # (existing row or None, values to write) in the final order
+    merged: List[Tuple[Any, Dict[str, Any]]] = []
+    for idx, expected in enumerate(expected_rows, start=1):
+        matches = existing.get(tuple(expected[field] for field in key_fields))
+        if not matches:
+            merged.append((None, dict(expected)))
+            merge.added += 1
+            continue
+
+        row = matches.pop(0)
+        changes = {field: value for field, value in expected.items() if not values_equal(row.get(field), value)}
+        merge.updated += bool(changes)
+        merge.moved += row.get("idx") != idx
+        merged.append((row, changes))
+
+    merge.removed = sum(len(rows) for rows in existing.values())
+    if not merge.changed:
+        return merge
+
+    rows: List[Any] = []
+    for idx, (row, values) in enumerate(merged, start=1):
+        if row is None:
+            rows.append({**values, "idx": idx})
+            continue
+        row.update({**values, "idx": idx})
+        rows.append(row)
+    doc.set(fieldname, rows)
+    return merge
+
+
+def ensure_doc(
+    doctype: str,
+    filters: Dict[str, Any],
+    values: Dict[str, Any],
+    *,
+    index: Optional[ExistenceIndex] = None,
+    detect_changes: bool = True,
+    stats: Optional[ProvisioningStats] = None,
+    child_keys: Optional[Dict[str, str | Tuple[str, ...]]] = None,
+) -> Any:
+    """Get an existing document or create a new one if it does not exist.
+
+    When an ``index`` covering ``filters`` is passed the existence check is
+    answered from memory instead of issuing a ``frappe.db.exists`` query.
+    With ``detect_changes`` an existing document whose stored values already
+    match ``values`` is returned without saving, so re-runs skip the
+    validate/on_update chain and version rows entirely. Child tables named
+    in ``child_keys`` (``fieldname -> natural key``) are merged row by row
+    with ``merge_child_rows`` instead of being replaced.
+    """
+
+    stats = stats if stats is not None else provisioning_stats
+
+    if index is not None and index.covers(doctype, filters):
+        key = filters[index.field]
+        name = index.get(key)
+    else:
+        index = None
+        name = frappe.db.exists(doctype, filters)
 
     if name:
         doc = frappe.get_doc(doctype, name)
-        doc.update(values)
+        child_keys = child_keys or {}
+        scalar_values = {key: value for key, value in values.items() if key not in child_keys}
+        changed = not (detect_changes and doc_matches(doc, scalar_values))
+        if changed:
+            doc.update(scalar_values)
+        for fieldname, key in child_keys.items():
+            if fieldname in values and merge_child_rows(doc, fieldname, values[fieldname], key).changed:
+                changed = True
+        if not changed:
+            stats.record(doctype, "unchanged")
+            return doc
+
         doc.save(ignore_permissions=True)
+        stats.record(doctype, "updated")
         return doc
 
     doc = frappe.get_doc({"doctype": doctype, **values})
     doc.insert(ignore_permissions=True)
+    stats.record(doctype, "created")
+    if index is not None:
+        index.add(key, doc.name)
     return doc
 
 
+class TransactionBatch:
+    """Group record writes into transactions of ``batch_size`` records.
+
+    Every ``record()`` block runs inside its own savepoint: a failing record
+    is rolled back to that savepoint and reported, while the other records
+    of the batch stay pending. A commit is issued each time ``batch_size``
+    records have completed and once more when the context exits cleanly.
+    Nested ``record()`` blocks only commit from the outermost level.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_COMMIT_EVERY) -> None:
+        self.batch_size = max(1, batch_size)
+        self.pending = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.commits = 0
+        self._depth = 0
+        self._savepoints = 0
+
+    def __enter__(self) -> "TransactionBatch":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Optional[BaseException], tb: Any) -> None:
+        if exc is None:
+            self.commit()
+        else:
+            frappe.db.rollback()
+            self.pending = 0
+
+    @contextlib.contextmanager
+    def record(self, description: str) -> Iterator[None]:
+        """Run one record's writes in a savepoint, swallowing and reporting its failure."""
+
+        self._savepoints += 1
+        savepoint = f"galaxy_batch_{self._savepoints}"
+        frappe.db.savepoint(savepoint)
+        self._depth += 1
+
+        try:
+            yield
+        except Exception as exc:  # pragma: no cover - frappe specific
+            frappe.db.rollback(save_point=savepoint)
+            self.failed += 1
+            print(f"  ❌ Error {description}: {exc}")
+        else:
+            frappe.db.release_savepoint(savepoint)
+            if self._depth == 1:
+                self.succeeded += 1
+                self.pending += 1
+        finally:
+            self._depth -= 1
+
+        if self._depth == 0 and self.pending >= self.batch_size:
+            self.commit()
+
+    def commit(self) -> None:
+        if self._depth or not self.pending:
+            return
+        frappe.db.commit()
+        self.commits += 1
+        self.pending = 0
+
+
 def commit_or_rollback(exc: Optional[BaseException]) -> None:
     """Commit if no exception occurred otherwise rollback the transaction."""
 
@@ -60,9 +651,23 @@ class CompanyConfig:
     parent_company: str = ""
 
 
-def iter_missing_records(doctype: str, keys: Iterable[str]) -> Iterable[str]:
-    """Yield identifiers that do not already exist in the provided doctype."""
+def iter_missing_records(
+    doctype: str,
+    keys: Iterable[str],
+    *,
+    field: str = "name",
+    chunk_size: int = EXISTS_CHUNK_SIZE,
+) -> Iterable[str]:
+    """Yield identifiers that do not already exist in the provided doctype.
+
+    Keys are checked ``chunk_size`` at a time with a single ``IN`` query per
+    chunk, so the input may be an arbitrarily long (or lazy) iterable.
+    """
+
+    index = ExistenceIndex(doctype, field, chunk_size=chunk_size)
 
-    for key in keys:
-        if not frappe.db.exists(doctype, key):
-            yield key
+    for chunk in chunked(keys, chunk_size):
+        index.prefetch(chunk)
+        for key in chunk:
+            if key not in index:
+                yield key
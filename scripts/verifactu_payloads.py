@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Render Verifactu payloads in bulk from one compiled copy of the webhook template.
+
+The webhook path renders ``VERIFACTU_PAYLOAD_TEMPLATE`` once per invoice:
+it loads the whole Sales Invoice document (children included) and compiles
+the template string again every time. ``iter_payloads`` compiles it once,
+reads invoices page by page and their item rows with one query per page,
+and yields compact JSON bodies lazily, so back-fills of any size run in
+constant memory::
+
+    python3 /scripts/verifactu_payloads.py --site galaxy.local --from-date 2025-09-01 --output payloads.jsonl
+    python3 /scripts/verifactu_payloads.py --site galaxy.local --status Failed --requeue
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from textwrap import dedent
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from lazy_imports import lazy_import
+from utils import (
+    EXISTS_CHUNK_SIZE,
+    add_metrics_arguments,
+    chunked,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumented,
+    report_metrics,
+)
+
+
+frappe = lazy_import("frappe")
+
+
+# Every field VERIFACTU_PAYLOAD_TEMPLATE reads, so no document has to be loaded.
+INVOICE_FIELDS = ["name", "customer_name", "rounded_total", "grand_total", "posting_date", "tax_id"]
+ITEM_FIELDS = ["parent", "idx", "item_code", "description", "base_net_amount", "qty"]
+
+
+@dataclass
+class RenderedPayload:
+    invoice: str
+    body: Optional[str]
+    error: str = ""
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_template() -> Any:
+    """The payload template compiled once per process with Frappe's Jinja environment."""
+
+    return frappe.get_jenv().from_string(VERIFACTU_PAYLOAD_TEMPLATE)
+
+
+def render_payload(invoice: Dict[str, Any], items: List[Dict[str, Any]], template: Any = None) -> RenderedPayload:
+    """Render one invoice; the body is re-serialised compactly and must be valid JSON."""
+
+    template = template or compiled_template()
+    # A namespace, not a dict: Jinja resolves ``doc.items`` to ``dict.items`` first.
+    rendered = template.render(doc=SimpleNamespace(**invoice, items=items))
+    try:
+        body = json.dumps(json.loads(rendered), separators=(",", ":"), ensure_ascii=False)
+    except ValueError as exc:
+        return RenderedPayload(invoice["name"], None, f"rendered payload is not valid JSON: {exc}")
+    return RenderedPayload(invoice["name"], body)
+
+
+def load_items(invoice_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    items: Dict[str, List[Dict[str, Any]]] = {name: [] for name in invoice_names}
+    for chunk in chunked(invoice_names, EXISTS_CHUNK_SIZE):
+        for item in frappe.get_all(
+            "Sales Invoice Item",
+            filters={"parenttype": "Sales Invoice", "parent": ["in", chunk]},
+            fields=ITEM_FIELDS,
+            order_by="idx asc",
+            limit_page_length=0,
+        ):
+            items[item["parent"]].append(item)
+    return items
+
+
+@instrumented()
+def render_invoices(invoices: List[Dict[str, Any]]) -> List[RenderedPayload]:
+    """Render already fetched invoice rows, loading all their items in bulk."""
+
+    template = compiled_template()
+    items = load_items([invoice["name"] for invoice in invoices])
+    return [render_payload(invoice, items[invoice["name"]], template) for invoice in invoices]
+
+
+def iter_invoices(
+    filters: Dict[str, Any], page_size: int, *, fields: Optional[List[str]] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of invoice rows by name (keyset pagination, no OFFSET scans)."""
+
+    last_name = ""
+    while True:
+        page = frappe.get_all(
+            "Sales Invoice",
+            filters={**filters, "name": [">", last_name]},
+            fields=fields or INVOICE_FIELDS,
+            order_by="name asc",
+            limit_page_length=page_size,
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_name = page[-1]["name"]
+
+
+def iter_payloads(filters: Optional[Dict[str, Any]] = None, *, page_size: int = 500) -> Iterator[RenderedPayload]:
+    """Render every submitted invoice matching ``filters``, one page at a time."""
+
+    for page in iter_invoices({"docstatus": 1, **(filters or {})}, page_size):
+        yield from render_invoices(page)
+
+
+def write_payloads(payloads: Iterable[RenderedPayload], stream: TextIO) -> Dict[str, int]:
+    """Write ``{"invoice": ..., "payload": ...}`` JSON lines; failures are reported on stderr."""
+
+    counts = {"rendered": 0, "failed": 0}
+    for payload in payloads:
+        if payload.body is None:
+            counts["failed"] += 1
+            print(f"  ❌ {payload.invoice}: {payload.error}", file=sys.stderr)
+            continue
+        stream.write(f'{{"invoice":{json.dumps(payload.invoice)},"payload":{payload.body}}}\n')
+        counts["rendered"] += 1
+    return counts
+
+
+@instrumented()
+def requeue(payloads: Iterable[RenderedPayload]) -> Dict[str, int]:
+    """Put every invoice that renders cleanly back in the submitter queue.
+
+    Accepted invoices are never requeued, whatever the filters matched.
+    """
+
+    counts = {"rendered": 0, "failed": 0}
+    names: List[str] = []
+    for payload in payloads:
+        if payload.body is None:
+            counts["failed"] += 1
+            print(f"  ❌ {payload.invoice}: {payload.error}")
+            continue
+        names.append(payload.invoice)
+        counts["rendered"] += 1
+
+    for chunk in chunked(names, EXISTS_CHUNK_SIZE):
+        frappe.db.sql(
+            """update `tabSales Invoice`
+            set verifactu_status = 'Pending', verifactu_next_retry = null, verifactu_attempts = 0
+            where name in %(names)s and ifnull(verifactu_status, '') != 'Accepted'""",
+            {"names": tuple(chunk)},
+        )
+        frappe.db.commit()
+    return counts
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Render Verifactu payloads for submitted Sales Invoices")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--from-date", help="First posting date to include")
+    parser.add_argument("--to-date", help="Last posting date to include")
+    parser.add_argument("--company", help="Only invoices of this company")
+    parser.add_argument("--status", action="append", help="Only invoices with this verifactu_status (repeatable)")
+    parser.add_argument("--page-size", type=int, default=500, help="Invoices fetched per query")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--output", type=Path, help="Write JSON lines here (default: stdout)")
+    target.add_argument(
+        "--requeue",
+        action="store_true",
+        help="Mark the invoices Pending so verifactu_submitter.py submits them again (never Accepted ones)",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.requeue and args.status and "Accepted" in args.status:
+        parser.error("--requeue: Accepted invoices are never submitted again")
+    return args
+
+
+def invoice_filters(args: argparse.Namespace) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {}
+    if args.from_date and args.to_date:
+        filters["posting_date"] = ["between", [args.from_date, args.to_date]]
+    elif args.from_date:
+        filters["posting_date"] = [">=", args.from_date]
+    elif args.to_date:
+        filters["posting_date"] = ["<=", args.to_date]
+    if args.company:
+        filters["company"] = args.company
+    if args.status:
+        filters["verifactu_status"] = ["in", args.status]
+    return filters
+
+
+def main() -> None:
+    args = parse_arguments()
+    summary = sys.stderr if args.output is None and not args.requeue else sys.stdout
+
+    with frappe_site_connection(args.site):
+        exc: Exception | None = None
+        try:
+            payloads = iter_payloads(invoice_filters(args), page_size=args.page_size)
+            if args.requeue:
+                counts = requeue(payloads)
+            elif args.output:
+                with open(args.output, "w") as stream:
+                    counts = write_payloads(payloads, stream)
+            else:
+                counts = write_payloads(payloads, sys.stdout)
+            print(f"🧾 {counts['rendered']} payloads rendered, {counts['failed']} failed", file=summary)
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error rendering payloads: {err}", file=summary)
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "verifactu_payloads", stream=summary)
+
+
+# Values go through ``tojson`` so quotes, backslashes, newlines and HTML in
+# customer names and item descriptions cannot break the JSON body.
+VERIFACTU_PAYLOAD_TEMPLATE = dedent(
+    """
+    {
+      "invoice_number": {{ doc.name | string | tojson }},
+      "customer": {{ doc.customer_name | string | tojson }},
+      "total": {{ (doc.rounded_total or doc.grand_total) | string | tojson }},
+      "issue_date": {{ doc.posting_date | string | tojson }},
+      "tax_id": {{ (doc.tax_id or '') | string | tojson }},
+      "items": [
+        {% for item in doc.items %}
+        {
+          "code": {{ item.item_code | string | tojson }},
+          "description": {{ item.description | string | tojson }},
+          "amount": {{ item.base_net_amount | string | tojson }},
+          "quantity": {{ item.qty | string | tojson }}
+        }{% if not loop.last %},{% endif %}
+        {% endfor %}
+      ]
+    }
+    """
+).strip()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+"""Drain submitted Sales Invoices to Verifactu with pooled, concurrent HTTP requests.
+
+Submitted invoices carry a ``verifactu_status`` custom field that acts as
+the persistent queue. The field has no default, so adding it leaves the
+existing ledger unqueued. Each run first marks the submitted invoices
+posted on or after the go-live date as ``Pending``. That date is recorded
+when ``setup_erp_crm.py`` installs the fields, and ``--since`` overrides it
+for a back-fill. Accepted invoices store
+the returned CSV (código seguro de verificación) and QR code, and transient
+failures become ``Retry`` with a ``verifactu_next_retry`` timestamp that
+grows exponentially between runs. Within a run, requests share a small pool
+of keep-alive connections, at most ``--concurrency`` are in flight, and
+failed attempts are retried with jittered exponential backoff.
+
+Run it from cron (or a scheduler job) next to the site::
+
+    python3 /scripts/verifactu_submitter.py --site galaxy.local --concurrency 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import ssl
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from lazy_imports import lazy_import
+from utils import (
+    DEFAULT_COMMIT_EVERY,
+    TransactionBatch,
+    add_metrics_arguments,
+    commit_or_rollback,
+    frappe_site_connection,
+    instrumentation,
+    instrumented,
+    report_metrics,
+    single_instance,
+)
+from verifactu_payloads import INVOICE_FIELDS, render_invoices
+
+
+frappe = lazy_import("frappe")
+frappe_utils = lazy_import("frappe.utils")
+
+
+DEFAULT_URL = "https://api.verifactu.sandbox/v1/invoices"
+# Posting date from which submitted invoices are queued; set when the fields are installed.
+QUEUE_SINCE_KEY = "galaxy_verifactu_queue_since"
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+VERIFACTU_FIELDS: List[Dict[str, Any]] = [
+    {
+        "fieldname": "verifactu_section",
+        "label": "Verifactu",
+        "fieldtype": "Section Break",
+        "insert_after": "terms",
+        "collapsible": 1,
+    },
+    {
+        "fieldname": "verifactu_status",
+        "label": "Verifactu Status",
+        "fieldtype": "Select",
+        # Empty means "not queued"; a default would backfill every existing invoice as Pending.
+        "options": "\nPending\nAccepted\nRetry\nRejected\nFailed",
+        "insert_after": "verifactu_section",
+        "search_index": 1,
+        "in_standard_filter": 1,
+    },
+    {
+        "fieldname": "verifactu_csv",
+        "label": "Verifactu CSV",
+        "fieldtype": "Data",
+        "insert_after": "verifactu_status",
+    },
+    {
+        "fieldname": "verifactu_qr_code",
+        "label": "Verifactu QR Code",
+        "fieldtype": "Long Text",
+        "insert_after": "verifactu_csv",
+    },
+    {
+        "fieldname": "verifactu_submitted_on",
+        "label": "Verifactu Submitted On",
+        "fieldtype": "Datetime",
+        "insert_after": "verifactu_qr_code",
+    },
+    {
+        "fieldname": "verifactu_attempts",
+        "label": "Verifactu Attempts",
+        "fieldtype": "Int",
+        "insert_after": "verifactu_submitted_on",
+    },
+    {
+        "fieldname": "verifactu_next_retry",
+        "label": "Verifactu Next Retry",
+        "fieldtype": "Datetime",
+        "insert_after": "verifactu_attempts",
+    },
+    {
+        "fieldname": "verifactu_last_error",
+        "label": "Verifactu Last Error",
+        "fieldtype": "Small Text",
+        "insert_after": "verifactu_next_retry",
+    },
+]
+
+
+def verifactu_field_values(field_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Custom Field row for ``field_config``; the values are only written by the submitter."""
+
+    return {
+        "dt": "Sales Invoice",
+        "read_only": 1,
+        "allow_on_submit": 1,
+        "no_copy": 1,
+        **field_config,
+    }
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class ConnectionPool:
+    """HTTP/1.1 client that keeps up to ``size`` connections to one origin alive.
+
+    ``size`` also bounds the number of requests in flight. A request on a
+    reused connection that the server closed in the meantime is retried once
+    on a fresh connection.
+    """
+
+    def __init__(self, url: str, size: int, *, timeout: float = 30.0, keep_alive: bool = True) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = parts.path or "/"
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.opened = 0
+        self._idle: List[Connection] = []
+        self._slots = asyncio.Semaphore(max(1, size))
+
+    async def request(self, method: str, body: bytes, headers: Dict[str, str]) -> HttpResponse:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            if connection is not None:
+                try:
+                    return await self._send(connection, method, body, headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    pass  # stale keep-alive connection, retry on a new one
+            return await self._send(await self._open(), method, body, headers)
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    async def _open(self) -> Connection:
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout
+        )
+        self.opened += 1
+        return connection
+
+    async def _send(
+        self, connection: Connection, method: str, body: bytes, headers: Dict[str, str]
+    ) -> HttpResponse:
+        reader, writer = connection
+        try:
+            response, reusable = await asyncio.wait_for(
+                self._exchange(reader, writer, method, body, headers), self.timeout
+            )
+        except BaseException:
+            writer.close()
+            raise
+
+        if reusable and self.keep_alive:
+            self._idle.append(connection)
+        else:
+            writer.close()
+        return response
+
+    async def _exchange(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        method: str,
+        body: bytes,
+        headers: Dict[str, str],
+    ) -> Tuple[HttpResponse, bool]:
+        lines = [
+            f"{method} {self.path} HTTP/1.1",
+            f"Host: {self.host}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if self.keep_alive else 'close'}",
+        ]
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before the response")
+        version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        reusable = version == "HTTP/1.1" and response_headers.get("connection", "").lower() != "close"
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            payload = b"".join(chunks)
+        elif "content-length" in response_headers:
+            payload = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            payload = await reader.read()
+            reusable = False
+
+        return HttpResponse(int(status), response_headers, payload), reusable
+
+
+@dataclass
+class SubmitterConfig:
+    url: str = DEFAULT_URL
+    api_key: str = ""
+    concurrency: int = 16
+    max_attempts: int = 5
+    backoff_base: float = 0.5
+    backoff_cap: float = 30.0
+    timeout: float = 30.0
+    keep_alive: bool = True
+
+
+@dataclass
+class SubmissionResult:
+    invoice: str
+    status: str
+    attempts: int
+    csv: str = ""
+    qr_code: str = ""
+    error: str = ""
+
+
+@dataclass
+class SubmissionStats:
+    results: List[SubmissionResult] = field(default_factory=list)
+    seconds: float = 0.0
+    connections: int = 0
+
+    def counts(self) -> Counter:
+        return Counter(result.status for result in self.results)
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[str] = None) -> float:
+    """Delay before retry number ``attempt`` (1-based): capped exponential with jitter."""
+
+    if retry_after is not None:
+        with contextlib.suppress(ValueError):
+            return min(cap, max(0.0, float(retry_after)))
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+async def submit_invoice(pool: ConnectionPool, config: SubmitterConfig, invoice: str, body: bytes) -> SubmissionResult:
+    headers = {
+        "Content-Type": "application/json",
+        "X-API-KEY": config.api_key,
+        # Lets the service deduplicate a retry of a request that did arrive.
+        "Idempotency-Key": invoice,
+    }
+
+    error = ""
+    for attempt in range(1, config.max_attempts + 1):
+        retry_after = None
+        try:
+            response = await pool.request("POST", body, headers)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        else:
+            data = response.json()
+            if 200 <= response.status < 300:
+                return SubmissionResult(
+                    invoice,
+                    "Accepted",
+                    attempt,
+                    csv=str(data.get("csv") or data.get("id") or ""),
+                    qr_code=str(data.get("qr_code") or data.get("qr") or ""),
+                )
+            error = f"HTTP {response.status}: {data.get('error') or response.body[:200].decode(errors='replace')}"
+            if response.status not in RETRYABLE_STATUSES:
+                return SubmissionResult(invoice, "Rejected", attempt, error=error)
+            retry_after = response.headers.get("retry-after")
+
+        if attempt < config.max_attempts:
+            await asyncio.sleep(backoff_delay(attempt, config.backoff_base, config.backoff_cap, retry_after))
+
+    return SubmissionResult(invoice, "Retry", config.max_attempts, error=error)
+
+
+async def submit_payloads(payloads: Sequence[Tuple[str, str]], config: SubmitterConfig) -> SubmissionStats:
+    """Submit every ``(invoice, JSON body)`` pair with at most ``config.concurrency`` in flight."""
+
+    pool = ConnectionPool(config.url, config.concurrency, timeout=config.timeout, keep_alive=config.keep_alive)
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(
+            *(submit_invoice(pool, config, invoice, body.encode()) for invoice, body in payloads)
+        )
+    finally:
+        await pool.close()
+    return SubmissionStats(list(results), time.perf_counter() - started, pool.opened)
+
+
+@instrumented()
+def queue_new_invoices(since: Optional[str]) -> None:
+    """Mark submitted, not yet queued invoices posted on or after ``since`` as ``Pending``."""
+
+    since = since or frappe.db.get_global(QUEUE_SINCE_KEY)
+    if not since:
+        print("  ⚠️  No Verifactu go-live date recorded (run setup_erp_crm.py or pass --since)")
+        return
+    frappe.db.sql(
+        """update `tabSales Invoice`
+        set verifactu_status = 'Pending'
+        where docstatus = 1 and ifnull(verifactu_status, '') = '' and posting_date >= %(since)s""",
+        {"since": since},
+    )
+
+
+@instrumented()
+def claim_invoices(limit: int, due_before: str, exclude: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """Return up to ``limit`` queued invoices that are due, oldest first.
+
+    Stored results move an invoice out of both filters: ``Retry`` rows are
+    rescheduled past ``due_before`` (the start of the drain). Only invoices
+    whose result could not be stored need to be excluded.
+    """
+
+    fields = [*INVOICE_FIELDS, "verifactu_attempts"]
+    skipped: Dict[str, Any] = {"name": ["not in", list(exclude)]} if exclude else {}
+    invoices = frappe.get_all(
+        "Sales Invoice",
+        filters={"docstatus": 1, "verifactu_status": "Pending", **skipped},
+        fields=fields,
+        order_by="posting_date asc",
+        limit_page_length=limit,
+    )
+    if len(invoices) < limit:
+        invoices += frappe.get_all(
+            "Sales Invoice",
+            filters={
+                "docstatus": 1,
+                "verifactu_status": "Retry",
+                "verifactu_next_retry": ["<=", due_before],
+                **skipped,
+            },
+            fields=fields,
+            order_by="posting_date asc",
+            limit_page_length=limit - len(invoices),
+        )
+    return invoices
+
+
+def result_values(result: SubmissionResult, previous_attempts: int, max_total_attempts: int) -> Dict[str, Any]:
+    attempts = previous_attempts + result.attempts
+    values: Dict[str, Any] = {"verifactu_attempts": attempts, "verifactu_last_error": result.error}
+
+    if result.status == "Accepted":
+        values.update(
+            verifactu_status="Accepted",
+            verifactu_csv=result.csv,
+            verifactu_qr_code=result.qr_code,
+            verifactu_submitted_on=frappe_utils.now(),
+            verifactu_next_retry=None,
+        )
+    elif result.status == "Retry" and attempts < max_total_attempts:
+        # Runs are spaced out exponentially too, up to one hour apart.
+        delay = backoff_delay(attempts, 60.0, 3600.0)
+        values.update(
+            verifactu_status="Retry",
+            verifactu_next_retry=frappe_utils.add_to_date(frappe_utils.now_datetime(), seconds=delay, as_string=True),
+        )
+    else:
+        values.update(verifactu_status="Failed" if result.status == "Retry" else "Rejected", verifactu_next_retry=None)
+    return values
+
+
+@instrumented()
+def store_results(
+    results: List[SubmissionResult],
+    invoices: List[Dict[str, Any]],
+    batch: TransactionBatch,
+    *,
+    max_total_attempts: int,
+) -> List[str]:
+    """Write every result; returns the invoices whose result could not be stored."""
+
+    previous = {invoice["name"]: int(invoice.get("verifactu_attempts") or 0) for invoice in invoices}
+    unstored = []
+    for result in results:
+        unstored.append(result.invoice)
+        with batch.record(f"storing the Verifactu response of {result.invoice}"):
+            frappe.db.set_value(
+                "Sales Invoice",
+                result.invoice,
+                result_values(result, previous[result.invoice], max_total_attempts),
+                update_modified=False,
+            )
+            unstored.pop()
+    return unstored
+
+
+@instrumented()
+def drain_queue(
+    config: SubmitterConfig,
+    *,
+    batch_size: int = 500,
+    max_total_attempts: int = 10,
+    commit_every: int = DEFAULT_COMMIT_EVERY,
+    once: bool = False,
+    since: Optional[str] = None,
+) -> Counter:
+    """Queue new invoices, then submit queued ones batch by batch until nothing due is left."""
+
+    totals: Counter = Counter()
+    unstored: List[str] = []
+    started = time.perf_counter()
+    due_before = frappe_utils.now()
+    connections = 0
+
+    queue_new_invoices(since)
+    with TransactionBatch(commit_every) as batch:
+        while True:
+            invoices = claim_invoices(batch_size, due_before, exclude=unstored)
+            if not invoices:
+                break
+
+            payloads = []
+            unrenderable = []
+            for rendered in render_invoices(invoices):
+                if rendered.body is None:
+                    unrenderable.append(SubmissionResult(rendered.invoice, "Rejected", 0, error=rendered.error))
+                else:
+                    payloads.append((rendered.invoice, rendered.body))
+            with instrumentation.step("submit_payloads"):
+                stats = asyncio.run(submit_payloads(payloads, config))
+            stats.results.extend(unrenderable)
+            unstored += store_results(stats.results, invoices, batch, max_total_attempts=max_total_attempts)
+            batch.commit()
+
+            totals.update(stats.counts())
+            connections += stats.connections
+            print(
+                f"  📨 {len(invoices)} invoices in {stats.seconds:.2f}s "
+                f"({len(invoices) / stats.seconds if stats.seconds else 0:.0f}/s, {stats.connections} connections)"
+            )
+            if once:
+                break
+
+    seconds = time.perf_counter() - started
+    summary = ", ".join(f"{count} {status.lower()}" for status, count in sorted(totals.items())) or "nothing due"
+    print(f"\n🧾 Verifactu queue drained: {summary} in {seconds:.2f}s over {connections} connections")
+    return totals
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Submit queued Sales Invoices to Verifactu")
+    parser.add_argument("--site", default="galaxy.local", help="Frappe site name")
+    parser.add_argument("--url", default=os.environ.get("VERIFACTU_URL", DEFAULT_URL), help="Verifactu endpoint")
+    parser.add_argument(
+        "--api-key",
+        default=os.environ.get("VERIFACTU_API_KEY"),
+        help="Verifactu API key (default: $VERIFACTU_API_KEY)",
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests (and connections) in flight")
+    parser.add_argument("--batch-size", type=int, default=500, help="Invoices claimed per round")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Attempts per invoice within one run")
+    parser.add_argument(
+        "--max-total-attempts",
+        type=int,
+        default=10,
+        help="Attempts across runs before an invoice is marked Failed",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds per request")
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=DEFAULT_COMMIT_EVERY,
+        help="Number of invoice updates written per transaction",
+    )
+    parser.add_argument("--once", action="store_true", help="Process a single batch and exit")
+    parser.add_argument(
+        "--since",
+        help="Also queue unqueued invoices posted on or after this date (default: the go-live date set by setup)",
+    )
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_arguments()
+    if not args.api_key:
+        raise SystemExit("❌ No Verifactu API key: pass --api-key or set VERIFACTU_API_KEY")
+
+    config = SubmitterConfig(
+        url=args.url,
+        api_key=args.api_key,
+        concurrency=args.concurrency,
+        max_attempts=args.max_attempts,
+        timeout=args.timeout,
+    )
+
+    with frappe_site_connection(args.site), single_instance("verifactu_submitter") as acquired:
+        if not acquired:
+            print("⚠️  Another Verifactu submitter is running for this site, exiting")
+            return
+
+        exc: Exception | None = None
+        try:
+            drain_queue(
+                config,
+                batch_size=args.batch_size,
+                max_total_attempts=args.max_total_attempts,
+                commit_every=args.commit_every,
+                once=args.once,
+                since=args.since,
+            )
+        except Exception as err:  # pragma: no cover - frappe specific
+            exc = err
+            print(f"❌ Fatal error submitting invoices: {err}")
+            raise
+        finally:
+            commit_or_rollback(exc)
+            report_metrics(args, "verifactu_submitter")
+
+
+if __name__ == "__main__":
+    main()